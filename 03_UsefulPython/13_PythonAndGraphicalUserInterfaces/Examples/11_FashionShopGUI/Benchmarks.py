@@ -0,0 +1,341 @@
+"""
+Example 13.11k Benchmarks
+
+Times the Fashion Shop data management classes against synthetic inventories.
+Only runs if executed as the main program
+
+Routine Listings
+----------------
+make_shop
+    create a `FashionShop` filled with synthetic stock items
+time_call
+    time the best of several runs of a function
+benchmark_tag_search
+    compare the tag index search with a linear filter over every item
+benchmark_price_range
+    compare the price index range query with a sorted linear filter
+benchmark_memory
+    compare the memory used by a `FashionShop` and a `StockTable`
+benchmark_stock_batch
+    compare applying a stock batch with adding stock one item at a time
+benchmark_startup
+    compare loading a pickled `FashionShop` with opening a `StockSnapshot`
+"""
+
+import os
+import random
+import tempfile
+import timeit
+import tracemalloc
+
+from Data import (
+    FashionShop,
+    JournaledFashionShop,
+    StockItem,
+    StockSnapshot,
+    StockTable,
+)
+
+COLOURS = ["red", "blue", "green", "black", "white", "yellow", "pink", "grey"]
+GARMENTS = ["dress", "shirt", "skirt", "trousers", "shoes", "hat", "coat", "scarf"]
+SIZES = ["size:{0}".format(size) for size in range(6, 22, 2)]
+
+
+def make_shop(item_count, seed=1, storage_class=FashionShop.FashionShop):
+    """
+    Create a shop filled with synthetic stock items
+
+    Parameters
+    ----------
+    item_count : int
+        number of items to create
+    seed : int, optional
+        seed for the random number generator, by default 1
+    storage_class : Data Manager, optional
+        class supporting the Fashion Shop Data Management API, by default
+        `FashionShop.FashionShop`
+
+    Returns
+    -------
+    Data Manager
+        shop holding `item_count` items
+    """
+    generator = random.Random(seed)
+    shop = storage_class()
+    for i in range(item_count):
+        tags = ",".join(
+            [
+                generator.choice(GARMENTS),
+                generator.choice(COLOURS),
+                generator.choice(SIZES),
+                "sku:{0}".format(i),
+            ]
+        )
+        price = generator.randint(1, 500)
+        shop.store_new_stock_item(
+            StockItem.StockItem("S{0}".format(i), price=price, tags=tags)
+        )
+    return shop
+
+
+def time_call(function, repeat=5):
+    """
+    Time the best of several runs of a function
+
+    Parameters
+    ----------
+    function : Callable[[], Any]
+        function to time
+    repeat : int, optional
+        number of runs, by default 5
+
+    Returns
+    -------
+    float
+        fastest run time in seconds
+    """
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def benchmark_tag_search(shop, search_tags):
+    """
+    Compare the tag index search with a linear filter over every item
+
+    Parameters
+    ----------
+    shop : FashionShop
+        shop to search
+    search_tags : set[str]
+        tags to search for
+
+    Returns
+    -------
+    None
+    """
+    items = list(shop.find_matching_with_tags(set()))
+
+    def linear_search():
+        return list(filter(lambda item: search_tags.issubset(item.tags), items))
+
+    def index_search():
+        return list(shop.find_matching_with_tags(search_tags))
+
+    linear_time = time_call(linear_search)
+    index_time = time_call(index_search)
+    print(
+        "{0:<30} {1:>6} matches  linear {2:8.3f} ms  index {3:8.3f} ms  x{4:.0f}".format(
+            ",".join(sorted(search_tags)),
+            len(index_search()),
+            linear_time * 1000,
+            index_time * 1000,
+            linear_time / max(index_time, 1e-9),
+        )
+    )
+
+
+def benchmark_price_range(shop, low, high, tags=None):
+    """
+    Compare the price index range query with a sorted linear filter
+
+    Parameters
+    ----------
+    shop : FashionShop
+        shop to search
+    low : int | float
+        lowest price to match
+    high : int | float
+        highest price to match
+    tags : set[str] | None, optional
+        tags the items must also match, by default None
+
+    Returns
+    -------
+    None
+    """
+    items = list(shop.find_matching_with_tags(set()))
+    search_tags = tags or set()
+
+    def linear_search():
+        matches = [
+            item
+            for item in items
+            if low <= item.price <= high and search_tags.issubset(item.tags)
+        ]
+        matches.sort(key=lambda item: (item.price, item.stock_ref))
+        return matches
+
+    def index_search():
+        return list(shop.find_in_price_range(low, high, tags))
+
+    linear_time = time_call(linear_search)
+    index_time = time_call(index_search)
+    print(
+        "{0:>4}-{1:<4} {2:<20} {3:>6} matches  linear {4:8.3f} ms  index {5:8.3f} ms  x{6:.0f}".format(
+            low,
+            high,
+            ",".join(sorted(search_tags)),
+            len(index_search()),
+            linear_time * 1000,
+            index_time * 1000,
+            linear_time / max(index_time, 1e-9),
+        )
+    )
+
+
+def benchmark_memory(item_count):
+    """
+    Compare the memory used by a `FashionShop` and a `StockTable`
+
+    Parameters
+    ----------
+    item_count : int
+        number of items to store
+
+    Returns
+    -------
+    None
+    """
+    for storage_class in [FashionShop.FashionShop, StockTable.StockTable]:
+        tracemalloc.start()
+        shop = make_shop(item_count, storage_class=storage_class)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            "{0:<12} {1:8.1f} MB  {2:6.0f} bytes per item".format(
+                storage_class.__name__, size / 1e6, size / item_count
+            )
+        )
+        del shop
+
+
+def benchmark_stock_batch(item_count, line_count, seed=2):
+    """
+    Compare applying a stock batch with adding stock one item at a time
+
+    Parameters
+    ----------
+    item_count : int
+        number of items in the shop
+    line_count : int
+        number of lines in the batch
+    seed : int, optional
+        seed for the random number generator, by default 2
+
+    Returns
+    -------
+    None
+    """
+    generator = random.Random(seed)
+    lines = [
+        ("S{0}".format(generator.randrange(item_count)), generator.randint(1, 10))
+        for _ in range(line_count)
+    ]
+
+    for storage_class in [
+        FashionShop.FashionShop,
+        JournaledFashionShop.JournaledFashionShop,
+    ]:
+        with tempfile.TemporaryDirectory() as directory:
+            shop = make_shop(item_count, storage_class=storage_class)
+            shop.save(os.path.join(directory, "shop.pickle"))
+
+            def add_one_at_a_time():
+                for stock_ref, count in lines:
+                    shop.find_stock_item(stock_ref).add_stock(count)
+
+            loop_time = time_call(add_one_at_a_time, repeat=1)
+            batch_time = time_call(lambda: shop.apply_stock_batch(lines), repeat=1)
+            if storage_class is JournaledFashionShop.JournaledFashionShop:
+                shop.close()
+        print(
+            "{0:<20} {1} lines  add_stock loop {2:6.2f} s  apply_stock_batch {3:6.2f} s  {4:,.0f} lines/s".format(
+                storage_class.__name__,
+                line_count,
+                loop_time,
+                batch_time,
+                line_count / batch_time,
+            )
+        )
+
+
+def benchmark_startup(item_count):
+    """
+    Compare loading a pickled `FashionShop` with opening a `StockSnapshot`
+
+    Each run opens the file and looks up one item and one tag
+
+    Parameters
+    ----------
+    item_count : int
+        number of items in the shop
+
+    Returns
+    -------
+    None
+    """
+    shop = make_shop(item_count)
+    with tempfile.TemporaryDirectory() as directory:
+        pickle_filename = os.path.join(directory, "shop.pickle")
+        snapshot_filename = os.path.join(directory, "shop.snapshot")
+        shop.save(pickle_filename)
+        StockSnapshot.write_snapshot(
+            shop.find_matching_with_tags(set()), snapshot_filename
+        )
+        del shop
+
+        def open_and_search(storage_class, filename):
+            opened = storage_class.load(filename)
+            opened.find_stock_item("S{0}".format(item_count // 2))
+            list(opened.find_matching_with_tags({"sku:100"}))
+            return opened
+
+        pickle_time = time_call(
+            lambda: open_and_search(FashionShop.FashionShop, pickle_filename),
+            repeat=3,
+        )
+        snapshot_time = time_call(
+            lambda: open_and_search(StockSnapshot.StockSnapshot, snapshot_filename)
+        )
+        print(
+            "pickle {0:8.1f} MB {1:8.4f} s  snapshot {2:8.1f} MB {3:8.4f} s  {4:8.0f}x".format(
+                os.path.getsize(pickle_filename) / 1e6,
+                pickle_time,
+                os.path.getsize(snapshot_filename) / 1e6,
+                snapshot_time,
+                pickle_time / snapshot_time,
+            )
+        )
+
+
+if __name__ == "__main__":
+    item_count = 200000
+    print("Building a shop of {0} items".format(item_count))
+    shop = make_shop(item_count)
+
+    print("Tag search")
+    for search_tags in [
+        {"dress"},
+        {"dress", "red"},
+        {"dress", "red", "size:12"},
+        {"sku:100", "dress"},
+    ]:
+        benchmark_tag_search(shop, search_tags)
+
+    print("Price range search")
+    for low, high, tags in [
+        (20, 50, None),
+        (20, 50, {"dress"}),
+        (20, 50, {"dress", "red", "size:12"}),
+        (100, 400, {"dress"}),
+    ]:
+        benchmark_price_range(shop, low, high, tags)
+
+    print("Memory for {0} items".format(item_count))
+    del shop
+    benchmark_memory(item_count)
+
+    print("Stock batch")
+    benchmark_stock_batch(100000, 1000000)
+
+    print("Startup for {0} items".format(item_count))
+    benchmark_startup(item_count)
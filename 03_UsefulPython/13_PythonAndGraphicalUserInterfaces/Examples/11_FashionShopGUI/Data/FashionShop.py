@@ -13,28 +13,124 @@ See Also
 Data.StockItem : Module containing implementations of inventory items
 """
 
+import bisect
+import heapq
 import pickle
 
+from Data import Instrumentation
 
+
+@Instrumentation.instrument
 class FashionShop:
     """
     Represents the inventory management system of a Fashion
 
-    Class Attributes
-    ----------------
-    show_instrumentation : bool
-        indicates if instrumentation should be printed
+    Stock items are held in a dictionary keyed by `stock_ref`. An inverted
+    index maps each tag to the set of `stock_ref`s carrying that tag, so
+    tag searches only visit the items that can match. A price index holds
+    `(price, stock_ref)` pairs in sorted order to answer price range queries,
+    and a sorted list of every `stock_ref` lets results be read a page at a
+    time
+
+    Notes
+    -----
+    Timings for the methods are recorded by `Data.Instrumentation` when
+    instrumentation is enabled
     """
 
-    show_instrumentation = False
-
     def __init__(self):
         """
         Create a new `FashionShop` instance
         """
-        if FashionShop.show_instrumentation:
-            print("**FashionShop __init__ called")
         self.__stock_dictionary = {}
+        self.__tag_index = {}
+        self.__price_index = []
+        self.__ref_index = []
+
+    def __getstate__(self):
+        # the indices are derived data, so only the items are pickled
+        return {"_FashionShop__stock_dictionary": self.__stock_dictionary}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__build_indices()
+
+    def __build_indices(self):
+        """
+        Rebuild the search indices from the stock dictionary
+
+        Returns
+        -------
+        None
+        """
+        self.__tag_index = {}
+        self.__price_index = []
+        for item in self.__stock_dictionary.values():
+            self.__index_item(item)
+        self.__ref_index = sorted(self.__stock_dictionary)
+
+    def __index_item(self, item):
+        """
+        Add an item to the search indices and register for tag updates
+
+        Parameters
+        ----------
+        item : StockItem
+            item to index
+
+        Returns
+        -------
+        None
+        """
+        for tag in item.tags:
+            self.__tag_index.setdefault(tag, set()).add(item.stock_ref)
+        bisect.insort(self.__price_index, (item.price, item.stock_ref))
+        item.receiver = self
+
+    def __unindex_tags(self, stock_ref, tags):
+        """
+        Remove a stock reference from the posting sets of the given tags
+
+        Parameters
+        ----------
+        stock_ref : str
+            stock reference id to remove
+        tags : set[str]
+            tags the stock reference was indexed under
+
+        Returns
+        -------
+        None
+        """
+        for tag in tags:
+            posting = self.__tag_index.get(tag)
+            if posting is None:
+                continue
+            posting.discard(stock_ref)
+            if not posting:
+                del self.__tag_index[tag]
+
+    def __unindex_price(self, stock_ref, price):
+        """
+        Remove a stock reference from the price index
+
+        Parameters
+        ----------
+        stock_ref : str
+            stock reference id to remove
+        price : int | float
+            the price the stock reference was indexed under
+
+        Returns
+        -------
+        None
+        """
+        position = bisect.bisect_left(self.__price_index, (price, stock_ref))
+        if position < len(self.__price_index) and self.__price_index[position] == (
+            price,
+            stock_ref,
+        ):
+            del self.__price_index[position]
 
     def save(self, filename):
         """
@@ -62,8 +158,6 @@ class FashionShop:
         --------
         FashionShop.load : load a `FashionShop` object from a file
         """
-        if FashionShop.show_instrumentation:
-            print("**FashionShop save called")
         with open(filename, "wb") as output_file:
             pickle.dump(self, output_file)
 
@@ -91,8 +185,6 @@ class FashionShop:
         --------
         FashionShop.save : saves a `FashionShop` instance
         """
-        if FashionShop.show_instrumentation:
-            print("**FashionShop load called")
         with open(filename, "rb") as input_file:
             shop = pickle.load(input_file)
         return shop
@@ -117,11 +209,11 @@ class FashionShop:
         KeyError
             Raised if the item's `stock_ref` is already registered as a key
         """
-        if FashionShop.show_instrumentation:
-            print("**FashionShop store new stock item called")
         if item.stock_ref in self.__stock_dictionary:
             raise KeyError("This stock reference is already used")
         self.__stock_dictionary[item.stock_ref] = item
+        self.__index_item(item)
+        bisect.insort(self.__ref_index, item.stock_ref)
 
     def remove_old_stock_item(self, stock_ref):
         """
@@ -143,7 +235,202 @@ class FashionShop:
         KeyError
             Raised if the item's `stock_ref` is not registered as a key
         """
-        self.__stock_dictionary.pop(stock_ref)
+        item = self.__stock_dictionary.pop(stock_ref)
+        self.__unindex_tags(stock_ref, item.tags)
+        self.__unindex_price(stock_ref, item.price)
+        del self.__ref_index[bisect.bisect_left(self.__ref_index, stock_ref)]
+        item.receiver = None
+
+    def tags_updated(self, item, old_tags):
+        """
+        Method to be called when a stored item's tags have been reassigned
+
+        Moves the item from the posting sets of `old_tags` to those of
+        its current tags
+
+        Parameters
+        ----------
+        item : StockItem
+            the item whose tags changed
+        old_tags : set[str]
+            the tags the item held before the change
+
+        Returns
+        -------
+        None
+        """
+        if self.__stock_dictionary.get(item.stock_ref) is not item:
+            return
+        self.__unindex_tags(item.stock_ref, old_tags)
+        for tag in item.tags:
+            self.__tag_index.setdefault(tag, set()).add(item.stock_ref)
+
+    def price_updated(self, item, old_price):
+        """
+        Method to be called when a stored item's price has been changed
+
+        Parameters
+        ----------
+        item : StockItem
+            the item whose price changed
+        old_price : int | float
+            the price of the item before the change
+
+        Returns
+        -------
+        None
+        """
+        if self.__stock_dictionary.get(item.stock_ref) is not item:
+            return
+        self.__unindex_price(item.stock_ref, old_price)
+        bisect.insort(self.__price_index, (item.price, item.stock_ref))
+
+    def stock_updated(self, item, old_stock_level):
+        """
+        Method to be called when a stored item's stock level has changed
+
+        The stock level is not indexed, so `FashionShop` takes no action.
+        Provided for storage classes that need to track stock changes
+
+        Parameters
+        ----------
+        item : StockItem
+            the item whose stock level changed
+        old_stock_level : int
+            the stock level of the item before the change
+
+        Returns
+        -------
+        None
+        """
+        pass
+
+    def apply_stock_batch(self, lines):
+        """
+        Add stock to many items as a single change
+
+        Every line is checked before any stock is added. If any line is
+        invalid no stock is added at all
+
+        Parameters
+        ----------
+        lines : Iterable[tuple[str, int | str]]
+            `(stock_ref, count)` pairs giving the amount of stock to add to
+            each item. Counts may be given as text, as read from a file
+
+        Returns
+        -------
+        list[tuple[int, str | None, str]]
+            a `(line_number, stock_ref, message)` entry for each invalid
+            line, numbered from 1. The list is empty if the batch was applied
+
+        Notes
+        -----
+        `StockItem.max_stock_add` limits stock added interactively, so it
+        does not apply to batches. The same item may appear on several lines
+        """
+        return self.__stock_batch(lines, selling=False)
+
+    def sell_batch(self, lines):
+        """
+        Sell stock of many items as a single change
+
+        Every line is checked before any stock is sold. If any line is
+        invalid no stock is sold at all
+
+        Parameters
+        ----------
+        lines : Iterable[tuple[str, int | str]]
+            `(stock_ref, count)` pairs giving the amount of stock to sell of
+            each item. Counts may be given as text, as read from a file
+
+        Returns
+        -------
+        list[tuple[int, str | None, str]]
+            a `(line_number, stock_ref, message)` entry for each invalid
+            line, numbered from 1. The list is empty if the batch was applied
+
+        Notes
+        -----
+        The same item may appear on several lines, as long as there is
+        enough stock to sell all of them
+        """
+        return self.__stock_batch(lines, selling=True)
+
+    def __stock_batch(self, lines, selling):
+        """
+        Validate a batch of stock changes in one pass, then apply it
+
+        Parameters
+        ----------
+        lines : Iterable[tuple[str, int | str]]
+            `(stock_ref, count)` pairs
+        selling : bool
+            `True` to sell stock, `False` to add stock
+
+        Returns
+        -------
+        list[tuple[int, str | None, str]]
+            a `(line_number, stock_ref, message)` entry for each invalid line
+        """
+        errors = []
+        stock_levels = {}
+        stock_dictionary = self.__stock_dictionary
+        for line_number, line in enumerate(lines, start=1):
+            try:
+                stock_ref, count = line
+                if isinstance(count, str):
+                    count = int(count)
+            except (TypeError, ValueError):
+                errors.append((line_number, None, "Invalid batch line"))
+                continue
+            level = stock_levels.get(stock_ref)
+            if level is None:
+                item = stock_dictionary.get(stock_ref)
+                if item is None:
+                    errors.append((line_number, stock_ref, "Item not found"))
+                    continue
+                level = item.stock_level
+            if not isinstance(count, int) or count < 1:
+                if selling:
+                    message = "Invalid number of items to sell"
+                else:
+                    message = "Invalid add amount"
+                errors.append((line_number, stock_ref, message))
+            elif not selling:
+                stock_levels[stock_ref] = level + count
+            elif count > level:
+                errors.append((line_number, stock_ref, "Not enough stock to sell"))
+            else:
+                stock_levels[stock_ref] = level - count
+        if not errors:
+            self.restore_stock_levels(stock_levels)
+        return errors
+
+    def restore_stock_levels(self, stock_levels):
+        """
+        Set the stock levels of several stored items as a single change
+
+        Used to apply validated stock batches. The `add_stock` limits do not
+        apply
+
+        Parameters
+        ----------
+        stock_levels : dict[str, int]
+            new stock level for each stock reference
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        KeyError
+            raised if a stock reference is not registered
+        """
+        items = [self.__stock_dictionary[stock_ref] for stock_ref in stock_levels]
+        for item, stock_level in zip(items, stock_levels.values()):
+            item.restore_stock_level(stock_level)
 
     def find_stock_item(self, stock_ref):
         """
@@ -159,8 +446,6 @@ class FashionShop:
         StockItem | None
             Returns a `StockItem` with a matching `stock_ref` else `None`
         """
-        if FashionShop.show_instrumentation:
-            print("**FashionShop find stock item called")
         return self.__stock_dictionary.get(stock_ref)
 
     def find_matching_with_tags(self, search_tags):
@@ -175,31 +460,233 @@ class FashionShop:
 
         Returns
         -------
-        list[StockItem]
-            list containing all StockItem's matching the
+        Iterator[StockItem]
+            iterator over all StockItem's matching the
             specified set of tags. If no matches are found
-            the list is empty
+            the iterator is empty
+
+        Notes
+        -----
+        The search intersects the tag index posting sets, starting from the
+        smallest, so the cost depends on the rarest tag rather than on the
+        size of the shop. An empty set of search tags matches every item
         """
+        if not search_tags:
+            return iter(self.__stock_dictionary.values())
+        return map(self.__stock_dictionary.__getitem__, self.__match_refs(search_tags))
 
-        def match_tags(item):
-            """
-            Checks if the given item matches the specified search tags
+    def find_page_with_tags(self, search_tags, page_size, token=None):
+        """
+        Get one page of the stock items that match all the specified search tags
 
-            Parameters
-            ----------
-            item : StockItem
-                StockItem to check for matching tags
+        Pages are ordered by `stock_ref`. Each page carries a token that
+        continues the search after its last item, so items stored or removed
+        between pages never cause the remaining items to be repeated or
+        skipped
 
-            Returns
-            -------
-            `True` if the search tags are a subset of `item.tags`, else `False`
-            """
-            return search_tags.issubset(item.tags)
+        Parameters
+        ----------
+        search_tags : set[str]
+            set of tags to search against.
+            Item's must match all tags
+        page_size : int
+            largest number of items to return
+        token : str | None, optional
+            token returned with the previous page, by default None which
+            returns the first page
+
+        Returns
+        -------
+        tuple[list[StockItem], str | None]
+            the items on the page, and the token for the next page or `None`
+            if this is the last page
 
-        if FashionShop.show_instrumentation:
-            print("**FashionShop find_matching_with_tags called")
-            print("**Search tags: {0}".format(search_tags))
-        return filter(match_tags, self.__stock_dictionary.values())
+        Raises
+        ------
+        ValueError
+            raised if `page_size` is less than 1
+        """
+        if page_size < 1:
+            raise ValueError("Page size must be at least 1")
+        if search_tags:
+            postings = []
+            for tag in search_tags:
+                posting = self.__tag_index.get(tag)
+                if posting is None:
+                    return [], None
+                postings.append(posting)
+            postings.sort(key=len)
+            page_refs = self.__walk_page(postings, page_size, token)
+            if page_refs is None:
+                # only the rarest tag's items can match, so the page is
+                # picked from them once the other tags are checked
+                matches = postings[0]
+                for posting in postings[1:]:
+                    matches = matches & posting
+                if token is not None:
+                    matches = [ref for ref in matches if ref > token]
+                page_refs = heapq.nsmallest(page_size + 1, matches)
+        else:
+            start = 0
+            if token is not None:
+                start = bisect.bisect_right(self.__ref_index, token)
+            page_refs = self.__ref_index[start : start + page_size + 1]
+        next_token = None
+        if len(page_refs) > page_size:
+            del page_refs[page_size:]
+            next_token = page_refs[-1]
+        return [self.__stock_dictionary[ref] for ref in page_refs], next_token
+
+    def __walk_page(self, postings, page_size, token):
+        """
+        Try to find a page by walking the sorted stock references on from
+        the token
+
+        When every search tag is carried by many items, matches are met
+        often and a page is found after a short walk. The walk gives up after
+        four times as many references as a page would need if the matches
+        were spread evenly, and never looks at more references than the
+        rarest tag has items
+
+        Parameters
+        ----------
+        postings : list[set[str]]
+            postings of the search tags, rarest first
+        page_size : int
+            largest number of items on the page
+        token : str | None
+            token returned with the previous page, or `None`
+
+        Returns
+        -------
+        list[str] | None
+            up to `page_size` + 1 matching stock references, or `None` if the
+            walk gave up
+        """
+        start = 0
+        if token is not None:
+            start = bisect.bisect_right(self.__ref_index, token)
+        rarest_count = len(postings[0])
+        limit = 4 * (page_size + 1) * len(self.__ref_index) // rarest_count
+        end = min(start + min(limit, rarest_count), len(self.__ref_index))
+        page_refs = []
+        for ref in self.__ref_index[start:end]:
+            if all(ref in posting for posting in postings):
+                page_refs.append(ref)
+                if len(page_refs) > page_size:
+                    return page_refs
+        if end == len(self.__ref_index):
+            return page_refs
+        return None
+
+    def find_in_price_range(self, low, high, tags=None):
+        """
+        Get stock items priced between `low` and `high`, in order of price
+
+        Parameters
+        ----------
+        low : int | float
+            lowest price to match (inclusive)
+        high : int | float
+            highest price to match (inclusive)
+        tags : set[str] | None, optional
+            if given, items must also match all these tags, by default None
+
+        Returns
+        -------
+        Iterator[StockItem]
+            lazily produced items in ascending order of price. Items with the
+            same price are ordered by `stock_ref`
+
+        Notes
+        -----
+        The price range is located by binary search over the price index.
+        When tags are given, whichever of the tag matches and the price range
+        is smaller drives the search. The shop should not be modified while
+        the results are being consumed
+        """
+        start = bisect.bisect_left(self.__price_index, low, key=lambda entry: entry[0])
+        end = bisect.bisect_right(self.__price_index, high, key=lambda entry: entry[0])
+        matches = None
+        if tags:
+            matches = self.__match_refs(tags)
+            if len(matches) < end - start:
+                return self.__sorted_by_price(matches, low, high)
+        return self.__price_range_items(start, end, matches)
+
+    def __price_range_items(self, start, end, matches):
+        """
+        Generate the items in a slice of the price index
+
+        Parameters
+        ----------
+        start : int
+            first position in the price index
+        end : int
+            position in the price index to stop at
+        matches : set[str] | None
+            if given, only items with a `stock_ref` in this set are produced
+
+        Yields
+        ------
+        StockItem
+            items in order of price
+        """
+        for position in range(start, end):
+            stock_ref = self.__price_index[position][1]
+            if matches is None or stock_ref in matches:
+                yield self.__stock_dictionary[stock_ref]
+
+    def __sorted_by_price(self, stock_refs, low, high):
+        """
+        Generate the items for a small set of stock references in price order
+
+        Parameters
+        ----------
+        stock_refs : set[str]
+            stock references to consider
+        low : int | float
+            lowest price to match (inclusive)
+        high : int | float
+            highest price to match (inclusive)
+
+        Yields
+        ------
+        StockItem
+            items priced in the range, in order of price
+        """
+        items = [self.__stock_dictionary[stock_ref] for stock_ref in stock_refs]
+        items = [item for item in items if low <= item.price <= high]
+        items.sort(key=lambda item: (item.price, item.stock_ref))
+        yield from items
+
+    def __match_refs(self, search_tags):
+        """
+        Get the stock references of the items carrying every search tag
+
+        Parameters
+        ----------
+        search_tags : set[str]
+            non-empty set of tags to search against
+
+        Returns
+        -------
+        set[str]
+            stock references matching all the tags
+        """
+        postings = []
+        for tag in search_tags:
+            posting = self.__tag_index.get(tag)
+            if posting is None:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        matches = set(postings[0])
+        for posting in postings[1:]:
+            matches.intersection_update(posting)
+            if not matches:
+                break
+        return matches
 
     def __str__(self):
         stock_list = "\n".join(map(str, self.__stock_dictionary.values()))
@@ -0,0 +1,335 @@
+"""
+Example 13.11n Instrumentation
+
+Provides switchable instrumentation for the fashion shop data classes
+
+Classes marked with `instrument` have their methods wrapped with timing code
+only while instrumentation is enabled. When it is disabled the original
+functions are bound back onto the class, so instrumented code runs at full
+speed with no checks. Measurements are recorded in a `MetricsRegistry`
+rather than printed
+
+Routine Listings
+----------------
+MetricsRegistry
+    class collecting call counts and timings, which can be dumped as JSON
+registry
+    the `MetricsRegistry` that instrumented methods record into
+instrument
+    class decorator marking a class for instrumentation
+enable
+    wrap the methods of every instrumented class with timing code
+disable
+    restore the original methods of every instrumented class
+is_enabled
+    check if instrumentation is enabled
+
+Examples
+--------
+>>> from Data import Instrumentation
+>>> Instrumentation.enable()
+>>> # ... use the shop ...
+>>> Instrumentation.disable()
+>>> print(Instrumentation.registry.to_json())
+"""
+
+import functools
+import json
+import threading
+import time
+
+
+class MetricsRegistry:
+    """
+    Collects the number of calls and time taken by named operations
+    """
+
+    def __init__(self):
+        """
+        Create a new, empty `MetricsRegistry`
+        """
+        self.__metrics = {}
+        self.__lock = threading.Lock()
+
+    def record(self, name, seconds):
+        """
+        Record a single call of an operation
+
+        Parameters
+        ----------
+        name : str
+            name of the operation
+        seconds : float
+            time the call took, in seconds
+
+        Returns
+        -------
+        None
+        """
+        with self.__lock:
+            metric = self.__metrics.get(name)
+            if metric is None:
+                self.__metrics[name] = [1, seconds, seconds]
+            else:
+                metric[0] += 1
+                metric[1] += seconds
+                if seconds > metric[2]:
+                    metric[2] = seconds
+
+    def calls(self, name):
+        """
+        Get the number of recorded calls of an operation
+
+        Parameters
+        ----------
+        name : str
+            name of the operation
+
+        Returns
+        -------
+        int
+            number of calls recorded, 0 if the operation has never been called
+        """
+        metric = self.__metrics.get(name)
+        return 0 if metric is None else metric[0]
+
+    def reset(self):
+        """
+        Discard all the recorded metrics
+
+        Returns
+        -------
+        None
+        """
+        with self.__lock:
+            self.__metrics = {}
+
+    def as_dict(self):
+        """
+        Get the recorded metrics
+
+        Returns
+        -------
+        dict[str, dict[str, int | float]]
+            for each operation name, the number of `calls` and the
+            `total_seconds`, `mean_seconds` and `max_seconds` taken
+        """
+        with self.__lock:
+            return {
+                name: {
+                    "calls": calls,
+                    "total_seconds": total,
+                    "mean_seconds": total / calls,
+                    "max_seconds": longest,
+                }
+                for name, (calls, total, longest) in sorted(self.__metrics.items())
+            }
+
+    def to_json(self, indent=2):
+        """
+        Get the recorded metrics as a JSON document
+
+        Parameters
+        ----------
+        indent : int | None, optional
+            indentation passed to `json.dumps`, by default 2
+
+        Returns
+        -------
+        str
+            the metrics returned by `as_dict`, encoded as JSON
+        """
+        return json.dumps(self.as_dict(), indent=indent)
+
+    def dump(self, filename):
+        """
+        Write the recorded metrics to a JSON file
+
+        Parameters
+        ----------
+        filename : str
+            path to the file to write
+
+        Returns
+        -------
+        None
+        """
+        with open(filename, "w") as output_file:
+            output_file.write(self.to_json())
+
+
+registry = MetricsRegistry()
+
+_instrumented_classes = []
+_original_attributes = {}
+_enabled = False
+
+
+def _timed(name, function):
+    """
+    Wrap a function so each call is recorded in `registry`
+
+    Parameters
+    ----------
+    name : str
+        name to record the calls under
+    function : Callable
+        function to wrap
+
+    Returns
+    -------
+    Callable
+        the wrapping function
+    """
+
+    @functools.wraps(function)
+    def timed_function(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            registry.record(name, time.perf_counter() - start)
+
+    return timed_function
+
+
+def _wrap_attribute(class_name, attribute_name, attribute):
+    """
+    Get the instrumented version of a class attribute
+
+    Parameters
+    ----------
+    class_name : str
+        name of the class the attribute belongs to
+    attribute_name : str
+        name of the attribute
+    attribute
+        the attribute, as found in the class `__dict__`
+
+    Returns
+    -------
+    Any | None
+        the instrumented attribute, or `None` if it is not instrumented
+    """
+    if attribute_name.startswith("_") and attribute_name not in (
+        "__init__",
+        "__str__",
+    ):
+        return None
+    name = "{0}.{1}".format(class_name, attribute_name)
+    if isinstance(attribute, staticmethod):
+        return staticmethod(_timed(name, attribute.__func__))
+    if isinstance(attribute, classmethod):
+        return classmethod(_timed(name, attribute.__func__))
+    if isinstance(attribute, property):
+        return attribute.getter(_timed(name, attribute.fget))
+    if callable(attribute):
+        return _timed(name, attribute)
+    return None
+
+
+def _wrap_class(cls):
+    """
+    Replace the methods of a class with instrumented versions
+
+    Parameters
+    ----------
+    cls : type
+        class to instrument
+
+    Returns
+    -------
+    None
+    """
+    originals = {}
+    for attribute_name, attribute in list(vars(cls).items()):
+        wrapped = _wrap_attribute(cls.__name__, attribute_name, attribute)
+        if wrapped is not None:
+            originals[attribute_name] = attribute
+            setattr(cls, attribute_name, wrapped)
+    _original_attributes[cls] = originals
+
+
+def _unwrap_class(cls):
+    """
+    Restore the original methods of an instrumented class
+
+    Parameters
+    ----------
+    cls : type
+        class to restore
+
+    Returns
+    -------
+    None
+    """
+    for attribute_name, attribute in _original_attributes.pop(cls, {}).items():
+        setattr(cls, attribute_name, attribute)
+
+
+def instrument(cls):
+    """
+    Class decorator marking a class for instrumentation
+
+    The public methods, static methods and property getters of the class,
+    along with `__init__` and `__str__`, are timed while instrumentation is
+    enabled. Calls are recorded as `"<class name>.<method name>"`
+
+    Parameters
+    ----------
+    cls : type
+        class to mark
+
+    Returns
+    -------
+    type
+        the class itself
+    """
+    _instrumented_classes.append(cls)
+    if _enabled:
+        _wrap_class(cls)
+    return cls
+
+
+def enable():
+    """
+    Wrap the methods of every instrumented class with timing code
+
+    Returns
+    -------
+    None
+    """
+    global _enabled
+    if _enabled:
+        return
+    _enabled = True
+    for cls in _instrumented_classes:
+        _wrap_class(cls)
+
+
+def disable():
+    """
+    Restore the original methods of every instrumented class
+
+    Returns
+    -------
+    None
+    """
+    global _enabled
+    if not _enabled:
+        return
+    _enabled = False
+    for cls in _instrumented_classes:
+        _unwrap_class(cls)
+
+
+def is_enabled():
+    """
+    Check if instrumentation is enabled
+
+    Returns
+    -------
+    bool
+        `True` if instrumented classes are recording metrics, else `False`
+    """
+    return _enabled
@@ -0,0 +1,435 @@
+"""
+Example 13.11l JournaledFashionShop
+
+Contains a `FashionShop` that saves its changes to an append-only journal
+
+Routine Listings
+----------------
+JournaledFashionShop
+    `FashionShop` that records every change in a journal file kept
+    alongside a pickled snapshot of the shop
+
+Notes
+-----
+The journal is stored in the file `<filename>.journal` as JSON Lines, one
+record per change. Each record is a list whose first element names the change
+
+- `["journal", generation]` header, matching the snapshot it applies to
+- `["new", stock_ref, price, tags, stock_level]` a new item was stored
+- `["stock", stock_ref, stock_level]` an item's stock level changed
+- `["stock_batch", [[stock_ref, stock_level], ...]]` a stock batch was applied
+- `["price", stock_ref, price]` an item's price changed
+- `["tags", stock_ref, text_tags]` an item's tags were reassigned
+- `["remove", stock_ref]` an item was removed
+
+See Also
+--------
+Data.FashionShop : Module containing the in-memory `FashionShop`
+"""
+
+import json
+import os
+import pickle
+
+from Data import FashionShop, Instrumentation, StockItem
+
+
+@Instrumentation.instrument
+class JournaledFashionShop(FashionShop.FashionShop):
+    """
+    `FashionShop` that saves its changes to an append-only journal
+
+    Every change to the shop or to a stored item is appended to the journal
+    as it happens, so saving only has to flush the journal to disk. Once the
+    journal holds `compact_after` records, saving writes a fresh snapshot
+    and starts an empty journal
+
+    Class Attributes
+    ----------------
+    compact_after : int
+        number of journal records after which a save compacts the journal
+        into a new snapshot
+    """
+
+    compact_after = 10000
+
+    def __init__(self):
+        """
+        Create a new, empty `JournaledFashionShop` instance
+
+        The shop is not attached to a file until it is first saved
+        """
+        super().__init__()
+        self.__init_journal(generation=0)
+
+    def __init_journal(self, generation):
+        """
+        Set the journal to its detached starting state
+
+        Parameters
+        ----------
+        generation : int
+            generation number of the snapshot the shop was loaded from
+
+        Returns
+        -------
+        None
+        """
+        self.__generation = generation
+        self.__filename = None
+        self.__journal_file = None
+        self.__pending = []
+        self.__journal_length = 0
+        self.__replaying = False
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state["_JournaledFashionShop__generation"] = self.__generation
+        return state
+
+    def __setstate__(self, state):
+        generation = state.pop("_JournaledFashionShop__generation", 0)
+        super().__setstate__(state)
+        self.__init_journal(generation)
+
+    @staticmethod
+    def journal_filename(filename):
+        """
+        Get the path of the journal belonging to a snapshot file
+
+        Parameters
+        ----------
+        filename : str
+            path to the snapshot file
+
+        Returns
+        -------
+        str
+            path to the journal file
+        """
+        return filename + ".journal"
+
+    @staticmethod
+    def load(filename):
+        """
+        Create a `JournaledFashionShop` from a snapshot and its journal
+
+        The snapshot may be a pickle written by `FashionShop.save`. The
+        journal is replayed on top of the snapshot, ignoring any record left
+        incomplete by a crash
+
+        Parameters
+        ----------
+        filename : str
+            path to the snapshot file
+
+        Returns
+        -------
+        JournaledFashionShop
+            the loaded shop, attached to `filename`
+
+        Raises
+        ------
+        FileNotFoundError
+            raised if neither the snapshot nor the journal exist
+        Exceptions
+            raised if the files fail to load
+        """
+        journal_filename = JournaledFashionShop.journal_filename(filename)
+        if os.path.exists(filename):
+            with open(filename, "rb") as input_file:
+                snapshot = pickle.load(input_file)
+            if isinstance(snapshot, JournaledFashionShop):
+                shop = snapshot
+            else:
+                shop = JournaledFashionShop()
+                shop.__replaying = True
+                for item in snapshot.find_matching_with_tags(set()):
+                    shop.store_new_stock_item(item)
+                shop.__replaying = False
+        elif os.path.exists(journal_filename):
+            shop = JournaledFashionShop()
+        else:
+            raise FileNotFoundError("No Fashion Shop saved in " + filename)
+
+        valid_length = shop.__replay(journal_filename)
+        shop.__attach(filename, valid_length)
+        return shop
+
+    def __replay(self, journal_filename):
+        """
+        Apply the records in a journal file to the shop
+
+        Parameters
+        ----------
+        journal_filename : str
+            path to the journal file
+
+        Returns
+        -------
+        int | None
+            length in bytes of the valid part of the journal, or `None` if
+            the journal is missing or belongs to an older snapshot
+        """
+        try:
+            journal_file = open(journal_filename, "rb")
+        except FileNotFoundError:
+            return None
+        self.__replaying = True
+        try:
+            with journal_file:
+                header = journal_file.readline()
+                try:
+                    if json.loads(header) != ["journal", self.__generation]:
+                        return None
+                except ValueError:
+                    return None
+                valid_length = len(header)
+                for line in journal_file:
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    self.__apply(record)
+                    self.__journal_length += 1
+                    valid_length += len(line)
+                return valid_length
+        finally:
+            self.__replaying = False
+
+    def __apply(self, record):
+        """
+        Apply a single journal record to the shop
+
+        Parameters
+        ----------
+        record : list
+            journal record to apply
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError
+            raised if the record type is not recognised
+        """
+        if record[0] == "stock_batch":
+            self.restore_stock_levels(dict(record[1]))
+            return
+        kind, stock_ref, *values = record
+        if kind == "new":
+            price, tags, stock_level = values
+            item = StockItem.StockItem(stock_ref, price, ",".join(tags))
+            item.restore_stock_level(stock_level)
+            self.store_new_stock_item(item)
+        elif kind == "stock":
+            self.find_stock_item(stock_ref).restore_stock_level(values[0])
+        elif kind == "price":
+            self.find_stock_item(stock_ref).set_price(values[0])
+        elif kind == "tags":
+            self.find_stock_item(stock_ref).text_tags = values[0]
+        elif kind == "remove":
+            self.remove_old_stock_item(stock_ref)
+        else:
+            raise ValueError("Unknown journal record {0}".format(kind))
+
+    def __attach(self, filename, valid_length):
+        """
+        Attach the shop to a snapshot file and open its journal for appending
+
+        Parameters
+        ----------
+        filename : str
+            path to the snapshot file
+        valid_length : int | None
+            length of the valid part of the existing journal, or `None` to
+            start a new journal for the current generation
+
+        Returns
+        -------
+        None
+        """
+        journal_filename = JournaledFashionShop.journal_filename(filename)
+        if valid_length is None:
+            temporary_filename = journal_filename + ".tmp"
+            with open(temporary_filename, "wb") as journal_file:
+                journal_file.write(self.__encode(["journal", self.__generation]))
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+            os.replace(temporary_filename, journal_filename)
+        else:
+            # drop any record left incomplete by a crash
+            os.truncate(journal_filename, valid_length)
+        self.close()
+        self.__filename = filename
+        self.__journal_file = open(journal_filename, "ab")
+        for line in self.__pending:
+            self.__journal_file.write(line)
+        self.__pending = []
+        self.__journal_file.flush()
+
+    @staticmethod
+    def __encode(record):
+        """
+        Encode a journal record as a line of JSON
+
+        Parameters
+        ----------
+        record : list
+            journal record to encode
+
+        Returns
+        -------
+        bytes
+            the encoded record, terminated with a newline
+        """
+        return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+    def __record(self, *record):
+        """
+        Append a record to the journal
+
+        Records are held in memory until the shop is attached to a file
+
+        Parameters
+        ----------
+        *record
+            values making up the journal record
+
+        Returns
+        -------
+        None
+        """
+        if self.__replaying:
+            return
+        line = self.__encode(record)
+        if self.__journal_file is None:
+            self.__pending.append(line)
+        else:
+            self.__journal_file.write(line)
+            self.__journal_file.flush()
+        self.__journal_length += 1
+
+    def save(self, filename):
+        """
+        Save the `JournaledFashionShop` to a given file
+
+        If the shop is attached to `filename` the journal is flushed to disk.
+        Otherwise, or once the journal holds `compact_after` records, a new
+        snapshot is written and the journal restarted
+
+        Parameters
+        ----------
+        filename : str
+            path to the snapshot file
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        Exceptions
+            raised if the file fails to save
+
+        See Also
+        --------
+        JournaledFashionShop.compact : write a new snapshot
+        """
+        if (
+            filename != self.__filename
+            or self.__journal_length >= JournaledFashionShop.compact_after
+        ):
+            self.compact(filename)
+            return
+        self.__journal_file.flush()
+        os.fsync(self.__journal_file.fileno())
+
+    def compact(self, filename):
+        """
+        Write a snapshot of the shop and start an empty journal
+
+        The snapshot is written to a temporary file and then moved into
+        place, and the new journal carries the snapshot's generation number,
+        so a crash part way through never loses changes
+
+        Parameters
+        ----------
+        filename : str
+            path to the snapshot file
+
+        Returns
+        -------
+        None
+        """
+        self.__generation += 1
+        temporary_filename = filename + ".tmp"
+        with open(temporary_filename, "wb") as output_file:
+            pickle.dump(self, output_file)
+            output_file.flush()
+            os.fsync(output_file.fileno())
+        os.replace(temporary_filename, filename)
+        self.__pending = []
+        self.__journal_length = 0
+        self.__attach(filename, None)
+
+    def close(self):
+        """
+        Close the journal file, if it is open
+
+        Returns
+        -------
+        None
+        """
+        if self.__journal_file is not None:
+            self.__journal_file.close()
+            self.__journal_file = None
+
+    def __is_stored(self, item):
+        """
+        Check if `item` is the item stored under its stock reference
+
+        Parameters
+        ----------
+        item : StockItem
+            item to check
+
+        Returns
+        -------
+        bool
+            `True` if the item is stored in this shop, else `False`
+        """
+        return self.find_stock_item(item.stock_ref) is item
+
+    def store_new_stock_item(self, item):
+        super().store_new_stock_item(item)
+        self.__record(
+            "new", item.stock_ref, item.price, sorted(item.tags), item.stock_level
+        )
+
+    def remove_old_stock_item(self, stock_ref):
+        super().remove_old_stock_item(stock_ref)
+        self.__record("remove", stock_ref)
+
+    def restore_stock_levels(self, stock_levels):
+        super().restore_stock_levels(stock_levels)
+        self.__record("stock_batch", list(map(list, stock_levels.items())))
+
+    def tags_updated(self, item, old_tags):
+        super().tags_updated(item, old_tags)
+        if self.__is_stored(item):
+            self.__record("tags", item.stock_ref, item.text_tags)
+
+    def price_updated(self, item, old_price):
+        super().price_updated(item, old_price)
+        if self.__is_stored(item):
+            self.__record("price", item.stock_ref, item.price)
+
+    def stock_updated(self, item, old_stock_level):
+        super().stock_updated(item, old_stock_level)
+        if self.__is_stored(item):
+            self.__record("stock", item.stock_ref, item.stock_level)
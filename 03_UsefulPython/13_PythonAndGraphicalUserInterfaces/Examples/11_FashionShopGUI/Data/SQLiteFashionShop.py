@@ -0,0 +1,486 @@
+"""
+Example 13.11m SQLiteFashionShop
+
+Contains a fashion shop storage class that keeps its inventory in an SQLite
+database
+
+Routine Listings
+----------------
+SQLiteFashionShop
+    Storage class supporting the Fashion Shop Data Management API, with
+    stock items held in indexed database tables rather than in memory
+
+See Also
+--------
+Data.FashionShop : Module containing the in-memory `FashionShop`
+Data.StockItem : Module containing implementations of inventory items
+"""
+
+import os
+import sqlite3
+import weakref
+
+from Data import Instrumentation, StockItem
+
+
+@Instrumentation.instrument
+class SQLiteFashionShop:
+    """
+    Represents the inventory management system of a Fashion Shop, stored
+    in an SQLite database
+
+    Items are read from the database when they are looked up, so opening a
+    shop costs the same however large it is. Every change is written to the
+    database in its own transaction as it happens
+
+    Notes
+    -----
+    While a `StockItem` returned by the shop is in use, looking up the same
+    stock reference returns the same object. Changes made through
+    `add_stock`, `sell_stock`, `set_price` and `text_tags` are written back to
+    the database. Timings for the methods are recorded by
+    `Data.Instrumentation` when instrumentation is enabled
+    """
+
+    schema = """
+CREATE TABLE IF NOT EXISTS stock_items (
+    stock_ref TEXT PRIMARY KEY,
+    price NUMERIC NOT NULL,
+    stock_level INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stock_items_by_price ON stock_items (price, stock_ref);
+CREATE TABLE IF NOT EXISTS stock_tags (
+    tag TEXT NOT NULL,
+    stock_ref TEXT NOT NULL,
+    PRIMARY KEY (tag, stock_ref)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS stock_tags_by_stock_ref ON stock_tags (stock_ref);
+"""
+
+    select_items = """
+SELECT stock_ref, price, stock_level,
+    (SELECT group_concat(tag, ',') FROM stock_tags
+        WHERE stock_tags.stock_ref = stock_items.stock_ref)
+FROM stock_items"""
+
+    def __init__(self, filename=":memory:"):
+        """
+        Create a new `SQLiteFashionShop` instance
+
+        Parameters
+        ----------
+        filename : str, optional
+            path to the database file, by default ":memory:" which keeps the
+            database in memory until the shop is saved
+        """
+        self.__filename = filename
+        self.__connection = sqlite3.connect(filename)
+        with self.__connection:
+            self.__connection.executescript(SQLiteFashionShop.schema)
+        self.__items = weakref.WeakValueDictionary()
+
+    def save(self, filename):
+        """
+        Save the `SQLiteFashionShop` to a given file
+
+        Changes are committed as they are made, so saving to the shop's own
+        database file does nothing. Otherwise the database is copied into
+        `filename`, and the shop then works on that file, so later changes
+        are written straight to it and saving to it again does nothing
+
+        Parameters
+        ----------
+        filename : str
+            path to the database file
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        sqlite3.Error
+            raised if the database fails to save
+        """
+        if filename == self.__filename:
+            return
+        destination = sqlite3.connect(filename)
+        try:
+            self.__connection.backup(destination)
+        except BaseException:
+            destination.close()
+            raise
+        self.__connection.close()
+        self.__connection = destination
+        self.__filename = filename
+
+    @staticmethod
+    def load(filename):
+        """
+        Open an `SQLiteFashionShop` stored in a database file
+
+        Parameters
+        ----------
+        filename : str
+            path to the database file
+
+        Returns
+        -------
+        SQLiteFashionShop
+            the shop stored in the file
+
+        Raises
+        ------
+        FileNotFoundError
+            raised if the file does not exist
+        sqlite3.DatabaseError
+            raised if the file is not an SQLite database
+        """
+        if not os.path.exists(filename):
+            raise FileNotFoundError("No Fashion Shop saved in " + filename)
+        return SQLiteFashionShop(filename)
+
+    def close(self):
+        """
+        Close the connection to the database
+
+        Returns
+        -------
+        None
+        """
+        self.__connection.close()
+
+    def __make_item(self, row):
+        """
+        Get the `StockItem` for a row of `select_items`
+
+        Parameters
+        ----------
+        row : tuple
+            stock reference, price, stock level and comma-separated tags
+
+        Returns
+        -------
+        StockItem
+            the item, reusing the object already in use if there is one
+        """
+        stock_ref, price, stock_level, text_tags = row
+        item = self.__items.get(stock_ref)
+        if item is not None:
+            return item
+        item = StockItem.StockItem(stock_ref, price, text_tags or "")
+        if text_tags is None:
+            item.tags = set()
+        item.restore_stock_level(stock_level)
+        item.receiver = self
+        self.__items[stock_ref] = item
+        return item
+
+    def __is_stored(self, item):
+        """
+        Check if `item` is the object in use for its stock reference
+
+        Parameters
+        ----------
+        item : StockItem
+            item to check
+
+        Returns
+        -------
+        bool
+            `True` if changes to the item belong in this shop, else `False`
+        """
+        return self.__items.get(item.stock_ref) is item
+
+    @staticmethod
+    def __tag_filter(search_tags):
+        """
+        Build an SQL condition matching items carrying every search tag
+
+        Parameters
+        ----------
+        search_tags : set[str]
+            non-empty set of tags to search against
+
+        Returns
+        -------
+        tuple[str, list[str]]
+            the condition and its parameters
+        """
+        select_tag = "SELECT stock_ref FROM stock_tags WHERE tag = ?"
+        condition = "stock_ref IN ({0})".format(
+            " INTERSECT ".join([select_tag] * len(search_tags))
+        )
+        return condition, list(search_tags)
+
+    def store_new_stock_item(self, item):
+        """
+        Store a new item in the reference system
+
+        The provided `item` can be indexed by it's `stock_ref` parameter
+
+        Parameters
+        ----------
+        item : StockItem
+            item to add to the inventory system
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        KeyError
+            Raised if the item's `stock_ref` is already registered as a key
+        """
+        try:
+            with self.__connection:
+                self.__connection.execute(
+                    "INSERT INTO stock_items VALUES (?, ?, ?)",
+                    (item.stock_ref, item.price, item.stock_level),
+                )
+                self.__connection.executemany(
+                    "INSERT INTO stock_tags VALUES (?, ?)",
+                    [(tag, item.stock_ref) for tag in item.tags],
+                )
+        except sqlite3.IntegrityError:
+            raise KeyError("This stock reference is already used")
+        self.__items[item.stock_ref] = item
+        item.receiver = self
+
+    def remove_old_stock_item(self, stock_ref):
+        """
+        Remove an old item in the reference system
+
+        Parameters
+        ----------
+        stock_ref : str
+            stock reference id of the item to remove
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        KeyError
+            Raised if the item's `stock_ref` is not registered as a key
+        """
+        with self.__connection:
+            cursor = self.__connection.execute(
+                "DELETE FROM stock_items WHERE stock_ref = ?", (stock_ref,)
+            )
+            if cursor.rowcount == 0:
+                raise KeyError(stock_ref)
+            self.__connection.execute(
+                "DELETE FROM stock_tags WHERE stock_ref = ?", (stock_ref,)
+            )
+        item = self.__items.pop(stock_ref, None)
+        if item is not None:
+            item.receiver = None
+
+    def tags_updated(self, item, old_tags):
+        """
+        Method to be called when a stored item's tags have been reassigned
+
+        Parameters
+        ----------
+        item : StockItem
+            the item whose tags changed
+        old_tags : set[str]
+            the tags the item held before the change
+
+        Returns
+        -------
+        None
+        """
+        if not self.__is_stored(item):
+            return
+        with self.__connection:
+            self.__connection.execute(
+                "DELETE FROM stock_tags WHERE stock_ref = ?", (item.stock_ref,)
+            )
+            self.__connection.executemany(
+                "INSERT INTO stock_tags VALUES (?, ?)",
+                [(tag, item.stock_ref) for tag in item.tags],
+            )
+
+    def price_updated(self, item, old_price):
+        """
+        Method to be called when a stored item's price has been changed
+
+        Parameters
+        ----------
+        item : StockItem
+            the item whose price changed
+        old_price : int | float
+            the price of the item before the change
+
+        Returns
+        -------
+        None
+        """
+        if not self.__is_stored(item):
+            return
+        with self.__connection:
+            self.__connection.execute(
+                "UPDATE stock_items SET price = ? WHERE stock_ref = ?",
+                (item.price, item.stock_ref),
+            )
+
+    def stock_updated(self, item, old_stock_level):
+        """
+        Method to be called when a stored item's stock level has changed
+
+        Parameters
+        ----------
+        item : StockItem
+            the item whose stock level changed
+        old_stock_level : int
+            the stock level of the item before the change
+
+        Returns
+        -------
+        None
+        """
+        if not self.__is_stored(item):
+            return
+        with self.__connection:
+            self.__connection.execute(
+                "UPDATE stock_items SET stock_level = ? WHERE stock_ref = ?",
+                (item.stock_level, item.stock_ref),
+            )
+
+    def find_stock_item(self, stock_ref):
+        """
+        Find the stock item with the corresponding reference id
+
+        Parameters
+        ----------
+        stock_ref : str
+            stock reference id of the item to find
+
+        Returns
+        -------
+        StockItem | None
+            Returns a `StockItem` with a matching `stock_ref` else `None`
+        """
+        item = self.__items.get(stock_ref)
+        if item is not None:
+            return item
+        row = self.__connection.execute(
+            SQLiteFashionShop.select_items + " WHERE stock_ref = ?", (stock_ref,)
+        ).fetchone()
+        if row is None:
+            return None
+        return self.__make_item(row)
+
+    def find_matching_with_tags(self, search_tags):
+        """
+        Get stock items that match all the specified search tags
+
+        Parameters
+        ----------
+        search_tags : set[str]
+            set of tags to search against.
+            Item's must match all tags
+
+        Returns
+        -------
+        Iterator[StockItem]
+            iterator over all StockItem's matching the
+            specified set of tags. If no matches are found
+            the iterator is empty
+        """
+        query = SQLiteFashionShop.select_items
+        parameters = []
+        if search_tags:
+            condition, parameters = SQLiteFashionShop.__tag_filter(search_tags)
+            query = query + " WHERE " + condition
+        return map(self.__make_item, self.__connection.execute(query, parameters))
+
+    def find_page_with_tags(self, search_tags, page_size, token=None):
+        """
+        Get one page of the stock items that match all the specified search tags
+
+        Pages are ordered by `stock_ref`. Each page carries a token that
+        continues the search after its last item, so items stored or removed
+        between pages never cause the remaining items to be repeated or
+        skipped
+
+        Parameters
+        ----------
+        search_tags : set[str]
+            set of tags to search against.
+            Item's must match all tags
+        page_size : int
+            largest number of items to return
+        token : str | None, optional
+            token returned with the previous page, by default None which
+            returns the first page
+
+        Returns
+        -------
+        tuple[list[StockItem], str | None]
+            the items on the page, and the token for the next page or `None`
+            if this is the last page
+
+        Raises
+        ------
+        ValueError
+            raised if `page_size` is less than 1
+        """
+        if page_size < 1:
+            raise ValueError("Page size must be at least 1")
+        conditions = []
+        parameters = []
+        if token is not None:
+            conditions.append("stock_ref > ?")
+            parameters.append(token)
+        if search_tags:
+            condition, tag_parameters = SQLiteFashionShop.__tag_filter(search_tags)
+            conditions.append(condition)
+            parameters = parameters + tag_parameters
+        query = SQLiteFashionShop.select_items
+        if conditions:
+            query = query + " WHERE " + " AND ".join(conditions)
+        query = query + " ORDER BY stock_ref LIMIT ?"
+        rows = self.__connection.execute(query, parameters + [page_size + 1]).fetchall()
+        items = list(map(self.__make_item, rows[:page_size]))
+        next_token = items[-1].stock_ref if len(rows) > page_size else None
+        return items, next_token
+
+    def find_in_price_range(self, low, high, tags=None):
+        """
+        Get stock items priced between `low` and `high`, in order of price
+
+        Parameters
+        ----------
+        low : int | float
+            lowest price to match (inclusive)
+        high : int | float
+            highest price to match (inclusive)
+        tags : set[str] | None, optional
+            if given, items must also match all these tags, by default None
+
+        Returns
+        -------
+        Iterator[StockItem]
+            lazily produced items in ascending order of price. Items with the
+            same price are ordered by `stock_ref`
+        """
+        query = SQLiteFashionShop.select_items + " WHERE price BETWEEN ? AND ?"
+        parameters = [low, high]
+        if tags:
+            condition, tag_parameters = SQLiteFashionShop.__tag_filter(tags)
+            query = query + " AND " + condition
+            parameters = parameters + tag_parameters
+        query = query + " ORDER BY price, stock_ref"
+        return map(self.__make_item, self.__connection.execute(query, parameters))
+
+    def __str__(self):
+        stock_list = "\n".join(map(str, self.find_matching_with_tags(set())))
+        template = """
+{0}
+"""
+        return template.format(stock_list)
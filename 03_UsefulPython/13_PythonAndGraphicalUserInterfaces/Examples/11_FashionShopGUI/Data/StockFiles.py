@@ -0,0 +1,243 @@
+"""
+Example 13.11p StockFiles
+
+Provides streaming import and export of stock items as CSV and JSON Lines
+
+Items are read and written one at a time, so files of any size can be
+processed in constant memory. Tags are stored in the comma-separated
+`StockItem.text_tags` format
+
+Routine Listings
+----------------
+read_csv
+    generate the stock items stored in a CSV file
+write_csv
+    write stock items to a CSV file
+read_json_lines
+    generate the stock items stored in a JSON Lines file
+write_json_lines
+    write stock items to a JSON Lines file
+import_stock
+    store stock items in a shop
+
+Examples
+--------
+Export a shop, and import the file into another shop
+
+>>> from Data import StockFiles
+>>> StockFiles.write_csv(shop.find_matching_with_tags(set()), "stock.csv")
+>>> StockFiles.import_stock(new_shop, StockFiles.read_csv("stock.csv"))
+
+See Also
+--------
+Data.StockItem : Module containing implementations of inventory items
+"""
+
+import csv
+import json
+
+from Data import StockItem
+
+FIELDS = ["stock_ref", "price", "stock_level", "tags"]
+
+
+def _make_item(stock_ref, price, stock_level, text_tags):
+    """
+    Create a stock item from values read from a file
+
+    Parameters
+    ----------
+    stock_ref : str
+        stock reference id
+    price : int | float | str
+        price of the item
+    stock_level : int | float | str
+        stock level of the item, which must be a whole number
+    text_tags : str
+        tags in `StockItem.text_tags` format
+
+    Returns
+    -------
+    StockItem
+        the new item
+
+    Raises
+    ------
+    ValueError
+        raised if the price or stock level is invalid
+    """
+    item = StockItem.StockItem(stock_ref, StockItem.StockItem.min_price, text_tags)
+    item.set_price(price)
+    if isinstance(stock_level, str):
+        stock_level = int(stock_level)
+    elif isinstance(stock_level, float) and stock_level.is_integer():
+        stock_level = int(stock_level)
+    elif isinstance(stock_level, bool) or not isinstance(stock_level, int):
+        raise ValueError("Stock level must be a whole number")
+    item.restore_stock_level(stock_level)
+    return item
+
+
+def read_csv(filename):
+    """
+    Generate the stock items stored in a CSV file
+
+    The file must start with a header row naming the columns
+    `stock_ref`, `price`, `stock_level` and `tags`
+
+    Parameters
+    ----------
+    filename : str
+        path to the CSV file
+
+    Yields
+    ------
+    StockItem
+        the item described by each row
+
+    Raises
+    ------
+    ValueError
+        raised if a row is invalid, naming its line number
+    """
+    with open(filename, newline="", encoding="utf-8") as input_file:
+        reader = csv.DictReader(input_file)
+        for row in reader:
+            try:
+                yield _make_item(
+                    row["stock_ref"], row["price"], row["stock_level"], row["tags"]
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(
+                    "Invalid stock item on line {0}: {1}".format(reader.line_num, e)
+                )
+
+
+def write_csv(items, filename):
+    """
+    Write stock items to a CSV file
+
+    Parameters
+    ----------
+    items : Iterable[StockItem]
+        items to write
+    filename : str
+        path to the CSV file. The file is overwritten if it already exists
+
+    Returns
+    -------
+    int
+        number of items written
+    """
+    count = 0
+    with open(filename, "w", newline="", encoding="utf-8") as output_file:
+        writer = csv.writer(output_file)
+        writer.writerow(FIELDS)
+        for item in items:
+            writer.writerow(
+                [item.stock_ref, item.price, item.stock_level, item.text_tags]
+            )
+            count = count + 1
+    return count
+
+
+def read_json_lines(filename):
+    """
+    Generate the stock items stored in a JSON Lines file
+
+    Each line must hold an object with the keys `stock_ref`, `price`,
+    `stock_level` and `tags`. Blank lines are skipped
+
+    Parameters
+    ----------
+    filename : str
+        path to the JSON Lines file
+
+    Yields
+    ------
+    StockItem
+        the item described by each line
+
+    Raises
+    ------
+    ValueError
+        raised if a line is invalid, naming its line number
+    """
+    with open(filename, encoding="utf-8") as input_file:
+        for line_number, line in enumerate(input_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                yield _make_item(
+                    record["stock_ref"],
+                    record["price"],
+                    record["stock_level"],
+                    record["tags"],
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(
+                    "Invalid stock item on line {0}: {1}".format(line_number, e)
+                )
+
+
+def write_json_lines(items, filename):
+    """
+    Write stock items to a JSON Lines file
+
+    Parameters
+    ----------
+    items : Iterable[StockItem]
+        items to write
+    filename : str
+        path to the JSON Lines file. The file is overwritten if it already
+        exists
+
+    Returns
+    -------
+    int
+        number of items written
+    """
+    count = 0
+    with open(filename, "w", encoding="utf-8") as output_file:
+        for item in items:
+            record = {
+                "stock_ref": item.stock_ref,
+                "price": item.price,
+                "stock_level": item.stock_level,
+                "tags": item.text_tags,
+            }
+            output_file.write(json.dumps(record) + "\n")
+            count = count + 1
+    return count
+
+
+def import_stock(shop, items):
+    """
+    Store stock items in a shop
+
+    Parameters
+    ----------
+    shop : Data Manager
+        shop supporting the Fashion Shop Data Management API
+    items : Iterable[StockItem]
+        items to store, such as those generated by `read_csv`
+
+    Returns
+    -------
+    int
+        number of items stored
+
+    Raises
+    ------
+    KeyError
+        raised if an item's `stock_ref` is already used in the shop. Items
+        before it have already been stored
+    ValueError
+        raised if the items cannot be read
+    """
+    count = 0
+    for item in items:
+        shop.store_new_stock_item(item)
+        count = count + 1
+    return count
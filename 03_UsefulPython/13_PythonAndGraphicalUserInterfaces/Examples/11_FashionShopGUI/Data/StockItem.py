@@ -9,7 +9,13 @@ StockItem
     class representing an in-memory stock item with a reference, stock level, price and descriptive tags
 """
 
+import math
+import sys
 
+from Data import Instrumentation
+
+
+@Instrumentation.instrument
 class StockItem:
     """
     Represents a single inventory item
@@ -20,20 +26,54 @@ class StockItem:
         reference id of the stock item
     tags : set[str]
         set of tags describing the stock item
+    receiver
+        object informed when the item's tags are reassigned through
+        `text_tags`, its price is changed through `set_price` or its stock
+        level changes, or `None`. The receiver must support the methods
+        `tags_updated(StockItem, set[str])`,
+        `price_updated(StockItem, int | float)` and
+        `stock_updated(StockItem, int)`
 
     Class Attributes
     ----------------
-    show_instrumentation : bool
-        Indicates if instrumentation should be printed
+    version : int
+        version of the stock item data model
     max_stock_add : int
         maximum amount of stock that can be added to an item's stock level at a time
     min_price : int | float
         minimum price of any stock item
     max_price : int | float
         maximum price of any stock item
+
+    Notes
+    -----
+    Timings for the methods and property getters are recorded by
+    `Data.Instrumentation` when instrumentation is enabled.
+
+    Items are stored in `__slots__` rather than a per-instance `__dict__`,
+    and tag strings are interned so items share a single copy of each tag
     """
 
-    show_instrumentation = False
+    __slots__ = (
+        "stock_ref",
+        "tags",
+        "receiver",
+        "__price",
+        "__stock_level",
+        "__StockItem_version",
+        "__weakref__",
+    )
+
+    # attribute names saved when an item is pickled
+    __state_names = (
+        "stock_ref",
+        "tags",
+        "_StockItem__price",
+        "_StockItem__stock_level",
+        "_StockItem__StockItem_version",
+    )
+
+    version = 6
 
     max_stock_add = 10
 
@@ -53,17 +93,14 @@ class StockItem:
         tags : str
             tags provided as a comma-separated string of values
         """
-        if StockItem.show_instrumentation:
-            print("**StockItem __init__ called")
+        self.receiver = None
         self.stock_ref = stock_ref
         self.__price = price
         self.text_tags = tags
         self.__stock_level = 0
-        self.__StockItem_version = 5
+        self.__StockItem_version = StockItem.version
 
     def __str__(self):
-        if StockItem.show_instrumentation:
-            print("**StockItem __str__ called")
         template = """Stock Reference: {0}
 Price: {1}
 Stock level: {2}
@@ -78,8 +115,6 @@ Tags: {3}"""
         price : int | float
             dress price
         """
-        if StockItem.show_instrumentation:
-            print("**StockItem get price called")
         return self.__price
 
     @property
@@ -88,8 +123,6 @@ Tags: {3}"""
         stock_level : int
             amount of stock in inventory
         """
-        if StockItem.show_instrumentation:
-            print("**StockItem get stock_level called")
         return self.__stock_level
 
     @property
@@ -104,7 +137,32 @@ Tags: {3}"""
 
     @text_tags.setter
     def text_tags(self, tag_string):
-        self.tags = set(map(str.strip, str.split(str.lower(tag_string), sep=",")))
+        old_tags = getattr(self, "tags", set())
+        self.tags = set(
+            map(sys.intern, map(str.strip, str.split(str.lower(tag_string), sep=",")))
+        )
+        if self.receiver is not None:
+            self.receiver.tags_updated(self, old_tags)
+
+    def __getstate__(self):
+        # the receiver is re-attached by whoever stores the item, so it
+        # is not pickled alongside the item
+        return {
+            name: getattr(self, name)
+            for name in StockItem.__state_names
+            if hasattr(self, name)
+        }
+
+    def __setstate__(self, state):
+        # items pickled before the move to __slots__ store their state as
+        # a dictionary of the same attribute names
+        if isinstance(state, tuple):
+            state = state[1]
+        self.receiver = None
+        for name, value in state.items():
+            if name in StockItem.__state_names:
+                setattr(self, name, value)
+        self.check_version()
 
     def check_version(self):
         """
@@ -114,12 +172,16 @@ Tags: {3}"""
         -------
         None
         """
-        if StockItem.show_instrumentation:
-            print("**StockItem check_version called")
-        if self.__StockItem_version < 4:
+        if getattr(self, "_StockItem__StockItem_version", 0) < 4:
             print("Stock item uses old data model, please recreate this item")
+            return
         if self.__StockItem_version == 4:
             pass  # tags will still be a set of strings
+        if self.__StockItem_version < StockItem.version:
+            # versions 4 and 5 hold the same attributes as an
+            # instance dictionary
+            self.tags = set(map(sys.intern, self.tags))
+            self.__StockItem_version = StockItem.version
 
     def add_stock(self, count):
         """
@@ -143,11 +205,12 @@ Tags: {3}"""
         --------
         StockItem.max_stock_add : maximum amount of stock that can be added to a `StockItem`
         """
-        if StockItem.show_instrumentation:
-            print("**StockItem add_stock called")
         if count <= 0 or count > StockItem.max_stock_add:
             raise ValueError("Invalid add amount")
+        old_stock_level = self.__stock_level
         self.__stock_level = self.__stock_level + count
+        if self.receiver is not None:
+            self.receiver.stock_updated(self, old_stock_level)
 
     def sell_stock(self, count):
         """
@@ -169,13 +232,39 @@ Tags: {3}"""
         ValueError
             raised if `count` < 1 or `count` is greater than the available stock
         """
-        if StockItem.show_instrumentation:
-            print("**StockItem sell_stock called")
         if count < 1:
             raise ValueError("Invalid number of items to sell")
         if count > self.__stock_level:
             raise ValueError("Not enough stock to sell")
+        old_stock_level = self.__stock_level
         self.__stock_level = self.__stock_level - count
+        if self.receiver is not None:
+            self.receiver.stock_updated(self, old_stock_level)
+
+    def restore_stock_level(self, stock_level):
+        """
+        Set the stock level of an item being rebuilt from saved data
+
+        Used by storage classes that persist items outside of a pickle.
+        The `add_stock` limits do not apply and the receiver is not informed
+
+        Parameters
+        ----------
+        stock_level : int
+            saved stock level of the item
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError
+            raised if `stock_level` is negative
+        """
+        if stock_level < 0:
+            raise ValueError("Invalid stock level")
+        self.__stock_level = stock_level
 
     def set_price(self, new_price):
         """
@@ -183,23 +272,32 @@ Tags: {3}"""
 
         Parameters
         ----------
-        new_price : int | float
-            new price of the item
+        new_price : int | float | str
+            new price of the item. Text is converted to an `int` if it
+            holds a whole number, otherwise to a `float`
 
         Raises
         ------
         ValueError
             Raised if the price is outside of the valid range
         ValueError
-            Raised if the price is not a number
+            Raised if the price is not a finite number
 
         """
-        if StockItem.show_instrumentation:
-            print("** StockItem set_price called")
-        try:
-            new_price = int(new_price)
-        except ValueError:
-            new_price = float(new_price)
+        if isinstance(new_price, str):
+            try:
+                new_price = int(new_price)
+            except ValueError:
+                new_price = float(new_price)
+        elif not isinstance(new_price, (int, float)):
+            raise ValueError("Price must be a number")
+        # NaN passes every comparison, so it would slip past the range check
+        # and break the order of the price index
+        if isinstance(new_price, float) and not math.isfinite(new_price):
+            raise ValueError("Price must be a finite number")
         if new_price < StockItem.min_price or new_price > StockItem.max_price:
             raise ValueError("Price out of range")
+        old_price = self.__price
         self.__price = new_price
+        if self.receiver is not None:
+            self.receiver.price_updated(self, old_price)
@@ -0,0 +1,634 @@
+"""
+Example 13.11q StockSnapshot
+
+Provides a binary snapshot format for a fashion shop that can be searched
+through a memory map without loading the whole shop
+
+Routine Listings
+----------------
+write_snapshot
+    write stock items to a snapshot file
+StockSnapshot
+    read-only storage class searching a snapshot file through `mmap`
+
+Notes
+-----
+All numbers are stored little-endian. The file holds, in order
+
+- a header: the magic bytes `FSSNAP1\\0` followed by seven unsigned 64-bit
+  values giving the item count, tag count and the offsets of the item
+  records, tag records, item tag ids, tag postings and price order sections
+- the string table: the UTF-8 text of every stock reference and tag
+- item records, sorted by stock reference. Each fixed-width record holds the
+  string table offset and length of the stock reference, the stock level,
+  the price, a flag marking whole-number prices and the position and count
+  of the item's tag ids
+- tag records, sorted by tag. Each fixed-width record holds the string table
+  offset and length of the tag and the position and count of its postings
+- item tag ids: unsigned 32-bit tag numbers for each item in turn
+- tag postings: unsigned 32-bit item numbers for each tag in turn
+- price order: unsigned 32-bit item numbers ordered by price and then
+  stock reference
+
+See Also
+--------
+Data.FashionShop : Module containing the in-memory `FashionShop`
+"""
+
+import array
+import bisect
+import mmap
+import os
+import struct
+import sys
+
+from Data import Instrumentation, StockItem
+
+MAGIC = b"FSSNAP1\0"
+HEADER = struct.Struct("<8s7Q")
+ITEM_RECORD = struct.Struct("<QIqdBQI")
+TAG_RECORD = struct.Struct("<QIQI")
+
+
+def write_snapshot(items, filename):
+    """
+    Write stock items to a snapshot file
+
+    The snapshot is written to a temporary file and then moved into place,
+    so a snapshot that is open while it is replaced is not affected
+
+    Parameters
+    ----------
+    items : Iterable[StockItem]
+        items to write, such as `shop.find_matching_with_tags(set())`
+    filename : str
+        path to the snapshot file
+
+    Returns
+    -------
+    int
+        number of items written
+    """
+    items = sorted(items, key=lambda item: item.stock_ref)
+    tags = sorted(set().union(*[item.tags for item in items]))
+    tag_numbers = {tag: number for number, tag in enumerate(tags)}
+
+    strings = bytearray()
+
+    def add_string(text):
+        data = text.encode("utf-8")
+        offset = len(strings)
+        strings.extend(data)
+        return offset, len(data)
+
+    item_records = bytearray()
+    item_tag_ids = array.array("I")
+    postings = [array.array("I") for _ in tags]
+    for number, item in enumerate(items):
+        ref_offset, ref_length = add_string(item.stock_ref)
+        tag_ids = sorted([tag_numbers[tag] for tag in item.tags])
+        item_records.extend(
+            ITEM_RECORD.pack(
+                ref_offset,
+                ref_length,
+                item.stock_level,
+                item.price,
+                isinstance(item.price, int),
+                len(item_tag_ids),
+                len(tag_ids),
+            )
+        )
+        item_tag_ids.extend(tag_ids)
+        for tag_id in tag_ids:
+            postings[tag_id].append(number)
+
+    tag_records = bytearray()
+    all_postings = array.array("I")
+    for tag, posting in zip(tags, postings):
+        name_offset, name_length = add_string(tag)
+        tag_records.extend(
+            TAG_RECORD.pack(name_offset, name_length, len(all_postings), len(posting))
+        )
+        all_postings.extend(posting)
+
+    price_order = array.array(
+        "I",
+        sorted(
+            range(len(items)),
+            key=lambda number: (items[number].price, items[number].stock_ref),
+        ),
+    )
+
+    sections = [
+        bytes(strings),
+        bytes(item_records),
+        bytes(tag_records),
+        _little_endian(item_tag_ids),
+        _little_endian(all_postings),
+        _little_endian(price_order),
+    ]
+    offsets = []
+    position = HEADER.size
+    for section in sections:
+        offsets.append(position)
+        position = position + len(section)
+
+    temporary_filename = filename + ".tmp"
+    with open(temporary_filename, "wb") as output_file:
+        output_file.write(HEADER.pack(MAGIC, len(items), len(tags), *offsets[1:]))
+        for section in sections:
+            output_file.write(section)
+    os.replace(temporary_filename, filename)
+    return len(items)
+
+
+def _little_endian(values):
+    """
+    Get the bytes of an array in little-endian order
+
+    Parameters
+    ----------
+    values : array.array
+        array to convert
+
+    Returns
+    -------
+    bytes
+        the array's contents, little-endian
+    """
+    if sys.byteorder != "little":
+        values = array.array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _holds(posting, number):
+    """
+    Check whether a tag's postings hold an item number
+
+    Parameters
+    ----------
+    posting : memoryview
+        item numbers in ascending order
+    number : int
+        item number to look for
+
+    Returns
+    -------
+    bool
+        `True` if the number is in the postings, else `False`
+    """
+    index = bisect.bisect_left(posting, number)
+    return index < len(posting) and posting[index] == number
+
+
+@Instrumentation.instrument
+class StockSnapshot:
+    """
+    Read-only storage class that searches a snapshot file through `mmap`
+
+    Opening a snapshot only maps the file into memory. Lookups by stock
+    reference binary search the item records, tag searches intersect the
+    tag postings, and price range queries binary search the price order.
+    A `StockItem` is only created for an item that is returned
+
+    Notes
+    -----
+    Items returned by a snapshot are copies. Changes to them are not stored,
+    and the snapshot cannot store or remove items. Use `save`, or
+    `write_snapshot` with the items of another shop, to write a new
+    snapshot. Snapshots can only be opened on little-endian machines.
+
+    Searches read their items from the file before they return, so their
+    results can still be used after the snapshot is closed
+    """
+
+    def __init__(self, filename):
+        """
+        Open a `StockSnapshot` file
+
+        Parameters
+        ----------
+        filename : str
+            path to the snapshot file
+
+        Raises
+        ------
+        ValueError
+            raised if the file is not a snapshot, or the machine is not
+            little-endian
+        """
+        if sys.byteorder != "little":
+            raise ValueError("Stock snapshots can only be opened little-endian")
+        with open(filename, "rb") as input_file:
+            self.__map = mmap.mmap(input_file.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self.__map) < HEADER.size:
+            self.__map.close()
+            raise ValueError("Not a stock snapshot: " + filename)
+        (
+            magic,
+            self.__item_count,
+            self.__tag_count,
+            self.__items_offset,
+            self.__tags_offset,
+            item_tag_ids_offset,
+            postings_offset,
+            price_order_offset,
+        ) = HEADER.unpack_from(self.__map)
+        if magic != MAGIC:
+            self.__map.close()
+            raise ValueError("Not a stock snapshot: " + filename)
+        self.__view = memoryview(self.__map)
+        self.__item_tag_ids = self.__view[item_tag_ids_offset:postings_offset].cast("I")
+        self.__postings = self.__view[postings_offset:price_order_offset].cast("I")
+        self.__price_order = self.__view[price_order_offset:].cast("I")
+
+    @staticmethod
+    def load(filename):
+        """
+        Open a `StockSnapshot` file
+
+        Parameters
+        ----------
+        filename : str
+            path to the snapshot file
+
+        Returns
+        -------
+        StockSnapshot
+            the opened snapshot
+
+        Raises
+        ------
+        FileNotFoundError
+            raised if the file does not exist
+        ValueError
+            raised if the file is not a snapshot
+        """
+        return StockSnapshot(filename)
+
+    def save(self, filename):
+        """
+        Write the items of the snapshot to a new snapshot file
+
+        Parameters
+        ----------
+        filename : str
+            path to the snapshot file
+
+        Returns
+        -------
+        None
+        """
+        write_snapshot(self.__all_items(), filename)
+
+    def close(self):
+        """
+        Release the memory map of the snapshot file
+
+        Returns
+        -------
+        None
+        """
+        self.__item_tag_ids.release()
+        self.__postings.release()
+        self.__price_order.release()
+        self.__view.release()
+        self.__map.close()
+
+    def __len__(self):
+        return self.__item_count
+
+    def __string(self, offset, length):
+        """
+        Read a string from the string table
+
+        Parameters
+        ----------
+        offset : int
+            position of the string in the string table
+        length : int
+            length of the string in bytes
+
+        Returns
+        -------
+        str
+            the decoded string
+        """
+        start = HEADER.size + offset
+        return str(self.__map[start : start + length], "utf-8")
+
+    def __item_record(self, number):
+        """
+        Read an item record
+
+        Parameters
+        ----------
+        number : int
+            number of the item
+
+        Returns
+        -------
+        tuple
+            the unpacked `ITEM_RECORD` fields
+        """
+        return ITEM_RECORD.unpack_from(
+            self.__map, self.__items_offset + number * ITEM_RECORD.size
+        )
+
+    def __stock_ref(self, number):
+        """
+        Read the stock reference of an item
+
+        Parameters
+        ----------
+        number : int
+            number of the item
+
+        Returns
+        -------
+        str
+            the item's stock reference
+        """
+        ref_offset, ref_length, *_ = self.__item_record(number)
+        return self.__string(ref_offset, ref_length)
+
+    def __price(self, number):
+        """
+        Read the price of an item
+
+        Parameters
+        ----------
+        number : int
+            number of the item
+
+        Returns
+        -------
+        float
+            the item's price
+        """
+        return self.__item_record(number)[3]
+
+    def __tag_name(self, tag_id):
+        """
+        Read the name of a tag
+
+        Parameters
+        ----------
+        tag_id : int
+            number of the tag
+
+        Returns
+        -------
+        str
+            the tag
+        """
+        offset, length, _, _ = TAG_RECORD.unpack_from(
+            self.__map, self.__tags_offset + tag_id * TAG_RECORD.size
+        )
+        return self.__string(offset, length)
+
+    def __make_item(self, number):
+        """
+        Create the `StockItem` for an item record
+
+        Parameters
+        ----------
+        number : int
+            number of the item
+
+        Returns
+        -------
+        StockItem
+            a new item holding the record's values
+        """
+        (
+            ref_offset,
+            ref_length,
+            stock_level,
+            price,
+            whole_price,
+            tags_start,
+            tag_count,
+        ) = self.__item_record(number)
+        tag_ids = self.__item_tag_ids[tags_start : tags_start + tag_count]
+        item = StockItem.StockItem(
+            self.__string(ref_offset, ref_length),
+            int(price) if whole_price else price,
+            ",".join(map(self.__tag_name, tag_ids)),
+        )
+        if tag_count == 0:
+            item.tags = set()
+        item.restore_stock_level(stock_level)
+        return item
+
+    def __posting(self, tag):
+        """
+        Find the numbers of the items carrying a tag
+
+        Parameters
+        ----------
+        tag : str
+            tag to look up
+
+        Returns
+        -------
+        memoryview
+            the tag's postings, empty if the tag is not in the snapshot
+        """
+        tag_id = bisect.bisect_left(range(self.__tag_count), tag, key=self.__tag_name)
+        if tag_id == self.__tag_count or self.__tag_name(tag_id) != tag:
+            return self.__postings[0:0]
+        _, _, start, count = TAG_RECORD.unpack_from(
+            self.__map, self.__tags_offset + tag_id * TAG_RECORD.size
+        )
+        return self.__postings[start : start + count]
+
+    def __match_numbers(self, search_tags):
+        """
+        Get the numbers of the items carrying every search tag
+
+        Parameters
+        ----------
+        search_tags : set[str]
+            non-empty set of tags to search against
+
+        Returns
+        -------
+        set[int]
+            numbers of the matching items
+        """
+        postings = sorted(map(self.__posting, search_tags), key=len)
+        matches = set(postings[0])
+        for posting in postings[1:]:
+            matches.intersection_update(posting)
+            if not matches:
+                break
+        return matches
+
+    def store_new_stock_item(self, item):
+        """
+        Snapshots are read-only, so items cannot be stored
+
+        Raises
+        ------
+        TypeError
+            always raised
+        """
+        raise TypeError("Stock snapshots are read-only")
+
+    def remove_old_stock_item(self, stock_ref):
+        """
+        Snapshots are read-only, so items cannot be removed
+
+        Raises
+        ------
+        TypeError
+            always raised
+        """
+        raise TypeError("Stock snapshots are read-only")
+
+    def find_stock_item(self, stock_ref):
+        """
+        Find the stock item with the corresponding reference id
+
+        Parameters
+        ----------
+        stock_ref : str
+            stock reference id of the item to find
+
+        Returns
+        -------
+        StockItem | None
+            Returns a `StockItem` with a matching `stock_ref` else `None`
+        """
+        number = bisect.bisect_left(
+            range(self.__item_count), stock_ref, key=self.__stock_ref
+        )
+        if number == self.__item_count or self.__stock_ref(number) != stock_ref:
+            return None
+        return self.__make_item(number)
+
+    def find_matching_with_tags(self, search_tags):
+        """
+        Get stock items that match all the specified search tags
+
+        Parameters
+        ----------
+        search_tags : set[str]
+            set of tags to search against.
+            Item's must match all tags
+
+        Returns
+        -------
+        Iterator[StockItem]
+            iterator over all StockItem's matching the
+            specified set of tags, in order of stock reference.
+            If no matches are found the iterator is empty
+        """
+        if not search_tags:
+            return iter(list(self.__all_items()))
+        numbers = sorted(self.__match_numbers(search_tags))
+        return iter(list(map(self.__make_item, numbers)))
+
+    def find_page_with_tags(self, search_tags, page_size, token=None):
+        """
+        Get one page of the stock items that match all the specified search tags
+
+        Pages are ordered by `stock_ref`. Each page carries a token that
+        continues the search after its last item, so items stored or removed
+        between pages never cause the remaining items to be repeated or
+        skipped
+
+        Parameters
+        ----------
+        search_tags : set[str]
+            set of tags to search against.
+            Item's must match all tags
+        page_size : int
+            largest number of items to return
+        token : str | None, optional
+            token returned with the previous page, by default None which
+            returns the first page
+
+        Returns
+        -------
+        tuple[list[StockItem], str | None]
+            the items on the page, and the token for the next page or `None`
+            if this is the last page
+
+        Raises
+        ------
+        ValueError
+            raised if `page_size` is less than 1
+        """
+        if page_size < 1:
+            raise ValueError("Page size must be at least 1")
+        start = 0
+        if token is not None:
+            start = bisect.bisect_right(
+                range(self.__item_count), token, key=self.__stock_ref
+            )
+        if search_tags:
+            # postings hold item numbers in ascending order, so walk the
+            # rarest tag's postings on from the token and search the others
+            postings = sorted(map(self.__posting, search_tags), key=len)
+            rarest = postings[0]
+            numbers = []
+            for index in range(bisect.bisect_left(rarest, start), len(rarest)):
+                number = rarest[index]
+                if all(_holds(posting, number) for posting in postings[1:]):
+                    numbers.append(number)
+                    if len(numbers) > page_size:
+                        break
+        else:
+            numbers = range(start, min(start + page_size + 1, self.__item_count))
+        items = list(map(self.__make_item, numbers[:page_size]))
+        next_token = items[-1].stock_ref if len(numbers) > page_size else None
+        return items, next_token
+
+    def find_in_price_range(self, low, high, tags=None):
+        """
+        Get stock items priced between `low` and `high`, in order of price
+
+        Parameters
+        ----------
+        low : int | float
+            lowest price to match (inclusive)
+        high : int | float
+            highest price to match (inclusive)
+        tags : set[str] | None, optional
+            if given, items must also match all these tags, by default None
+
+        Returns
+        -------
+        Iterator[StockItem]
+            items in ascending order of price. Items with the same price are
+            ordered by `stock_ref`
+        """
+        start = bisect.bisect_left(self.__price_order, low, key=self.__price)
+        end = bisect.bisect_right(self.__price_order, high, key=self.__price)
+        numbers = self.__price_order[start:end].tolist()
+        if tags:
+            matches = self.__match_numbers(tags)
+            numbers = [number for number in numbers if number in matches]
+        return iter(list(map(self.__make_item, numbers)))
+
+    def __all_items(self):
+        """
+        Get every item in the snapshot, reading each one only when it is
+        reached
+
+        Returns
+        -------
+        Iterator[StockItem]
+            a new item for each record, in order of stock reference
+        """
+        return map(self.__make_item, range(self.__item_count))
+
+    def __str__(self):
+        stock_list = "\n".join(map(str, self.__all_items()))
+        template = """
+{0}
+"""
+        return template.format(stock_list)
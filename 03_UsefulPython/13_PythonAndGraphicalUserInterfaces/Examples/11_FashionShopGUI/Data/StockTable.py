@@ -0,0 +1,712 @@
+"""
+Example 13.11o StockTable
+
+Contains a compact, column-based storage class for a fashion shop inventory
+
+Routine Listings
+----------------
+StockTable
+    Storage class supporting the Fashion Shop Data Management API, holding
+    stock items as columns of values rather than as individual objects
+
+See Also
+--------
+Data.FashionShop : Module containing the in-memory `FashionShop`
+Data.StockItem : Module containing implementations of inventory items
+"""
+
+import array
+import bisect
+import heapq
+import pickle
+import weakref
+
+from Data import Instrumentation, StockItem
+
+
+@Instrumentation.instrument
+class StockTable:
+    """
+    Represents the inventory management system of a Fashion Shop, stored
+    as columns
+
+    Each stock item occupies a row. Stock references are held in a list,
+    prices and stock levels in `array` columns, and tags are interned to
+    integer ids. The tag ids of every row are held in one flat pool, with
+    each row's offset into the pool and count of tags held in two more
+    columns. A stock reference is found from a sorted index of references,
+    kept alongside an `array` of their rows
+
+    Each tag id maps to an array of the rows carrying that tag. Rows are
+    not removed from these postings straight away when they lose a tag.
+    The entry is left in place and counted as stale, and is skipped by
+    searches, which check each row's own tags. A posting is rebuilt once
+    most of its entries are stale, so changing an item's tags takes
+    amortised constant time however many items carry the tag
+
+    Notes
+    -----
+    `StockItem` objects are only created when an item is looked up. While an
+    item is in use, looking up the same stock reference returns the same
+    object, and changes made through `add_stock`, `sell_stock`, `set_price`
+    and `text_tags` are written back to the table.
+
+    Prices are held as floats, so a whole-number price is returned as an
+    `int`
+    """
+
+    def __init__(self):
+        """
+        Create a new, empty `StockTable` instance
+        """
+        self.__stock_refs = []
+        self.__prices = array.array("d")
+        self.__stock_levels = array.array("q")
+        self.__tag_offsets = array.array("Q")
+        self.__tag_counts = array.array("H")
+        self.__tag_pool = array.array("I")
+        self.__unused_pool = 0
+        self.__sorted_refs = []
+        self.__sorted_rows = array.array("I")
+        self.__free_rows = []
+        self.__tag_ids = {}
+        self.__tag_names = []
+        self.__tag_rows = []
+        self.__stale_counts = array.array("I")
+        self.__items = weakref.WeakValueDictionary()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_StockTable__items"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__items = weakref.WeakValueDictionary()
+
+    def save(self, filename):
+        """
+        Save the `StockTable` to a given file
+
+        The table is saved as a pickled binary file in the file given
+        by `filename`. The file is created if it doesn't exist. If the file
+        already exists it is overwritten
+
+        Parameters
+        ----------
+        filename : str
+            path to the file to save
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        Exceptions
+            raised if the file fails to save
+        """
+        with open(filename, "wb") as output_file:
+            pickle.dump(self, output_file)
+
+    @staticmethod
+    def load(filename):
+        """
+        Create a `StockTable` instance from a pickled binary file
+
+        Parameters
+        ----------
+        filename : str
+            path to a file containing pickled `StockTable` data
+
+        Returns
+        -------
+        StockTable
+            the loaded `StockTable` instance
+
+        Raises
+        ------
+        Exceptions
+            raised if the file fails to load
+        """
+        with open(filename, "rb") as input_file:
+            table = pickle.load(input_file)
+        return table
+
+    def __tag_id(self, tag):
+        """
+        Get the integer id of a tag, allocating one for a new tag
+
+        Parameters
+        ----------
+        tag : str
+            tag to look up
+
+        Returns
+        -------
+        int
+            id of the tag
+        """
+        tag_id = self.__tag_ids.get(tag)
+        if tag_id is None:
+            tag_id = len(self.__tag_names)
+            self.__tag_ids[tag] = tag_id
+            self.__tag_names.append(tag)
+            self.__tag_rows.append(array.array("I"))
+            self.__stale_counts.append(0)
+        return tag_id
+
+    def __row_tag_ids(self, row):
+        """
+        Get the ids of the tags held for a row
+
+        Parameters
+        ----------
+        row : int
+            row to look up
+
+        Returns
+        -------
+        array.array
+            the row's tag ids, in ascending order
+        """
+        offset = self.__tag_offsets[row]
+        return self.__tag_pool[offset : offset + self.__tag_counts[row]]
+
+    def __set_row_tags(self, row, tags):
+        """
+        Replace the tags held for a row
+
+        Parameters
+        ----------
+        row : int
+            row to update
+        tags : set[str]
+            new tags of the row
+
+        Returns
+        -------
+        None
+        """
+        old_tag_ids = self.__row_tag_ids(row)
+        tag_ids = array.array("I", sorted(map(self.__tag_id, tags)))
+        for tag_id in old_tag_ids:
+            if tag_id not in tag_ids:
+                self.__stale_counts[tag_id] += 1
+        for tag_id in tag_ids:
+            if tag_id not in old_tag_ids:
+                self.__tag_rows[tag_id].append(row)
+
+        old_count = len(old_tag_ids)
+        if len(tag_ids) <= old_count:
+            offset = self.__tag_offsets[row]
+            self.__tag_pool[offset : offset + len(tag_ids)] = tag_ids
+            self.__unused_pool += old_count - len(tag_ids)
+        else:
+            self.__tag_offsets[row] = len(self.__tag_pool)
+            self.__tag_pool.extend(tag_ids)
+            self.__unused_pool += old_count
+        self.__tag_counts[row] = len(tag_ids)
+
+        for tag_id in old_tag_ids:
+            posting = self.__tag_rows[tag_id]
+            if 2 * self.__stale_counts[tag_id] > len(posting):
+                self.__compact_posting(tag_id)
+        if 2 * self.__unused_pool > len(self.__tag_pool):
+            self.__compact_pool()
+
+    def __compact_posting(self, tag_id):
+        """
+        Rebuild the rows of a tag without its stale entries
+
+        Parameters
+        ----------
+        tag_id : int
+            id of the tag
+
+        Returns
+        -------
+        None
+        """
+        live_rows = dict.fromkeys(
+            row for row in self.__tag_rows[tag_id] if tag_id in self.__row_tag_ids(row)
+        )
+        self.__tag_rows[tag_id] = array.array("I", live_rows)
+        self.__stale_counts[tag_id] = 0
+
+    def __compact_pool(self):
+        """
+        Rebuild the tag pool without the space left by shrunk rows
+
+        Returns
+        -------
+        None
+        """
+        pool = array.array("I")
+        for row in range(len(self.__stock_refs)):
+            tag_ids = self.__row_tag_ids(row)
+            self.__tag_offsets[row] = len(pool)
+            pool.extend(tag_ids)
+        self.__tag_pool = pool
+        self.__unused_pool = 0
+
+    def __find_row(self, stock_ref):
+        """
+        Find the row holding a stock reference
+
+        Parameters
+        ----------
+        stock_ref : str
+            stock reference to look up
+
+        Returns
+        -------
+        tuple[int, int | None]
+            the position of the reference in the sorted index, and its row or
+            `None` if the reference is not stored
+        """
+        position = bisect.bisect_left(self.__sorted_refs, stock_ref)
+        if (
+            position < len(self.__sorted_refs)
+            and self.__sorted_refs[position] == stock_ref
+        ):
+            return position, self.__sorted_rows[position]
+        return position, None
+
+    @staticmethod
+    def __price_value(price):
+        """
+        Convert a price held in the price column back to a number
+
+        Parameters
+        ----------
+        price : float
+            the stored price
+
+        Returns
+        -------
+        int | float
+            the price, as an `int` if it is a whole number
+        """
+        return int(price) if price.is_integer() else price
+
+    def __make_item(self, row):
+        """
+        Get the `StockItem` held in a row
+
+        Parameters
+        ----------
+        row : int
+            row of the item
+
+        Returns
+        -------
+        StockItem
+            the item, reusing the object already in use if there is one
+        """
+        stock_ref = self.__stock_refs[row]
+        item = self.__items.get(stock_ref)
+        if item is not None:
+            return item
+        tag_names = self.__tag_names
+        tag_ids = self.__row_tag_ids(row)
+        item = StockItem.StockItem(
+            stock_ref,
+            StockTable.__price_value(self.__prices[row]),
+            ",".join([tag_names[tag_id] for tag_id in tag_ids]),
+        )
+        if not tag_ids:
+            item.tags = set()
+        item.restore_stock_level(self.__stock_levels[row])
+        item.receiver = self
+        self.__items[stock_ref] = item
+        return item
+
+    def __stored_row(self, item):
+        """
+        Get the row of an item, if it is the object in use for its stock reference
+
+        Parameters
+        ----------
+        item : StockItem
+            item to look up
+
+        Returns
+        -------
+        int | None
+            the item's row, or `None` if changes to the item do not belong
+            in this table
+        """
+        if self.__items.get(item.stock_ref) is not item:
+            return None
+        return self.__find_row(item.stock_ref)[1]
+
+    def store_new_stock_item(self, item):
+        """
+        Store a new item in the reference system
+
+        The provided `item` can be indexed by it's `stock_ref` parameter
+
+        Parameters
+        ----------
+        item : StockItem
+            item to add to the inventory system
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        KeyError
+            Raised if the item's `stock_ref` is already registered as a key
+        """
+        position, row = self.__find_row(item.stock_ref)
+        if row is not None:
+            raise KeyError("This stock reference is already used")
+        if self.__free_rows:
+            row = self.__free_rows.pop()
+            self.__stock_refs[row] = item.stock_ref
+            self.__prices[row] = item.price
+            self.__stock_levels[row] = item.stock_level
+        else:
+            row = len(self.__stock_refs)
+            self.__stock_refs.append(item.stock_ref)
+            self.__prices.append(item.price)
+            self.__stock_levels.append(item.stock_level)
+            self.__tag_offsets.append(len(self.__tag_pool))
+            self.__tag_counts.append(0)
+        self.__set_row_tags(row, item.tags)
+        self.__sorted_refs.insert(position, item.stock_ref)
+        self.__sorted_rows.insert(position, row)
+        self.__items[item.stock_ref] = item
+        item.receiver = self
+
+    def remove_old_stock_item(self, stock_ref):
+        """
+        Remove an old item in the reference system
+
+        Parameters
+        ----------
+        stock_ref : str
+            stock reference id of the item to remove
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        KeyError
+            Raised if the item's `stock_ref` is not registered as a key
+        """
+        position, row = self.__find_row(stock_ref)
+        if row is None:
+            raise KeyError(stock_ref)
+        del self.__sorted_refs[position]
+        del self.__sorted_rows[position]
+        self.__set_row_tags(row, set())
+        self.__stock_refs[row] = None
+        self.__free_rows.append(row)
+        item = self.__items.pop(stock_ref, None)
+        if item is not None:
+            item.receiver = None
+
+    def tags_updated(self, item, old_tags):
+        """
+        Method to be called when a stored item's tags have been reassigned
+
+        Parameters
+        ----------
+        item : StockItem
+            the item whose tags changed
+        old_tags : set[str]
+            the tags the item held before the change
+
+        Returns
+        -------
+        None
+        """
+        row = self.__stored_row(item)
+        if row is not None:
+            self.__set_row_tags(row, item.tags)
+
+    def price_updated(self, item, old_price):
+        """
+        Method to be called when a stored item's price has been changed
+
+        Parameters
+        ----------
+        item : StockItem
+            the item whose price changed
+        old_price : int | float
+            the price of the item before the change
+
+        Returns
+        -------
+        None
+        """
+        row = self.__stored_row(item)
+        if row is not None:
+            self.__prices[row] = item.price
+
+    def stock_updated(self, item, old_stock_level):
+        """
+        Method to be called when a stored item's stock level has changed
+
+        Parameters
+        ----------
+        item : StockItem
+            the item whose stock level changed
+        old_stock_level : int
+            the stock level of the item before the change
+
+        Returns
+        -------
+        None
+        """
+        row = self.__stored_row(item)
+        if row is not None:
+            self.__stock_levels[row] = item.stock_level
+
+    def find_stock_item(self, stock_ref):
+        """
+        Find the stock item with the corresponding reference id
+
+        Parameters
+        ----------
+        stock_ref : str
+            stock reference id of the item to find
+
+        Returns
+        -------
+        StockItem | None
+            Returns a `StockItem` with a matching `stock_ref` else `None`
+        """
+        row = self.__find_row(stock_ref)[1]
+        if row is None:
+            return None
+        return self.__make_item(row)
+
+    def __match_rows(self, search_tags):
+        """
+        Get the rows of the items carrying every search tag
+
+        Parameters
+        ----------
+        search_tags : set[str]
+            non-empty set of tags to search against
+
+        Returns
+        -------
+        set[int]
+            rows matching all the tags
+        """
+        tag_ids = []
+        for tag in search_tags:
+            tag_id = self.__tag_ids.get(tag)
+            if tag_id is None:
+                return set()
+            tag_ids.append(tag_id)
+        tag_ids.sort(
+            key=lambda tag_id: (
+                len(self.__tag_rows[tag_id]) - self.__stale_counts[tag_id]
+            )
+        )
+        matches = set(self.__tag_rows[tag_ids[0]])
+        for tag_id in tag_ids[1:]:
+            matches.intersection_update(self.__tag_rows[tag_id])
+            if not matches:
+                return matches
+        # stale entries can only add rows that no longer carry a tag, so only
+        # the tags with stale entries need checking against each row's tags
+        pool = self.__tag_pool
+        offsets = self.__tag_offsets
+        counts = self.__tag_counts
+        for tag_id in tag_ids:
+            if self.__stale_counts[tag_id]:
+                matches = {
+                    row
+                    for row in matches
+                    if tag_id in pool[offsets[row] : offsets[row] + counts[row]]
+                }
+        return matches
+
+    def __used_rows(self):
+        """
+        Generate the rows holding an item, in row order
+
+        Yields
+        ------
+        int
+            row holding an item
+        """
+        for row, stock_ref in enumerate(self.__stock_refs):
+            if stock_ref is not None:
+                yield row
+
+    def find_matching_with_tags(self, search_tags):
+        """
+        Get stock items that match all the specified search tags
+
+        Parameters
+        ----------
+        search_tags : set[str]
+            set of tags to search against.
+            Item's must match all tags
+
+        Returns
+        -------
+        Iterator[StockItem]
+            iterator over all StockItem's matching the
+            specified set of tags. If no matches are found
+            the iterator is empty
+        """
+        if not search_tags:
+            return map(self.__make_item, self.__used_rows())
+        return map(self.__make_item, sorted(self.__match_rows(search_tags)))
+
+    def find_page_with_tags(self, search_tags, page_size, token=None):
+        """
+        Get one page of the stock items that match all the specified search tags
+
+        Pages are ordered by `stock_ref`. Each page carries a token that
+        continues the search after its last item, so items stored or removed
+        between pages never cause the remaining items to be repeated or
+        skipped
+
+        Parameters
+        ----------
+        search_tags : set[str]
+            set of tags to search against.
+            Item's must match all tags
+        page_size : int
+            largest number of items to return
+        token : str | None, optional
+            token returned with the previous page, by default None which
+            returns the first page
+
+        Returns
+        -------
+        tuple[list[StockItem], str | None]
+            the items on the page, and the token for the next page or `None`
+            if this is the last page
+
+        Raises
+        ------
+        ValueError
+            raised if `page_size` is less than 1
+
+        Notes
+        -----
+        When every search tag is carried by many rows, the page is found by a
+        short walk through the sorted stock references. Otherwise the page is
+        picked from the rows of the rarest search tag
+        """
+        if page_size < 1:
+            raise ValueError("Page size must be at least 1")
+        start = 0
+        if token is not None:
+            start = bisect.bisect_right(self.__sorted_refs, token)
+        if search_tags:
+            tag_ids = list(map(self.__tag_ids.get, search_tags))
+            if None in tag_ids:
+                return [], None
+            rarest_count = min(
+                len(self.__tag_rows[tag_id]) - self.__stale_counts[tag_id]
+                for tag_id in tag_ids
+            )
+            if rarest_count == 0:
+                return [], None
+            page_rows = self.__walk_page(tag_ids, rarest_count, page_size, start)
+            if page_rows is None:
+                stock_refs = self.__stock_refs
+                rows = self.__match_rows(search_tags)
+                if token is not None:
+                    rows = [row for row in rows if stock_refs[row] > token]
+                page_rows = heapq.nsmallest(
+                    page_size + 1, rows, key=stock_refs.__getitem__
+                )
+        else:
+            page_rows = self.__sorted_rows[start : start + page_size + 1]
+        items = [self.__make_item(row) for row in page_rows[:page_size]]
+        next_token = items[-1].stock_ref if len(page_rows) > page_size else None
+        return items, next_token
+
+    def __walk_page(self, tag_ids, rarest_count, page_size, start):
+        """
+        Try to find a page by walking the sorted stock references
+
+        The walk gives up after four times as many rows as a page would need
+        if the matches were spread evenly, and never looks at more rows than
+        the rarest tag has
+
+        Parameters
+        ----------
+        tag_ids : list[int]
+            ids of the search tags
+        rarest_count : int
+            number of rows carrying the rarest search tag
+        page_size : int
+            largest number of items on the page
+        start : int
+            position in the sorted stock references to start from
+
+        Returns
+        -------
+        list[int] | None
+            up to `page_size` + 1 matching rows, or `None` if the walk gave up
+        """
+        row_count = len(self.__sorted_rows)
+        limit = 4 * (page_size + 1) * row_count // rarest_count
+        end = min(start + min(limit, rarest_count), row_count)
+        pool = self.__tag_pool
+        offsets = self.__tag_offsets
+        counts = self.__tag_counts
+        page_rows = []
+        for row in self.__sorted_rows[start:end]:
+            row_tag_ids = pool[offsets[row] : offsets[row] + counts[row]]
+            if all(tag_id in row_tag_ids for tag_id in tag_ids):
+                page_rows.append(row)
+                if len(page_rows) > page_size:
+                    return page_rows
+        if end == row_count:
+            return page_rows
+        return None
+
+    def find_in_price_range(self, low, high, tags=None):
+        """
+        Get stock items priced between `low` and `high`, in order of price
+
+        Parameters
+        ----------
+        low : int | float
+            lowest price to match (inclusive)
+        high : int | float
+            highest price to match (inclusive)
+        tags : set[str] | None, optional
+            if given, items must also match all these tags, by default None
+
+        Returns
+        -------
+        Iterator[StockItem]
+            lazily produced items in ascending order of price. Items with the
+            same price are ordered by `stock_ref`
+
+        Notes
+        -----
+        The table keeps no price index, so the price column is scanned
+        """
+        rows = self.__match_rows(tags) if tags else self.__used_rows()
+        prices = self.__prices
+        stock_refs = self.__stock_refs
+        matches = [row for row in rows if low <= prices[row] <= high]
+        matches.sort(key=lambda row: (prices[row], stock_refs[row]))
+        return map(self.__make_item, matches)
+
+    def __str__(self):
+        stock_list = "\n".join(map(str, self.find_matching_with_tags(set())))
+        template = """
+{0}
+"""
+        return template.format(stock_list)
@@ -7,6 +7,18 @@ Modules
 -------
 FashionShop
     Module providing implementations for handling collections of items making up inventory
+Instrumentation
+    Module providing switchable call count and timing metrics for the data classes
+JournaledFashionShop
+    Module providing a fashion shop that saves its changes to an append-only journal
+SQLiteFashionShop
+    Module providing a fashion shop that keeps its inventory in an SQLite database
+StockFiles
+    Module providing streaming import and export of stock items as CSV and JSON Lines
 StockItem
     Module providing implementations for representing an inventory item
+StockSnapshot
+    Module providing a memory-mapped, read-only snapshot format for fast startup
+StockTable
+    Module providing a compact, column-based fashion shop storage class
 """
@@ -3,17 +3,37 @@ Example 13.11j FashionShopShellUI
 
 Loads and runs a shell-based Fashion Shop Inventory Management System. Only
 runs if executed as the main program
+
+Pass `--sqlite` to keep the stock in an SQLite database, which opens without
+reading every item into memory
 """
 
 if __name__ == "__main__":
-    from Data import FashionShop
+    import argparse
+
+    from Data import JournaledFashionShop, SQLiteFashionShop
     from UI.ShellUI import FashionShopApplication
 
     # load the UI implementation
     ui = FashionShopApplication.FashionShopApplication
 
+    parser = argparse.ArgumentParser(
+        description="Run the shell-based Fashion Shop application"
+    )
+    parser.add_argument(
+        "--sqlite",
+        action="store_true",
+        help="store the stock in an SQLite database rather than a pickle",
+    )
+    args = parser.parse_args()
+
     # load the data management implementation
-    shop = FashionShop.FashionShop
+    if args.sqlite:
+        shop = SQLiteFashionShop.SQLiteFashionShop
+        filename = "fashionshop.db"
+    else:
+        shop = JournaledFashionShop.JournaledFashionShop
+        filename = "fashionshop.pickle"
 
-    app = ui(filename="fashionshop.pickle", storage_class=shop)
+    app = ui(filename=filename, storage_class=shop)
     app.main_menu()
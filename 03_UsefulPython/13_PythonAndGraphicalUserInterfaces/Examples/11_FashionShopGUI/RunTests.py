@@ -6,7 +6,47 @@ Uses the unittest package to provide a complete set of tests for StockItem
 
 import unittest
 
-from Data import StockItem
+import json
+import os
+import pickle
+import tempfile
+
+from Data import (
+    FashionShop,
+    Instrumentation,
+    JournaledFashionShop,
+    SQLiteFashionShop,
+    StockFiles,
+    StockItem,
+    StockSnapshot,
+    StockTable,
+)
+
+
+def page_refs(shop, tags, page_size):
+    pages = []
+    token = None
+    while True:
+        items, token = shop.find_page_with_tags(tags, page_size, token)
+        pages.append([item.stock_ref for item in items])
+        if token is None:
+            return pages
+
+
+def check_tag_pages(test, shop):
+    # common, rare and disjoint tags exercise each way a page can be found
+    for i in range(300):
+        tags = ["even" if i % 2 else "odd", "sale"]
+        if i % 50 == 7:
+            tags.append("rare")
+        shop.store_new_stock_item(
+            StockItem.StockItem("P{0:03d}".format(i), price=10, tags=",".join(tags))
+        )
+    for tags in [{"sale"}, {"rare"}, {"odd", "rare"}, {"even", "odd"}]:
+        expected = sorted(item.stock_ref for item in shop.find_matching_with_tags(tags))
+        pages = page_refs(shop, tags, 4)
+        test.assertEqual([ref for page in pages for ref in page], expected)
+        test.assertTrue(all(len(page) == 4 for page in pages[:-1]))
 
 
 class TestStockItem(unittest.TestCase):
@@ -63,6 +103,637 @@ Tags: test:tag"""
         with self.assertRaises(Exception):
             item.sell_stock(1)
 
+    def test_set_price(self):
+        item = StockItem.StockItem(stock_ref="Test", price=10, tags="test:tag")
+        item.set_price(12.5)
+        self.assertEqual(item.price, 12.5)
+        item.set_price("20")
+        self.assertEqual(item.price, 20)
+        item.set_price("20.5")
+        self.assertEqual(item.price, 20.5)
+
+    def test_set_price_out_of_range_raises_exception(self):
+        item = StockItem.StockItem(stock_ref="Test", price=10, tags="test:tag")
+        with self.assertRaises(ValueError):
+            item.set_price(StockItem.StockItem.max_price + 1)
+        with self.assertRaises(ValueError):
+            item.set_price("cheap")
+        for price in ["nan", float("nan"), float("inf")]:
+            with self.assertRaises(ValueError):
+                item.set_price(price)
+        self.assertEqual(item.price, 10)
+
+    def test_item_has_no_instance_dictionary(self):
+        item = StockItem.StockItem(stock_ref="Test", price=10, tags="test:tag")
+        self.assertFalse(hasattr(item, "__dict__"))
+
+    def test_pickle_round_trip(self):
+        item = StockItem.StockItem(stock_ref="Test", price=10, tags="test:tag")
+        item.add_stock(3)
+        copy = pickle.loads(pickle.dumps(item))
+        self.assertEqual(str(copy), str(item))
+        self.assertIsNone(copy.receiver)
+
+    def test_version_4_state_upgraded(self):
+        item = StockItem.StockItem.__new__(StockItem.StockItem)
+        item.__setstate__(
+            {
+                "stock_ref": "Old",
+                "_StockItem__price": 80,
+                "tags": {"dress"},
+                "_StockItem__stock_level": 10,
+                "_StockItem__StockItem_version": 4,
+            }
+        )
+        self.assertEqual(item.price, 80)
+        self.assertEqual(item.stock_level, 10)
+        self.assertEqual(
+            item._StockItem__StockItem_version, StockItem.StockItem.version
+        )
+
+
+class TestFashionShop(unittest.TestCase):
+    def setUp(self):
+        self.shop = FashionShop.FashionShop()
+        self.shop.store_new_stock_item(
+            StockItem.StockItem("D1", price=10, tags="dress,red")
+        )
+        self.shop.store_new_stock_item(
+            StockItem.StockItem("D2", price=20, tags="dress,blue")
+        )
+        self.shop.store_new_stock_item(
+            StockItem.StockItem("S1", price=30, tags="shoes,red")
+        )
+
+    def matching_refs(self, tags):
+        return {item.stock_ref for item in self.shop.find_matching_with_tags(tags)}
+
+    def test_find_matching_with_tags(self):
+        self.assertEqual(self.matching_refs({"dress"}), {"D1", "D2"})
+        self.assertEqual(self.matching_refs({"red", "dress"}), {"D1"})
+        self.assertEqual(self.matching_refs({"red", "hat"}), set())
+
+    def test_find_matching_with_no_tags_returns_all(self):
+        self.assertEqual(self.matching_refs(set()), {"D1", "D2", "S1"})
+
+    def test_reassigning_text_tags_updates_index(self):
+        self.shop.find_stock_item("D2").text_tags = "dress,red"
+        self.assertEqual(self.matching_refs({"red", "dress"}), {"D1", "D2"})
+        self.assertEqual(self.matching_refs({"blue"}), set())
+
+    def test_removed_item_is_not_matched(self):
+        self.shop.remove_old_stock_item("D1")
+        self.assertEqual(self.matching_refs({"red"}), {"S1"})
+
+    def test_index_rebuilt_after_pickling(self):
+        shop = pickle.loads(pickle.dumps(self.shop))
+        shop.find_stock_item("S1").text_tags = "shoes,blue"
+        refs = {item.stock_ref for item in shop.find_matching_with_tags({"blue"})}
+        self.assertEqual(refs, {"D2", "S1"})
+
+    def test_find_page_with_tags(self):
+        self.assertEqual(page_refs(self.shop, set(), 2), [["D1", "D2"], ["S1"]])
+        self.assertEqual(page_refs(self.shop, {"red"}, 1), [["D1"], ["S1"]])
+        self.assertEqual(page_refs(self.shop, {"red", "dress"}, 1), [["D1"]])
+        self.assertEqual(page_refs(self.shop, {"red", "hat"}, 1), [[]])
+        self.assertEqual(page_refs(self.shop, {"hat"}, 1), [[]])
+        with self.assertRaises(ValueError):
+            self.shop.find_page_with_tags(set(), 0)
+        check_tag_pages(self, self.shop)
+
+    def test_pages_stable_when_shop_changes(self):
+        items, token = self.shop.find_page_with_tags({"red"}, 1)
+        self.assertEqual([item.stock_ref for item in items], ["D1"])
+        self.shop.store_new_stock_item(StockItem.StockItem("C1", 5, "red"))
+        self.shop.store_new_stock_item(StockItem.StockItem("E1", 5, "red"))
+        self.shop.remove_old_stock_item("D1")
+        items, token = self.shop.find_page_with_tags({"red"}, 5, token)
+        self.assertEqual([item.stock_ref for item in items], ["E1", "S1"])
+        self.assertIsNone(token)
+        items, token = self.shop.find_page_with_tags(set(), 2, "D1")
+        self.assertEqual([item.stock_ref for item in items], ["D2", "E1"])
+        self.assertEqual(token, "E1")
+
+    def price_range_refs(self, low, high, tags=None):
+        return [
+            item.stock_ref for item in self.shop.find_in_price_range(low, high, tags)
+        ]
+
+    def test_find_in_price_range(self):
+        self.assertEqual(self.price_range_refs(10, 20), ["D1", "D2"])
+        self.assertEqual(self.price_range_refs(15, 100), ["D2", "S1"])
+        self.assertEqual(self.price_range_refs(40, 50), [])
+
+    def test_find_in_price_range_with_tags(self):
+        self.assertEqual(self.price_range_refs(0, 100, {"red"}), ["D1", "S1"])
+        self.assertEqual(self.price_range_refs(15, 100, {"dress"}), ["D2"])
+
+    def test_set_price_updates_price_index(self):
+        self.shop.find_stock_item("S1").set_price(5)
+        self.assertEqual(self.price_range_refs(0, 15), ["S1", "D1"])
+        self.assertEqual(self.price_range_refs(25, 35), [])
+
+    def test_apply_stock_batch(self):
+        errors = self.shop.apply_stock_batch([("D1", 200), ("D2", "5"), ("D1", 3)])
+        self.assertEqual(errors, [])
+        self.assertEqual(self.shop.find_stock_item("D1").stock_level, 203)
+        self.assertEqual(self.shop.find_stock_item("D2").stock_level, 5)
+
+    def test_invalid_stock_batch_changes_nothing(self):
+        errors = self.shop.apply_stock_batch(
+            [("D1", 5), ("X1", 1), ("D2", "many"), ("D2", 0), ("S1",)]
+        )
+        self.assertEqual(
+            errors,
+            [
+                (2, "X1", "Item not found"),
+                (3, None, "Invalid batch line"),
+                (4, "D2", "Invalid add amount"),
+                (5, None, "Invalid batch line"),
+            ],
+        )
+        self.assertEqual(self.shop.find_stock_item("D1").stock_level, 0)
+
+    def test_sell_batch(self):
+        self.shop.apply_stock_batch([("D1", 10), ("D2", 10)])
+        self.assertEqual(self.shop.sell_batch([("D1", 4), ("D2", 10), ("D1", 6)]), [])
+        self.assertEqual(self.shop.find_stock_item("D1").stock_level, 0)
+        self.assertEqual(self.shop.find_stock_item("D2").stock_level, 0)
+
+    def test_sell_batch_checks_running_stock_level(self):
+        self.shop.apply_stock_batch([("D1", 10)])
+        errors = self.shop.sell_batch([("D1", 6), ("D1", 6)])
+        self.assertEqual(errors, [(2, "D1", "Not enough stock to sell")])
+        self.assertEqual(self.shop.find_stock_item("D1").stock_level, 10)
+
+
+class TestJournaledFashionShop(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, "shop.pickle")
+        self.shop = JournaledFashionShop.JournaledFashionShop()
+        self.addCleanup(self.shop.close)
+        item = StockItem.StockItem("D1", price=10, tags="dress,red")
+        item.add_stock(5)
+        self.shop.store_new_stock_item(item)
+        self.shop.store_new_stock_item(
+            StockItem.StockItem("D2", price=20, tags="dress,blue")
+        )
+        self.shop.save(self.filename)
+
+    def reload(self):
+        shop = JournaledFashionShop.JournaledFashionShop.load(self.filename)
+        self.addCleanup(shop.close)
+        return shop
+
+    def test_changes_replayed_from_journal(self):
+        item = self.shop.find_stock_item("D1")
+        item.add_stock(3)
+        item.sell_stock(2)
+        item.set_price(15)
+        item.text_tags = "dress,green"
+        self.shop.remove_old_stock_item("D2")
+        self.shop.store_new_stock_item(StockItem.StockItem("H1", price=5, tags="hat"))
+        self.shop.save(self.filename)
+
+        shop = self.reload()
+        item = shop.find_stock_item("D1")
+        self.assertEqual(item.stock_level, 6)
+        self.assertEqual(item.price, 15)
+        self.assertEqual(item.tags, {"dress", "green"})
+        self.assertIsNone(shop.find_stock_item("D2"))
+        self.assertEqual(shop.find_stock_item("H1").tags, {"hat"})
+        refs = [item.stock_ref for item in shop.find_in_price_range(0, 50)]
+        self.assertEqual(refs, ["H1", "D1"])
+
+    def test_stock_batch_replayed_from_journal(self):
+        self.shop.apply_stock_batch([("D1", 100), ("D2", 20)])
+        self.shop.sell_batch([("D2", 5)])
+        self.shop.save(self.filename)
+        shop = self.reload()
+        self.assertEqual(shop.find_stock_item("D1").stock_level, 105)
+        self.assertEqual(shop.find_stock_item("D2").stock_level, 15)
+
+    def test_fractional_price_replayed_from_journal(self):
+        self.shop.find_stock_item("D1").set_price(12.5)
+        self.shop.save(self.filename)
+        self.assertEqual(self.reload().find_stock_item("D1").price, 12.5)
+
+    def test_save_appends_to_journal(self):
+        snapshot_size = os.path.getsize(self.filename)
+        self.shop.find_stock_item("D1").add_stock(1)
+        self.shop.save(self.filename)
+        self.assertEqual(os.path.getsize(self.filename), snapshot_size)
+        self.assertEqual(self.reload().find_stock_item("D1").stock_level, 6)
+
+    def test_compaction_empties_journal(self):
+        journal_filename = JournaledFashionShop.JournaledFashionShop.journal_filename(
+            self.filename
+        )
+        self.shop.find_stock_item("D1").add_stock(1)
+        self.shop.compact(self.filename)
+        with open(journal_filename, "rb") as journal_file:
+            self.assertEqual(len(journal_file.readlines()), 1)
+        self.assertEqual(self.reload().find_stock_item("D1").stock_level, 6)
+
+    def test_incomplete_record_ignored(self):
+        self.shop.find_stock_item("D1").add_stock(1)
+        journal_filename = JournaledFashionShop.JournaledFashionShop.journal_filename(
+            self.filename
+        )
+        with open(journal_filename, "ab") as journal_file:
+            journal_file.write(b'["stock","D1",')
+        shop = self.reload()
+        self.assertEqual(shop.find_stock_item("D1").stock_level, 6)
+        shop.find_stock_item("D1").add_stock(1)
+        shop.save(self.filename)
+        self.assertEqual(self.reload().find_stock_item("D1").stock_level, 7)
+
+    def test_loads_fashion_shop_pickle(self):
+        shop = FashionShop.FashionShop()
+        shop.store_new_stock_item(StockItem.StockItem("S1", price=30, tags="shoes"))
+        shop.save(self.filename)
+        os.remove(
+            JournaledFashionShop.JournaledFashionShop.journal_filename(self.filename)
+        )
+        loaded = self.reload()
+        self.assertIsInstance(loaded, JournaledFashionShop.JournaledFashionShop)
+        self.assertEqual(loaded.find_stock_item("S1").tags, {"shoes"})
+
+
+class TestSQLiteFashionShop(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, "shop.db")
+        self.shop = SQLiteFashionShop.SQLiteFashionShop()
+        self.addCleanup(self.shop.close)
+        self.shop.store_new_stock_item(
+            StockItem.StockItem("D1", price=10, tags="dress,red")
+        )
+        self.shop.store_new_stock_item(
+            StockItem.StockItem("D2", price=20.5, tags="dress,blue")
+        )
+        self.shop.store_new_stock_item(
+            StockItem.StockItem("S1", price=30, tags="shoes,red")
+        )
+
+    def reload(self):
+        self.shop.save(self.filename)
+        shop = SQLiteFashionShop.SQLiteFashionShop.load(self.filename)
+        self.addCleanup(shop.close)
+        return shop
+
+    def test_find_page_with_tags(self):
+        self.assertEqual(page_refs(self.shop, set(), 2), [["D1", "D2"], ["S1"]])
+        self.assertEqual(page_refs(self.shop, {"red"}, 1), [["D1"], ["S1"]])
+        self.assertEqual(page_refs(self.shop, {"red", "dress"}, 1), [["D1"]])
+        self.assertEqual(page_refs(self.shop, {"red", "hat"}, 1), [[]])
+
+    def test_duplicate_stock_ref_raises_key_error(self):
+        with self.assertRaises(KeyError):
+            self.shop.store_new_stock_item(
+                StockItem.StockItem("D1", price=10, tags="hat")
+            )
+
+    def test_find_stock_item(self):
+        shop = self.reload()
+        item = shop.find_stock_item("D2")
+        self.assertEqual(item.price, 20.5)
+        self.assertEqual(item.tags, {"dress", "blue"})
+        self.assertIs(shop.find_stock_item("D2"), item)
+        self.assertIsNone(shop.find_stock_item("X1"))
+
+    def test_find_matching_with_tags(self):
+        shop = self.reload()
+        refs = {item.stock_ref for item in shop.find_matching_with_tags({"red"})}
+        self.assertEqual(refs, {"D1", "S1"})
+        refs = {item.stock_ref for item in shop.find_matching_with_tags(set())}
+        self.assertEqual(refs, {"D1", "D2", "S1"})
+
+    def test_find_in_price_range(self):
+        shop = self.reload()
+        refs = [item.stock_ref for item in shop.find_in_price_range(15, 40)]
+        self.assertEqual(refs, ["D2", "S1"])
+        refs = [item.stock_ref for item in shop.find_in_price_range(0, 40, {"red"})]
+        self.assertEqual(refs, ["D1", "S1"])
+
+    def test_item_changes_written_to_database(self):
+        shop = self.reload()
+        item = shop.find_stock_item("D1")
+        item.add_stock(4)
+        item.sell_stock(1)
+        item.set_price(12)
+        item.text_tags = "dress,green"
+        shop.remove_old_stock_item("S1")
+        del item
+        shop.close()
+
+        shop = SQLiteFashionShop.SQLiteFashionShop.load(self.filename)
+        self.addCleanup(shop.close)
+        item = shop.find_stock_item("D1")
+        self.assertEqual(item.stock_level, 3)
+        self.assertEqual(item.price, 12)
+        self.assertEqual(item.tags, {"dress", "green"})
+        self.assertIsNone(shop.find_stock_item("S1"))
+
+    def test_load_missing_file_raises_exception(self):
+        with self.assertRaises(FileNotFoundError):
+            SQLiteFashionShop.SQLiteFashionShop.load(self.filename)
+
+    def test_save_attaches_to_new_file(self):
+        self.shop.save(self.filename)
+        self.shop.find_stock_item("D1").add_stock(5)
+        self.shop.store_new_stock_item(StockItem.StockItem("H1", price=5, tags="hat"))
+        modified = os.path.getmtime(self.filename)
+        self.shop.save(self.filename)
+        self.assertEqual(os.path.getmtime(self.filename), modified)
+
+        shop = SQLiteFashionShop.SQLiteFashionShop.load(self.filename)
+        self.addCleanup(shop.close)
+        self.assertEqual(shop.find_stock_item("D1").stock_level, 5)
+        self.assertIsNotNone(shop.find_stock_item("H1"))
+
+
+class TestStockTable(unittest.TestCase):
+    def setUp(self):
+        self.table = StockTable.StockTable()
+        item = StockItem.StockItem("D1", price=10, tags="dress,red")
+        item.add_stock(2)
+        self.table.store_new_stock_item(item)
+        self.table.store_new_stock_item(
+            StockItem.StockItem("D2", price=20.5, tags="dress,blue")
+        )
+        self.table.store_new_stock_item(
+            StockItem.StockItem("S1", price=30, tags="shoes,red")
+        )
+
+    def test_find_page_with_tags(self):
+        self.assertEqual(page_refs(self.table, set(), 2), [["D1", "D2"], ["S1"]])
+        self.assertEqual(page_refs(self.table, {"red"}, 1), [["D1"], ["S1"]])
+        self.assertEqual(page_refs(self.table, {"red", "dress"}, 1), [["D1"]])
+        self.assertEqual(page_refs(self.table, {"red", "hat"}, 1), [[]])
+        check_tag_pages(self, self.table)
+
+    def matching_refs(self, tags):
+        return [item.stock_ref for item in self.table.find_matching_with_tags(tags)]
+
+    def test_find_stock_item(self):
+        table = pickle.loads(pickle.dumps(self.table))
+        item = table.find_stock_item("D1")
+        expected_str = """Stock Reference: D1
+Price: 10
+Stock level: 2
+Tags: dress,red"""
+        self.assertEqual(str(item), expected_str)
+        self.assertIs(table.find_stock_item("D1"), item)
+        self.assertEqual(table.find_stock_item("D2").price, 20.5)
+        self.assertIsNone(table.find_stock_item("X1"))
+
+    def test_find_matching_with_tags(self):
+        self.assertEqual(self.matching_refs({"red"}), ["D1", "S1"])
+        self.assertEqual(self.matching_refs({"red", "dress"}), ["D1"])
+        self.assertEqual(self.matching_refs(set()), ["D1", "D2", "S1"])
+
+    def test_find_in_price_range(self):
+        refs = [item.stock_ref for item in self.table.find_in_price_range(15, 40)]
+        self.assertEqual(refs, ["D2", "S1"])
+
+    def test_item_changes_written_to_table(self):
+        table = pickle.loads(pickle.dumps(self.table))
+        item = table.find_stock_item("D1")
+        item.add_stock(4)
+        item.set_price(12)
+        item.text_tags = "dress,green"
+        del item
+        item = table.find_stock_item("D1")
+        self.assertEqual(item.stock_level, 6)
+        self.assertEqual(item.price, 12)
+        self.assertEqual(item.tags, {"dress", "green"})
+        refs = [item.stock_ref for item in table.find_matching_with_tags({"red"})]
+        self.assertEqual(refs, ["S1"])
+
+    def test_removed_row_reused(self):
+        self.table.remove_old_stock_item("D1")
+        self.assertEqual(self.matching_refs({"red"}), ["S1"])
+        self.table.store_new_stock_item(StockItem.StockItem("H1", price=5, tags="hat"))
+        self.assertEqual(self.matching_refs(set()), ["H1", "D2", "S1"])
+        with self.assertRaises(KeyError):
+            self.table.remove_old_stock_item("D1")
+
+    def test_tag_changes_on_shared_tag(self):
+        items = []
+        for i in range(50):
+            item = StockItem.StockItem("T{0:02d}".format(i), price=i, tags="sale")
+            self.table.store_new_stock_item(item)
+            items.append(item)
+        for round_number in range(3):
+            for i, item in enumerate(items):
+                if (i + round_number) % 3 == 0:
+                    item.text_tags = "sale,red"
+                else:
+                    item.text_tags = "hat"
+        expected = ["T{0:02d}".format(i) for i in range(50) if (i + 2) % 3 == 0]
+        self.assertEqual(sorted(self.matching_refs({"sale", "red"})), expected)
+        self.assertEqual(len(list(self.table.find_matching_with_tags({"hat"}))), 33)
+        for item in items[:10]:
+            self.table.remove_old_stock_item(item.stock_ref)
+        self.table.store_new_stock_item(StockItem.StockItem("U1", price=1, tags="hat"))
+        self.assertEqual(len(list(self.table.find_matching_with_tags({"hat"}))), 27)
+        self.assertEqual(self.table.find_stock_item("U1").tags, {"hat"})
+
+
+class TestStockFiles(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.shop = FashionShop.FashionShop()
+        item = StockItem.StockItem("D1", price=10, tags="dress,red")
+        item.add_stock(5)
+        self.shop.store_new_stock_item(item)
+        self.shop.store_new_stock_item(
+            StockItem.StockItem("D2", price=20.5, tags="dress,blue")
+        )
+
+    def round_trip(self, write, read, name):
+        filename = os.path.join(self.directory, name)
+        count = write(self.shop.find_matching_with_tags(set()), filename)
+        self.assertEqual(count, 2)
+        shop = FashionShop.FashionShop()
+        self.assertEqual(StockFiles.import_stock(shop, read(filename)), 2)
+        self.assertEqual(str(shop), str(self.shop))
+
+    def test_csv_round_trip(self):
+        self.round_trip(StockFiles.write_csv, StockFiles.read_csv, "stock.csv")
+
+    def test_json_lines_round_trip(self):
+        self.round_trip(
+            StockFiles.write_json_lines, StockFiles.read_json_lines, "stock.jsonl"
+        )
+
+    def test_invalid_csv_row_names_line(self):
+        filename = os.path.join(self.directory, "stock.csv")
+        with open(filename, "w") as output_file:
+            output_file.write("stock_ref,price,stock_level,tags\n")
+            output_file.write('D1,10,1,"dress,red"\n')
+            output_file.write("D2,free,1,dress\n")
+        items = StockFiles.read_csv(filename)
+        self.assertEqual(next(items).tags, {"dress", "red"})
+        with self.assertRaisesRegex(ValueError, "line 3"):
+            next(items)
+
+    def test_fractional_json_stock_level_rejected(self):
+        filename = os.path.join(self.directory, "stock.jsonl")
+        with open(filename, "w") as output_file:
+            for stock_level in [4.0, 3.9]:
+                record = {
+                    "stock_ref": "D1",
+                    "price": 10,
+                    "stock_level": stock_level,
+                    "tags": "dress",
+                }
+                output_file.write(json.dumps(record) + "\n")
+        items = StockFiles.read_json_lines(filename)
+        self.assertEqual(next(items).stock_level, 4)
+        with self.assertRaisesRegex(ValueError, "line 2"):
+            next(items)
+
+    def test_bool_json_stock_level_rejected(self):
+        filename = os.path.join(self.directory, "stock.jsonl")
+        with open(filename, "w") as output_file:
+            record = {"stock_ref": "D1", "price": 10, "stock_level": True, "tags": ""}
+            output_file.write(json.dumps(record) + "\n")
+        with self.assertRaisesRegex(ValueError, "line 1"):
+            next(StockFiles.read_json_lines(filename))
+
+
+class TestStockSnapshot(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.filename = os.path.join(directory.name, "stock.snapshot")
+        shop = FashionShop.FashionShop()
+        item = StockItem.StockItem("S1", price=30, tags="shoes,red")
+        item.add_stock(4)
+        shop.store_new_stock_item(item)
+        shop.store_new_stock_item(
+            StockItem.StockItem("D2", price=20.5, tags="dress,blue")
+        )
+        shop.store_new_stock_item(StockItem.StockItem("D1", price=10, tags="dress,red"))
+        self.shop = shop
+        StockSnapshot.write_snapshot(shop.find_matching_with_tags(set()), self.filename)
+        self.snapshot = StockSnapshot.StockSnapshot.load(self.filename)
+        self.addCleanup(self.snapshot.close)
+
+    def matching_refs(self, tags):
+        return [item.stock_ref for item in self.snapshot.find_matching_with_tags(tags)]
+
+    def test_find_page_with_tags(self):
+        self.assertEqual(page_refs(self.snapshot, set(), 2), [["D1", "D2"], ["S1"]])
+        self.assertEqual(page_refs(self.snapshot, {"red"}, 1), [["D1"], ["S1"]])
+        self.assertEqual(page_refs(self.snapshot, {"red", "dress"}, 1), [["D1"]])
+        self.assertEqual(page_refs(self.snapshot, {"red", "hat"}, 1), [[]])
+
+    def test_find_stock_item(self):
+        item = self.snapshot.find_stock_item("S1")
+        self.assertEqual(item.price, 30)
+        self.assertIsInstance(item.price, int)
+        self.assertEqual(item.stock_level, 4)
+        self.assertEqual(item.tags, {"shoes", "red"})
+        self.assertEqual(self.snapshot.find_stock_item("D2").price, 20.5)
+        self.assertIsNone(self.snapshot.find_stock_item("D3"))
+        self.assertIsNone(self.snapshot.find_stock_item("Z9"))
+        self.assertEqual(len(self.snapshot), 3)
+
+    def test_find_matching_with_tags(self):
+        self.assertEqual(self.matching_refs(set()), ["D1", "D2", "S1"])
+        self.assertEqual(self.matching_refs({"dress"}), ["D1", "D2"])
+        self.assertEqual(self.matching_refs({"red", "dress"}), ["D1"])
+        self.assertEqual(self.matching_refs({"red", "hat"}), [])
+
+    def test_find_in_price_range(self):
+        items = self.snapshot.find_in_price_range(10, 30)
+        self.assertEqual([item.stock_ref for item in items], ["D1", "D2", "S1"])
+        items = self.snapshot.find_in_price_range(15, 100, tags={"red"})
+        self.assertEqual([item.stock_ref for item in items], ["S1"])
+        self.assertEqual(list(self.snapshot.find_in_price_range(31, 40)), [])
+
+    def test_close_with_unread_results(self):
+        results = [
+            self.snapshot.find_in_price_range(0, 100),
+            self.snapshot.find_in_price_range(0, 100, tags={"red"}),
+            self.snapshot.find_matching_with_tags({"dress"}),
+            self.snapshot.find_matching_with_tags(set()),
+        ]
+        self.snapshot.close()
+        self.assertTrue(self.snapshot._StockSnapshot__map.closed)
+        self.assertEqual(
+            [[item.stock_ref for item in result] for result in results],
+            [["D1", "D2", "S1"], ["D1", "S1"], ["D1", "D2"], ["D1", "D2", "S1"]],
+        )
+
+    def test_matches_source_shop(self):
+        items = self.shop.find_matching_with_tags(set())
+        expected = sorted(items, key=lambda item: item.stock_ref)
+        self.assertEqual(
+            list(map(str, self.snapshot.find_matching_with_tags(set()))),
+            list(map(str, expected)),
+        )
+
+    def test_read_only(self):
+        with self.assertRaises(TypeError):
+            self.snapshot.store_new_stock_item(StockItem.StockItem("H1", 5, "hat"))
+        with self.assertRaises(TypeError):
+            self.snapshot.remove_old_stock_item("D1")
+
+    def test_save_replaces_open_snapshot(self):
+        self.snapshot.save(self.filename)
+        snapshot = StockSnapshot.StockSnapshot.load(self.filename)
+        self.addCleanup(snapshot.close)
+        self.assertEqual(str(snapshot), str(self.snapshot))
+
+    def test_rejects_other_files(self):
+        with open(self.filename, "wb") as output_file:
+            pickle.dump(self.shop, output_file)
+        with self.assertRaises(ValueError):
+            StockSnapshot.StockSnapshot.load(self.filename)
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        Instrumentation.registry.reset()
+        self.addCleanup(Instrumentation.disable)
+        self.addCleanup(Instrumentation.registry.reset)
+
+    def test_disabled_methods_are_not_wrapped(self):
+        price_getter = vars(StockItem.StockItem)["price"].fget
+        Instrumentation.enable()
+        self.assertIsNot(vars(StockItem.StockItem)["price"].fget, price_getter)
+        Instrumentation.disable()
+        self.assertIs(vars(StockItem.StockItem)["price"].fget, price_getter)
+
+    def test_enabled_calls_are_recorded(self):
+        Instrumentation.enable()
+        shop = FashionShop.FashionShop()
+        item = StockItem.StockItem("D1", price=10, tags="dress")
+        shop.store_new_stock_item(item)
+        registry = Instrumentation.registry
+        price_calls = registry.calls("StockItem.price")
+        item.price
+        item.price
+        list(shop.find_matching_with_tags({"dress"}))
+        self.assertEqual(registry.calls("StockItem.price"), price_calls + 2)
+        self.assertEqual(registry.calls("FashionShop.store_new_stock_item"), 1)
+        metrics = json.loads(registry.to_json())
+        self.assertEqual(metrics["FashionShop.find_matching_with_tags"]["calls"], 1)
+
+    def test_disabled_calls_are_not_recorded(self):
+        item = StockItem.StockItem("D1", price=10, tags="dress")
+        item.price
+        self.assertEqual(Instrumentation.registry.as_dict(), {})
+
 
 if __name__ == "__main__":
     unittest.main(verbosity=2)
@@ -244,12 +244,15 @@ class FashionShopGraphicalApplication:
         -------
         None
         """
-        self._selector.populate_listbox(
-            self.__shop.find_matching_with_tags(
-                FashionShopGraphicalApplication.tag_set_from_text(self._search_tags)
-            )
+        search_tags = FashionShopGraphicalApplication.tag_set_from_text(
+            self._search_tags
         )
 
+        def fetch_page(page_size, token):
+            return self.__shop.find_page_with_tags(search_tags, page_size, token)
+
+        self._selector.populate_pages(fetch_page)
+
     def got_selection(self, selection):
         """
         Method to be called when the program detects that the Stock Item selection has changed
@@ -13,6 +13,14 @@ class StockItemSelector:
     """
     Widget providing a list selection for StockItem objects
 
+    Search results can be shown a page at a time with `populate_pages`. The
+    next page is only fetched when the list is scrolled to its end
+
+    Class Attributes
+    ----------------
+    page_size : int
+        number of stock items fetched for each page
+
     Parameters
     -----------
 
@@ -23,9 +31,13 @@ class StockItemSelector:
         The tkinter `Frame` this component is contained in
     listbox : tkinter.Listbox
         list box to populate with stock item references
+    scrollbar : tkinter.Scrollbar
+        scroll bar for the list box
 
     """
 
+    page_size = 50
+
     def __init__(self, root, receiver):
         """
         Create a new `StockItemSelector`
@@ -51,6 +63,37 @@ class StockItemSelector:
         self.frame = tkinter.Frame(root)
         self.listbox = tkinter.Listbox(self.frame)
         self.listbox.grid(row=0, column=0)
+        self.scrollbar = tkinter.Scrollbar(self.frame, command=self.listbox.yview)
+        self.scrollbar.grid(sticky=tkinter.N + tkinter.S, row=0, column=1)
+        self.__fetch_page = None
+        self.__next_token = None
+        self.__loading = False
+
+        def on_scroll(first, last):
+            """
+            Update the scroll bar, and fetch the next page of items once the
+            end of the list is visible
+
+            Set as the `yscrollcommand` of the Listbox
+
+            Parameters
+            ----------
+            first : str
+                fraction of the list above the visible rows
+            last : str
+                fraction of the list up to the end of the visible rows
+
+            Returns
+            -------
+            None
+            """
+            self.scrollbar.set(first, last)
+            if float(last) >= 1.0 and self.__next_token is not None:
+                if not self.__loading:
+                    self.__loading = True
+                    self.listbox.after_idle(self.__load_next_page)
+
+        self.listbox.config(yscrollcommand=on_scroll)
 
         def on_select(event):
             """
@@ -87,10 +130,62 @@ class StockItemSelector:
         -------
         None
         """
+        self.__fetch_page = None
+        self.__next_token = None
         self.listbox.delete(0, tkinter.END)
         for item in items:
             self.listbox.insert(tkinter.END, item.stock_ref)
 
+    def populate_pages(self, fetch_page):
+        """
+        Populate the Listbox with the first page of a search, fetching later
+        pages as the list is scrolled
+
+        Parameters
+        ----------
+        fetch_page : Callable[[int, str | None], tuple[list[StockItem], str | None]]
+            function taking a page size and a continuation token and returning
+            a page of items and the token for the next page, such as a call to
+            `find_page_with_tags` on a shop
+
+        Returns
+        -------
+        None
+        """
+        self.__fetch_page = fetch_page
+        self.__next_token = None
+        self.listbox.delete(0, tkinter.END)
+        self.__add_page(None)
+
+    def __add_page(self, token):
+        """
+        Fetch a page of items and add them to the end of the Listbox
+
+        Parameters
+        ----------
+        token : str | None
+            continuation token of the page, or `None` for the first page
+
+        Returns
+        -------
+        None
+        """
+        items, self.__next_token = self.__fetch_page(StockItemSelector.page_size, token)
+        for item in items:
+            self.listbox.insert(tkinter.END, item.stock_ref)
+
+    def __load_next_page(self):
+        """
+        Add the next page of items to the Listbox, if there is one
+
+        Returns
+        -------
+        None
+        """
+        self.__loading = False
+        if self.__next_token is not None:
+            self.__add_page(self.__next_token)
+
 
 if __name__ == "__main__":
 
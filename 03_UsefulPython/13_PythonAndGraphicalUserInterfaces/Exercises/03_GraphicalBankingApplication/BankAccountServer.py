@@ -0,0 +1,47 @@
+"""
+Exercise 13.3v Bank Account Server
+
+Loads and serves a Bank Account System with the headless JSON over HTTP
+service. Only runs if executed as the main program
+"""
+
+import asyncio
+
+from Data import AccountSystem
+from UI.ServiceUI import BankAccountService
+
+
+async def serve(filename, host="127.0.0.1", port=8080):
+    """
+    Serve the accounts saved in a file until cancelled
+
+    Parameters
+    ----------
+    filename : str
+        path to the file the accounts are loaded from and saved to
+    host : str, optional
+        address to listen on, by default "127.0.0.1"
+    port : int, optional
+        port to listen on, by default 8080
+
+    Returns
+    -------
+    None
+    """
+    service = BankAccountService.BankAccountService(
+        filename=filename, storage_class=AccountSystem.AccountSystem
+    )
+    server = await service.start(host, port)
+    print("Serving accounts on http://{0}:{1}".format(host, port))
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.stop()
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(serve("accounts.pkl"))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,308 @@
+"""
+Exercise 13.3p Benchmarks
+
+Times the Bank Account Management System data classes against synthetic
+accounts. Only runs if executed as the main program
+
+Functions
+---------
+make_system
+    create an `AccountSystem` filled with synthetic accounts
+time_call
+    time the best of several runs of a function
+benchmark_interest
+    compare the per-account interest run with the batch interest engine
+benchmark_account_opening
+    time issuing account numbers and opening accounts in a batch
+benchmark_maturity
+    compare scanning for matured accounts with the maturity index
+benchmark_statements
+    time writing a statement file for every account holder
+"""
+
+import concurrent.futures
+import datetime
+import random
+import tempfile
+import timeit
+
+from Data import (
+    Account,
+    AccountFactory,
+    AccountNumbers,
+    AccountSystem,
+    InterestEngine,
+    Statements,
+)
+
+
+def make_system(account_count, seed=1):
+    """
+    Create an account system filled with synthetic accounts
+
+    A mix of savings, long term savings (some matured) and credit accounts
+    is created
+
+    Parameters
+    ----------
+    account_count : int
+        number of accounts to create
+    seed : int, optional
+        seed for the random number generator, by default 1
+
+    Returns
+    -------
+    AccountSystem
+        system holding `account_count` accounts
+    """
+    generator = random.Random(seed)
+    system = AccountSystem.AccountSystem()
+    long_ago = datetime.date(2000, 1, 1)
+    for i in range(account_count):
+        account_number = "{0:016d}".format(i)
+        holder = "holder {0}".format(i // 3)
+        kind = i % 3
+        if kind == 0:
+            account = Account.SavingsAccount(account_number, holder, 0.01)
+            account.deposit(generator.randint(1, 100000) / 100)
+        elif kind == 1:
+            account = Account.LongTermSavingsAccount(
+                account_number, holder, 0.01 + generator.random() / 10, 52
+            )
+            account.deposit(generator.randint(1, 100000) / 100)
+            if generator.random() < 0.5:
+                account._LongTermSavingsAccount__start_date = long_ago
+        else:
+            account = Account.CreditAccount(account_number, holder, 0.1, 5000)
+            account.withdraw(generator.randint(1, 500000) / 100)
+        system.add_new_account(account)
+    return system
+
+
+def time_call(function, repeat=3):
+    """
+    Time the best of several runs of a function
+
+    Parameters
+    ----------
+    function : Callable[[], Any]
+        function to time
+    repeat : int, optional
+        number of runs, by default 3
+
+    Returns
+    -------
+    float
+        shortest run time in seconds
+    """
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def benchmark_interest(account_count):
+    """
+    Compare the per-account interest run with the batch interest engine
+
+    Parameters
+    ----------
+    account_count : int
+        number of accounts in the system
+
+    Returns
+    -------
+    None
+    """
+    system = make_system(account_count)
+    runs = [("apply_interest", system.apply_interest)]
+    runs.append(
+        (
+            "batch (lists)",
+            lambda: InterestEngine.apply_interest(
+                system._AccountSystem__account_dictionary.values(), use_numpy=False
+            ),
+        )
+    )
+    if InterestEngine.numpy_available:
+        runs.append(
+            (
+                "batch (NumPy)",
+                lambda: InterestEngine.apply_interest(
+                    system._AccountSystem__account_dictionary.values(),
+                    use_numpy=True,
+                ),
+            )
+        )
+    for name, function in runs:
+        run_time = time_call(function)
+        print(
+            "{0:<16} {1:8.3f} s  {2:12,.0f} accounts/s".format(
+                name, run_time, account_count / run_time
+            )
+        )
+
+
+def benchmark_account_opening(account_count, thread_count=4):
+    """
+    Time issuing account numbers and opening accounts in a batch
+
+    Parameters
+    ----------
+    account_count : int
+        number of accounts to open
+    thread_count : int, optional
+        number of threads sharing one allocator, by default 4
+
+    Returns
+    -------
+    None
+    """
+
+    def allocate_numbers():
+        allocator = AccountNumbers.AccountNumberAllocator()
+        for _ in range(account_count):
+            allocator.allocate()
+
+    def allocate_numbers_in_threads():
+        allocator = AccountNumbers.AccountNumberAllocator()
+        per_thread = account_count // thread_count
+
+        def allocate_share():
+            for _ in range(per_thread):
+                allocator.allocate()
+
+        with concurrent.futures.ThreadPoolExecutor(thread_count) as executor:
+            futures = [executor.submit(allocate_share) for _ in range(thread_count)]
+            for future in futures:
+                future.result()
+
+    def open_accounts():
+        system = AccountSystem.AccountSystem()
+        authoriser = AccountFactory.AccountAuthoriser(system)
+        for i in range(account_count):
+            system.add_new_account(
+                authoriser.create_savings_account("holder {0}".format(i))
+            )
+
+    runs = [
+        ("allocate", allocate_numbers),
+        ("allocate ({0} threads)".format(thread_count), allocate_numbers_in_threads),
+        ("open accounts", open_accounts),
+    ]
+    for name, function in runs:
+        run_time = time_call(function)
+        print(
+            "{0:<22} {1:8.3f} s  {2:12,.0f} accounts/s".format(
+                name, run_time, account_count / run_time
+            )
+        )
+
+
+def benchmark_maturity(account_count):
+    """
+    Compare scanning for matured accounts with the maturity index
+
+    Parameters
+    ----------
+    account_count : int
+        number of accounts in the system
+
+    Returns
+    -------
+    None
+    """
+    system = make_system(account_count)
+    accounts = system._AccountSystem__account_dictionary.values()
+    today = datetime.date.today()
+
+    def scan_matured():
+        return [
+            account
+            for account in accounts
+            if isinstance(account, Account.LongTermSavingsAccount)
+            and account.has_matured()
+        ]
+
+    def next_week():
+        return system.accounts_maturing(today, today + datetime.timedelta(weeks=1))
+
+    long_term = [
+        account
+        for account in accounts
+        if isinstance(account, Account.LongTermSavingsAccount)
+    ]
+
+    def rates_from_dates():
+        Account.LongTermSavingsAccount.batch_interest_rates(long_term, today)
+
+    def rates_from_index():
+        matured = set(system._AccountSystem__maturity_index.matured(today))
+        Account.LongTermSavingsAccount.batch_interest_rates(long_term, today, matured)
+
+    runs = [
+        ("scan for matured", scan_matured),
+        ("index matured", system._AccountSystem__maturity_index.matured),
+        ("index next week", next_week),
+        ("rates from dates", rates_from_dates),
+        ("rates from index", rates_from_index),
+    ]
+    for name, function in runs:
+        run_time = time_call(function)
+        print("{0:<22} {1:8.4f} s".format(name, run_time))
+
+
+def benchmark_statements(account_count):
+    """
+    Time writing a statement file for every account holder
+
+    Parameters
+    ----------
+    account_count : int
+        number of accounts in the system, three to each holder
+
+    Returns
+    -------
+    None
+    """
+    system = make_system(account_count)
+    holder_count = account_count // 3
+    today = datetime.date.today()
+    first_date = today.replace(day=1)
+
+    def write_with(max_workers):
+        def write():
+            with tempfile.TemporaryDirectory() as directory:
+                Statements.write_statements(
+                    system, directory, first_date, today, max_workers=max_workers
+                )
+
+        return write
+
+    runs = [
+        ("str(AccountSystem)", lambda: str(system)),
+        ("statements (1 process)", write_with(0)),
+        ("statements (pool)", write_with(None)),
+    ]
+    for name, function in runs:
+        run_time = time_call(function, repeat=1)
+        print(
+            "{0:<22} {1:8.3f} s  {2:12,.0f} statements/s".format(
+                name, run_time, holder_count / run_time
+            )
+        )
+
+
+if __name__ == "__main__":
+    account_count = 1000000
+    print("Month-end interest for {0} accounts".format(account_count))
+    benchmark_interest(account_count)
+
+    account_count = 100000
+    print("Onboarding {0} accounts".format(account_count))
+    benchmark_account_opening(account_count)
+
+    account_count = 1000000
+    print("Maturity checks for {0} accounts".format(account_count))
+    benchmark_maturity(account_count)
+
+    account_count = 300000
+    print("Statements for {0} accounts".format(account_count))
+    benchmark_statements(account_count)
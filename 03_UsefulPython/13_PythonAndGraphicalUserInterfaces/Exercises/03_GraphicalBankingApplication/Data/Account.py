@@ -15,6 +15,15 @@ LongTermSavingsAccount
     class representing a long-term deposit in which additional monthly interest is accrued in exchange for restrictions
     on withdrawals
 
+Functions
+---------
+normalise_holder
+    convert an account holder's name to the form accounts are stored under
+lock_accounts
+    hold the locks of several accounts, taken in account number order
+transfer
+    atomically move money from one account to another
+
 Variables
 ---------
 account_dictionary : dict[str, Account]
@@ -22,7 +31,94 @@ account_dictionary : dict[str, Account]
 """
 
 import abc
+import contextlib
 import datetime
+import operator
+import threading
+
+from Data import Ledger
+
+
+def normalise_holder(name):
+    """
+    Convert an account holder's name to the form accounts are stored under
+
+    Case is ignored and runs of whitespace are treated as a single space
+
+    Parameters
+    ----------
+    name : str
+        name of the account holder
+
+    Returns
+    -------
+    str
+        the normalised name
+    """
+    return " ".join(name.split()).casefold()
+
+
+@contextlib.contextmanager
+def lock_accounts(*accounts):
+    """
+    Hold the locks of several accounts, taken in account number order
+
+    Every caller takes the locks in the same order, so two threads locking
+    the same accounts cannot deadlock
+
+    Parameters
+    ----------
+    *accounts : Account
+        accounts to lock
+
+    Yields
+    ------
+    None
+    """
+    with contextlib.ExitStack() as stack:
+        for account in sorted(accounts, key=operator.attrgetter("account_number")):
+            stack.enter_context(account.lock)
+        yield
+
+
+def transfer(source, destination, amount):
+    """
+    Atomically move money from one account to another
+
+    Both accounts are locked, and the withdrawal and deposit are both
+    checked before either is recorded, so either both happen or neither
+    does, and no other thread sees one without the other
+
+    Parameters
+    ----------
+    source : Account
+        account to withdraw the money from
+    destination : Account
+        account to deposit the money in
+    amount : int | float
+        amount in dollars to transfer
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    ValueError
+        Raised if `amount` cannot be withdrawn from `source` or deposited in
+        `destination`, or the accounts are the same
+    """
+    if source is destination:
+        raise ValueError("Cannot transfer money to the same account")
+    minor_units = Ledger.to_minor_units(amount)
+    with lock_accounts(source, destination):
+        source._check_withdrawal(amount)
+        destination._check_deposit(amount)
+        today = datetime.date.today()
+        # only the destination's balance can grow too large to record, so it
+        # is written first and a failure leaves both ledgers unchanged
+        destination.ledger.append(minor_units, Ledger.DEPOSIT, today)
+        source.ledger.append(-minor_units, Ledger.WITHDRAWAL, today)
 
 
 class Account(abc.ABC):
@@ -32,6 +128,16 @@ class Account(abc.ABC):
     Subclasses are expected to overwrite the `deposit`,
     `withdraw` and `apply_interest` abstract methods
 
+    Every change to the balance is recorded in an append-only `Ledger`
+    held in whole cents. Amounts deposited and withdrawn must be a whole
+    number of cents, and each month's interest is rounded to the nearest
+    cent, halves to even
+
+    Each account has a lock which is held while its balance is checked and
+    changed, so an account can be used from several threads. Subclasses
+    check deposits and withdrawals by overriding `_check_deposit` and
+    `_check_withdrawal`, which are called with the lock held
+
     Attributes:
     -----------
     account_holder : str
@@ -64,9 +170,27 @@ class Account(abc.ABC):
             monthly interest rate applied to the account
         """
         self.__account_number = account_number
-        self.account_holder = account_holder.strip().lower()
+        self.account_holder = normalise_holder(account_holder)
         self.interest_rate = interest_rate
-        self.__balance = 0
+        self.__ledger = Ledger.Ledger()
+        self.__lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_Account__lock"]
+        return state
+
+    def __setstate__(self, state):
+        # accounts pickled before the ledger was added hold a float balance
+        balance = state.pop("_Account__balance", None)
+        self.__dict__.update(state)
+        self.__lock = threading.RLock()
+        if balance is not None:
+            self.__ledger = Ledger.Ledger()
+            if balance:
+                self.__ledger.append(
+                    Ledger.round_to_minor_units(balance), Ledger.OPENING
+                )
 
     def __str__(self):
         template = """Account Number: {0}
@@ -91,7 +215,39 @@ Balance: ${3}"""
         balance: int | float
             account balance in dollars
         """
-        return self.__balance
+        return Ledger.from_minor_units(self.__ledger.balance)
+
+    @property
+    def ledger(self):
+        """
+        ledger : Ledger.Ledger
+            record of every change to the balance, in cents
+        """
+        return self.__ledger
+
+    @property
+    def lock(self):
+        """
+        lock : threading.RLock
+            lock held while the balance is checked and changed
+        """
+        return self.__lock
+
+    def balance_as_of(self, date):
+        """
+        Get the balance of the account at the end of a given date
+
+        Parameters
+        ----------
+        date : datetime.date
+            date to find the balance on
+
+        Returns
+        -------
+        int | float
+            the balance in dollars
+        """
+        return Ledger.from_minor_units(self.__ledger.balance_as_of(date))
 
     @abc.abstractmethod
     def deposit(self, amount):
@@ -112,7 +268,10 @@ Balance: ${3}"""
         ValueError
             Raised if `amount` cannot be deposited
         """
-        self.__balance += amount
+        minor_units = Ledger.to_minor_units(amount)
+        with self.__lock:
+            self._check_deposit(amount)
+            self.__ledger.append(minor_units, Ledger.DEPOSIT)
 
     @abc.abstractmethod
     def withdraw(self, amount):
@@ -133,18 +292,156 @@ Balance: ${3}"""
         ValueError
             Raised if `amount` cannot be withdrawn
         """
-        self.__balance -= amount
+        minor_units = Ledger.to_minor_units(amount)
+        with self.__lock:
+            self._check_withdrawal(amount)
+            self.__ledger.append(-minor_units, Ledger.WITHDRAWAL)
+
+    def _check_deposit(self, amount):
+        """
+        Check that an amount can be deposited in the account
+
+        Called with the account's lock held. Subclasses should override
+        this to restrict deposits
+
+        Parameters
+        ----------
+        amount : int | float
+            amount in dollars to deposit
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError
+            Raised if `amount` cannot be deposited
+        """
+
+    def _check_withdrawal(self, amount):
+        """
+        Check that an amount can be withdrawn from the account
+
+        Called with the account's lock held. Subclasses should override
+        this to restrict withdrawals
+
+        Parameters
+        ----------
+        amount : int | float
+            amount in dollars to withdraw
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError
+            Raised if `amount` cannot be withdrawn
+        """
 
     @abc.abstractmethod
     def apply_interest(self):
         """
         Apply the interest rate to the account and update the balance
 
+        The interest is rounded to the nearest cent, halves to even, and
+        is only recorded if it is not zero
+
         Returns
         -------
         None
         """
-        self.__balance += self.__balance * self.interest_rate
+        with self.__lock:
+            self._record_interest(
+                round(self.__ledger.balance * self.monthly_interest_rate())
+            )
+
+    def _record_interest(self, interest, date=None):
+        """
+        Record interest in the ledger
+
+        The caller must hold the account's lock, or otherwise have sole use
+        of the account
+
+        Parameters
+        ----------
+        interest : int
+            interest in cents
+        date : datetime.date | None, optional
+            date the interest was applied, by default None which uses today
+
+        Returns
+        -------
+        None
+        """
+        if interest:
+            self.__ledger.append(interest, Ledger.INTEREST, date)
+
+    def monthly_interest_rate(self):
+        """
+        Get the interest rate `apply_interest` currently applies each month
+
+        Subclasses that change the applied rate should override this
+
+        Returns
+        -------
+        int | float
+            the applied monthly interest rate
+        """
+        return self.interest_rate
+
+    @classmethod
+    def batch_interest_rates(cls, accounts, today, matured=None):
+        """
+        Get the monthly interest rates of a group of accounts of this type
+
+        Used by `Data.InterestEngine` to apply interest in bulk. Subclasses
+        that override `monthly_interest_rate` should override this to match
+
+        Parameters
+        ----------
+        accounts : list[Account]
+            accounts of this type
+        today : datetime.date
+            date the interest is applied on
+        matured : set[LongTermSavingsAccount] | None, optional
+            long term savings accounts that have matured by `today`, by
+            default None
+
+        Returns
+        -------
+        list[int | float]
+            the monthly interest rate of each account
+        """
+        return list(map(operator.attrgetter("interest_rate"), accounts))
+
+    def apply_interest_periods(self, periods):
+        """
+        Apply several months of interest to the account in one step
+
+        The balance is the same as calling `apply_interest` `periods` times
+        on the same day. Each month's interest is still rounded to a cent
+        before it is added, as `(1 + rate) ** periods` would round
+        differently, but the months are compounded in a local loop rather
+        than through a method call each, and recorded as a single entry
+
+        Parameters
+        ----------
+        periods : int
+            number of months of interest to apply
+
+        Returns
+        -------
+        None
+        """
+        rate = self.monthly_interest_rate()
+        with self.__lock:
+            balance = start_balance = self.__ledger.balance
+            for _ in range(periods):
+                balance += round(balance * rate)
+            self._record_interest(balance - start_balance)
 
 
 class SavingsAccount(Account):
@@ -195,16 +492,20 @@ class SavingsAccount(Account):
         ValueError
             raised if the deposit amount is not a positive number
         """
-        if amount <= 0:
-            raise ValueError("A deposit must be a non-negative number")
         super().deposit(amount)
 
     def withdraw(self, amount):
+        super().withdraw(amount)
+
+    def _check_deposit(self, amount):
+        if amount <= 0:
+            raise ValueError("A deposit must be a non-negative number")
+
+    def _check_withdrawal(self, amount):
         if amount <= 0:
             raise ValueError("A withdrawal must be a non-negative number")
         if amount > self.balance:
             raise ValueError("Cannot withdraw more than the account balance")
-        super().withdraw(amount)
 
     def apply_interest(self):
         super().apply_interest()
@@ -217,6 +518,12 @@ class LongTermSavingsAccount(SavingsAccount):
     An account in which money cannot be withdrawn before the term limit expires.
     After the term limit has expired a reduced interest rate is applied.
 
+    Attributes:
+    -----------
+    receiver
+        object informed when the account is reinvested, or `None`. The
+        receiver must support the method `reschedule(LongTermSavingsAccount)`
+
     Class Attributes
     ----------------
     min_term_limit: int
@@ -272,10 +579,22 @@ class LongTermSavingsAccount(SavingsAccount):
         term_period_in_weeks : int
             length of the high yield savings term in weeks
         """
+        self.receiver = None
         self.__start_date = datetime.date.today()
         self.__term_period = term_period_in_weeks
         super().__init__(account_number, account_holder, interest_rate)
 
+    def __getstate__(self):
+        # the receiver is re-attached by whoever indexes the account, so it
+        # is not pickled alongside the account
+        state = super().__getstate__()
+        state.pop("receiver", None)
+        return state
+
+    def __setstate__(self, state):
+        self.receiver = None
+        super().__setstate__(state)
+
     def __str__(self):
         template = """{0}
 Term Period: {1} weeks
@@ -349,9 +668,12 @@ Has matured? {4}"""
             Raised if the account has not
             yet matured
         """
+        super().withdraw(amount)
+
+    def _check_withdrawal(self, amount):
         if not self.has_matured():
             raise ValueError("Cannot withdraw from an immature account")
-        super().withdraw(amount)
+        super()._check_withdrawal(amount)
 
     def apply_interest(self):
         """
@@ -364,10 +686,65 @@ Has matured? {4}"""
         -------
         None
         """
+        super().apply_interest()
+
+    def monthly_interest_rate(self):
+        """
+        Get the interest rate `apply_interest` currently applies each month
+
+        The rate is quartered once the account has matured
+
+        Returns
+        -------
+        int | float
+            the applied monthly interest rate
+        """
         effective_rate = self.interest_rate
         if self.has_matured():
             effective_rate /= 4
-        self.deposit(self.balance * effective_rate)
+        return effective_rate
+
+    @classmethod
+    def batch_interest_rates(cls, accounts, today, matured=None):
+        """
+        Get the monthly interest rates of a group of long term savings accounts
+
+        Parameters
+        ----------
+        accounts : list[LongTermSavingsAccount]
+            accounts of this type
+        today : datetime.date
+            date the interest is applied on
+        matured : set[LongTermSavingsAccount] | None, optional
+            accounts that have matured by `today`, by default None which
+            works out maturity from each account's dates
+
+        Returns
+        -------
+        list[int | float]
+            the monthly interest rate of each account, quartered for the
+            accounts that have matured by `today`
+        """
+        if matured is not None:
+            return [
+                account.interest_rate / 4
+                if account in matured
+                else account.interest_rate
+                for account in accounts
+            ]
+        # an account has matured if it started on or before its term's cutoff
+        cutoffs = {}
+        rates = []
+        for account in accounts:
+            cutoff = cutoffs.get(account.__term_period)
+            if cutoff is None:
+                cutoff = today - datetime.timedelta(weeks=account.__term_period)
+                cutoffs[account.__term_period] = cutoff
+            effective_rate = account.interest_rate
+            if account.__start_date <= cutoff:
+                effective_rate /= 4
+            rates.append(effective_rate)
+        return rates
 
     def manage_account(self, transfer_account=None):
         """
@@ -381,6 +758,10 @@ Has matured? {4}"""
         The owner of the long term savings account and the
         account to transfer into must be the same
 
+        The balance is moved with `transfer`, so it is never seen in both
+        accounts or neither. The account's receiver is told when the account
+        is reinvested
+
         Parameters
         ----------
         transfer_account : Account, optional
@@ -397,20 +778,19 @@ Has matured? {4}"""
         ValueError:
             Could not transfer to the new account
         """
-        if not self.has_matured():
-            raise ValueError("Cannot manage an immature account")
         if transfer_account is None:
-            self.__start_date = datetime.date.today()
+            with self.lock:
+                if not self.has_matured():
+                    raise ValueError("Cannot manage an immature account")
+                self.__start_date = datetime.date.today()
+                if self.receiver is not None:
+                    self.receiver.reschedule(self)
         else:
-            balance = self.balance
-            try:
-                self.withdraw(balance)
-                transfer_account.deposit(balance)
-            except ValueError as e:
-                # need to ensure balances preserved
-                if not self.balance == balance:
-                    self.deposit(balance - self.balance)
-                    raise ValueError(str(e))
+            with lock_accounts(self, transfer_account):
+                if not self.has_matured():
+                    raise ValueError("Cannot manage an immature account")
+                if self.balance:
+                    transfer(self, transfer_account, self.balance)
 
 
 class CreditAccount(Account):
@@ -476,12 +856,6 @@ Maximum Withdrawal Limit: {1}"""
         ValueError
             Raised if deposit is greater than the current debt
         """
-        if amount <= 0:
-            raise ValueError("A deposit must be a non-negative number")
-        if amount + self.balance > 0:
-            raise ValueError(
-                "Exceeded max deposit limit: {0}".format(-1 * self.balance)
-            )
         super().deposit(amount)
 
     def withdraw(self, amount):
@@ -503,11 +877,21 @@ Maximum Withdrawal Limit: {1}"""
             Raised if `amount` is non-negative or the greater than
             the account balance
         """
+        super().withdraw(amount)
+
+    def _check_deposit(self, amount):
+        if amount <= 0:
+            raise ValueError("A deposit must be a non-negative number")
+        if amount + self.balance > 0:
+            raise ValueError(
+                "Exceeded max deposit limit: {0}".format(-1 * self.balance)
+            )
+
+    def _check_withdrawal(self, amount):
         if amount <= 0:
             raise ValueError("A withdrawal must be a non-negative number")
         if self.balance - amount < -1 * self.__max_withdrawal_limit:
             raise ValueError("Cannot exceed withdrawal limit")
-        super().withdraw(amount)
 
     def apply_interest(self):
         """
@@ -9,15 +9,24 @@ AccountAuthoriser
     class representing an account authorisation system that issues new accounts with an account number, interest rates, and limits
 """
 
-import random
-
 from Data import Account
 
+# account types that make a holder eligible for credit and long term accounts
+_savings_account_types = tuple(
+    account_type
+    for account_type, account_class in Account.account_dictionary.items()
+    if issubclass(account_class, Account.SavingsAccount)
+)
+
 
 class AccountAuthoriser:
     """
     Class representing a system for authorising accounts and issuing interest rates
 
+    Account numbers are issued by the account system, so one authoriser
+    can be shared by several threads, and several authorisers can issue
+    accounts for the same system
+
     Attributes
     ----------
     savings_interest : int | float
@@ -40,7 +49,6 @@ class AccountAuthoriser:
 
         self.savings_interest = 0.01
         self.credit_interest = 0.10
-        self.__account_number_string_length = 4
         self.__account_system = account_system
 
         self.factory_map = {
@@ -72,59 +80,15 @@ class AccountAuthoriser:
         """
         Generates an account number
 
-        The generated account number is a 16 character random
-        alphanumeric string
+        The generated account number is a 15 digit serial number followed by
+        a check digit, and is never the number of an existing account
 
         Returns
         -------
         str
             string representing a valid account number
         """
-        account_number_string_tuple = (
-            "A",
-            "B",
-            "C",
-            "D",
-            "E",
-            "F",
-            "G",
-            "H",
-            "I",
-            "J",
-            "K",
-            "L",
-            "M",
-            "N",
-            "O",
-            "P",
-            "Q",
-            "R",
-            "S",
-            "T",
-            "U",
-            "V",
-            "W",
-            "X",
-            "Y",
-            "Z",
-            "0",
-            "1",
-            "2",
-            "3",
-            "4",
-            "5",
-            "6",
-            "7",
-            "8",
-            "9",
-        )  # Valid characters for an account number
-
-        account_number = "".join(
-            random.choices(
-                account_number_string_tuple, k=self.__account_number_string_length
-            )
-        )
-        return account_number
+        return self.__account_system.allocate_account_number()
 
     def create_savings_account(self, account_holder):
         """
@@ -216,6 +180,9 @@ class AccountAuthoriser:
         """
         Check if the account holder, holds any savings accounts
 
+        Long term savings accounts count as savings accounts. The check uses
+        the account system's holder summary, so takes constant time
+
         Parameters
         ----------
         account_holder : str
@@ -226,5 +193,5 @@ class AccountAuthoriser:
         bool
             `True` if the account holder has a savings account, else `False`
         """
-        accounts = self.__account_system.find_users_accounts(account_holder)
-        return any(map(lambda a: isinstance(a, Account.SavingsAccount), accounts))
+        summary = self.__account_system.holder_summary(account_holder)
+        return any(map(summary.get, _savings_account_types))
@@ -0,0 +1,205 @@
+"""
+Exercise 13.3r Account Numbers
+
+Provides an allocator that issues unique account numbers with a check digit
+
+An account number is a 15 digit serial number followed by a Luhn check
+digit. Serial numbers are issued in increasing order, so a number is never
+issued twice, and the check digit catches any single mistyped digit and most
+swapped pairs of digits
+
+Classes
+-------
+AccountNumberAllocator
+    thread-safe allocator issuing unique account numbers in blocks
+
+Functions
+---------
+check_digit
+    calculate the Luhn check digit of a serial number
+is_valid_account_number
+    check if a string is an account number with a correct check digit
+
+Variables
+---------
+SERIAL_DIGITS : int
+    number of digits in the serial number part of an account number
+"""
+
+import threading
+
+SERIAL_DIGITS = 15
+
+# doubled value of each digit with the digits of the result summed
+_doubled_digits = (0, 2, 4, 6, 8, 1, 3, 5, 7, 9)
+
+
+def _luhn_total(serial):
+    """
+    Calculate the Luhn sum of the digits of a serial number
+
+    Parameters
+    ----------
+    serial : str
+        serial number, as a string of decimal digits
+
+    Returns
+    -------
+    int
+        sum of the digits, with the digit next to the check digit and then
+        every other digit doubled
+    """
+    total = 0
+    for position, digit in enumerate(reversed(serial)):
+        digit = ord(digit) - 48
+        total += _doubled_digits[digit] if position % 2 == 0 else digit
+    return total
+
+
+# a block holds the serial numbers sharing all but their last few digits.
+# Each digit adds to the Luhn sum on its own, so the sum of a serial number
+# is the sum for its shared digits plus the sum for its last digits
+_block_digits = 3
+_block_size = 10**_block_digits
+_block_suffixes = [
+    (suffix, _luhn_total(suffix))
+    for suffix in ("{0:0{1}d}".format(n, _block_digits) for n in range(_block_size))
+]
+
+
+def check_digit(serial):
+    """
+    Calculate the Luhn check digit of a serial number
+
+    Parameters
+    ----------
+    serial : str
+        serial number, as a string of decimal digits
+
+    Returns
+    -------
+    int
+        the check digit to place after the serial number
+    """
+    return -_luhn_total(serial) % 10
+
+
+def is_valid_account_number(account_number):
+    """
+    Check if a string is an account number with a correct check digit
+
+    Parameters
+    ----------
+    account_number : str
+        string to check
+
+    Returns
+    -------
+    bool
+        `True` if `account_number` is a serial number followed by its check
+        digit, else `False`
+    """
+    return (
+        len(account_number) == SERIAL_DIGITS + 1
+        and account_number.isascii()
+        and account_number.isdigit()
+        and check_digit(account_number[:-1]) == int(account_number[-1])
+    )
+
+
+class AccountNumberAllocator:
+    """
+    Thread-safe allocator issuing unique account numbers
+
+    Serial numbers are reserved and formatted a block of a thousand at a
+    time, so issuing a number only takes the next one from the current
+    block. A lock guards the block, so several threads can share one
+    allocator. A pickled allocator keeps its place, and goes on from the
+    first number it has not issued
+    """
+
+    def __init__(self, used_numbers=()):
+        """
+        Create a new `AccountNumberAllocator`
+
+        Parameters
+        ----------
+        used_numbers : Iterable[str], optional
+            account numbers already in use, by default none. Numbers are
+            issued after the highest valid account number among them, other
+            strings cannot clash with an issued number and are ignored
+        """
+        self.__next_serial = 1 + max(
+            (
+                int(number[:-1])
+                for number in used_numbers
+                if is_valid_account_number(number)
+            ),
+            default=0,
+        )
+        self.__block = iter(())
+        self.__lock = threading.Lock()
+
+    def __getstate__(self):
+        # only the next serial number is pickled, the block is regenerated
+        with self.__lock:
+            remaining = list(self.__block)
+            self.__block = iter(remaining)
+            if remaining:
+                return {"next_serial": int(remaining[0][:-1])}
+            return {"next_serial": self.__next_serial}
+
+    def __setstate__(self, state):
+        self.__next_serial = state["next_serial"]
+        self.__block = iter(())
+        self.__lock = threading.Lock()
+
+    def __reserve_block(self):
+        """
+        Reserve the next block of serial numbers and generate their account
+        numbers
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        OverflowError
+            raised if every serial number has been issued
+        """
+        start = self.__next_serial
+        if start >= 10**SERIAL_DIGITS:
+            raise OverflowError("Every account number has been issued")
+        block, first_suffix = divmod(start, _block_size)
+        self.__next_serial = (block + 1) * _block_size
+        prefix = "{0:0{1}d}".format(block, SERIAL_DIGITS - _block_digits)
+        # zeros add nothing to the sum, but place the prefix digits correctly
+        prefix_total = _luhn_total(prefix + "0" * _block_digits)
+        self.__block = iter(
+            [
+                prefix + suffix + str(-(prefix_total + suffix_total) % 10)
+                for suffix, suffix_total in _block_suffixes[first_suffix:]
+            ]
+        )
+
+    def allocate(self):
+        """
+        Issue a new account number
+
+        Returns
+        -------
+        str
+            an account number that has not been issued before
+
+        Raises
+        ------
+        OverflowError
+            raised if every serial number has been issued
+        """
+        with self.__lock:
+            account_number = next(self.__block, None)
+            if account_number is None:
+                self.__reserve_block()
+                account_number = next(self.__block)
+            return account_number
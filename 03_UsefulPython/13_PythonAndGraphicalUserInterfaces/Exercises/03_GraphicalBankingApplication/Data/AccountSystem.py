@@ -13,13 +13,31 @@ See Also
 Data.Account : Module containing implementation of classes representing a bank account
 """
 
+import bisect
+import collections
 import datetime
+import os
 import pickle
+import threading
+
+from Data import Account, AccountNumbers, InterestEngine, Ledger, MaturityIndex
 
 
 class AccountSystem:
     """
     Represents the account management system of a bank
+
+    Accounts are held in a dictionary keyed by account number, and grouped
+    by account holder under the holder's normalised name. A sorted list of
+    the normalised names answers prefix searches over the holders, and the
+    number of accounts of each type every holder has is kept up to date.
+    Long term savings accounts are also kept in a `MaturityIndex`. New
+    account numbers are issued by an `AccountNumberAllocator` that is saved
+    with the system
+
+    Adding accounts is guarded by a lock, and each account has its own lock
+    for changes to its balance, so the system can be used from several
+    threads. Money is moved between accounts with `transfer`
     """
 
     def __init__(self):
@@ -28,7 +46,55 @@ class AccountSystem:
         """
         self.__account_dictionary = {}
         self.__account_name_dictionary = {}
+        self.__holder_keys = []
+        self.__holder_counts = {}
+        self.__maturity_index = MaturityIndex.MaturityIndex()
+        self.__account_numbers = AccountNumbers.AccountNumberAllocator()
         self.__date_last_loaded = datetime.date.today()
+        self.__lock = threading.Lock()
+
+    def __getstate__(self):
+        # the holder and maturity indices are derived data, so they are not
+        # pickled
+        state = self.__dict__.copy()
+        del state["_AccountSystem__holder_keys"]
+        del state["_AccountSystem__holder_counts"]
+        del state["_AccountSystem__maturity_index"]
+        del state["_AccountSystem__lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.__lock = threading.Lock()
+        if "_AccountSystem__account_numbers" not in state:
+            # systems saved before numbers were allocated by the system
+            self.__account_numbers = AccountNumbers.AccountNumberAllocator(
+                self.__account_dictionary
+            )
+        self.__build_holder_index()
+        self.__maturity_index = MaturityIndex.MaturityIndex(
+            account
+            for account in self.__account_dictionary.values()
+            if isinstance(account, Account.LongTermSavingsAccount)
+        )
+
+    def __build_holder_index(self):
+        """
+        Regroup the accounts by normalised holder name and rebuild the
+        sorted list of holder names and the counts of their accounts
+
+        Returns
+        -------
+        None
+        """
+        self.__account_name_dictionary = {}
+        self.__holder_counts = {}
+        for account in self.__account_dictionary.values():
+            holder = Account.normalise_holder(account.account_holder)
+            self.__account_name_dictionary.setdefault(holder, []).append(account)
+            counts = self.__holder_counts.setdefault(holder, collections.Counter())
+            counts[account.account_type] += 1
+        self.__holder_keys = sorted(self.__account_name_dictionary)
 
     def __str__(self):
         print_string = ""
@@ -44,7 +110,10 @@ class AccountSystem:
 
         `AccountSystem` is saved as a pickled binary file in the file given
         by `filename`. The file is created if it doesn't exist. If the file
-        already exists it is overwritten
+        already exists it is overwritten. The account ledgers are saved
+        separately, in the SQLite file named by `ledger_filename`. Only the
+        entries that file is missing are written, so saving to a new name
+        writes the whole of every ledger
 
         Parameters
         ----------
@@ -64,9 +133,31 @@ class AccountSystem:
         --------
         AccountSystem.load : load a `AccountSystem` object from a file
         """
+        # the ledgers are saved first, so a pickle never refers to entries
+        # that were not written
+        Ledger.save_ledgers(
+            AccountSystem.ledger_filename(filename), self.__account_dictionary.values()
+        )
         with open(filename, "wb") as output_file:
             pickle.dump(self, output_file)
 
+    @staticmethod
+    def ledger_filename(filename):
+        """
+        Get the path of the ledger file belonging to a saved account system
+
+        Parameters
+        ----------
+        filename : str
+            path to the pickled account system
+
+        Returns
+        -------
+        str
+            path to the ledger file
+        """
+        return filename + ".ledger"
+
     @staticmethod
     def load(filename):
         """
@@ -93,6 +184,9 @@ class AccountSystem:
         """
         with open(filename, "rb") as input_file:
             accounts = pickle.load(input_file)
+        ledger_filename = AccountSystem.ledger_filename(filename)
+        if os.path.exists(ledger_filename):
+            Ledger.load_ledgers(ledger_filename, accounts.__account_dictionary)
 
         # update the time applying interest as required
         today = datetime.date.today()
@@ -101,10 +195,9 @@ class AccountSystem:
             today.month - last_loaded.month
         )
 
-        # apply interest while there is a difference
-        while total_month_delta >= 1:
-            accounts.apply_interest()
-            total_month_delta -= 1
+        # apply the missed months of interest in one step
+        if total_month_delta >= 1:
+            accounts.apply_interest_periods(total_month_delta)
 
         accounts.update_date_last_loaded()
 
@@ -130,13 +223,52 @@ class AccountSystem:
         KeyError
             Raised if the accounts's `account_number` is already registered as a key
         """
-        if account.account_number in self.__account_dictionary:
-            raise KeyError("This account number is already in use")
-        self.__account_dictionary[account.account_number] = account
-        if account.account_holder in self.__account_name_dictionary:
-            self.__account_name_dictionary[account.account_holder].append(account)
-        else:
-            self.__account_name_dictionary[account.account_holder] = [account]
+        holder = Account.normalise_holder(account.account_holder)
+        with self.__lock:
+            if account.account_number in self.__account_dictionary:
+                raise KeyError("This account number is already in use")
+            self.__account_dictionary[account.account_number] = account
+            if holder in self.__account_name_dictionary:
+                self.__account_name_dictionary[holder].append(account)
+            else:
+                self.__account_name_dictionary[holder] = [account]
+                self.__holder_counts[holder] = collections.Counter()
+                bisect.insort(self.__holder_keys, holder)
+            self.__holder_counts[holder][account.account_type] += 1
+            if isinstance(account, Account.LongTermSavingsAccount):
+                self.__maturity_index.add(account)
+
+    def transfer(self, source_number, destination_number, amount):
+        """
+        Atomically move money between two accounts in the system
+
+        Parameters
+        ----------
+        source_number : str
+            account number of the account to withdraw the money from
+        destination_number : str
+            account number of the account to deposit the money in
+        amount : int | float
+            amount in dollars to transfer
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        KeyError
+            Raised if either account number is not in the system
+        ValueError
+            Raised if the transfer is not allowed by either account
+
+        See Also
+        --------
+        Data.Account.transfer : move money between two accounts
+        """
+        source = self.__account_dictionary[source_number]
+        destination = self.__account_dictionary[destination_number]
+        Account.transfer(source, destination, amount)
 
     def get_account(self, account_number):
         """
@@ -154,6 +286,22 @@ class AccountSystem:
         """
         return self.__account_dictionary.get(account_number)
 
+    def allocate_account_number(self):
+        """
+        Issue a number for a new account in the system
+
+        Returns
+        -------
+        str
+            an account number that the system has not issued before
+
+        Raises
+        ------
+        OverflowError
+            Raised if every account number has been issued
+        """
+        return self.__account_numbers.allocate()
+
     def find_users_accounts(self, name):
         """
         Find the accounts associated with a given user
@@ -168,12 +316,146 @@ class AccountSystem:
         List[Account]
             list of accounts held by the given name, if there are no matches the list is empty
         """
-        name = name.strip().lower()
+        name = Account.normalise_holder(name)
         try:
             return self.__account_name_dictionary[name]
         except KeyError:
             return []
 
+    def accounts_maturing(self, first_date, last_date):
+        """
+        Find the long term savings accounts that mature in a range of dates
+
+        Parameters
+        ----------
+        first_date : datetime.date
+            first date of the range
+        last_date : datetime.date
+            last date of the range, inclusive
+
+        Returns
+        -------
+        list[LongTermSavingsAccount]
+            accounts with a maturation date in the range, in date order
+        """
+        with self.__lock:
+            return self.__maturity_index.accounts_maturing(first_date, last_date)
+
+    def reinvest_account(self, account_number):
+        """
+        Reinvest a matured long term savings account, starting a new term
+
+        Parameters
+        ----------
+        account_number : str
+            account number of a long term savings account
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        KeyError
+            Raised if the account is not a long term savings account in the
+            system
+        ValueError
+            Raised if the account has not matured
+
+        See Also
+        --------
+        Data.Account.LongTermSavingsAccount.manage_account : manage a matured account
+        """
+        with self.__lock:
+            account = self.__account_dictionary[account_number]
+            if not isinstance(account, Account.LongTermSavingsAccount):
+                raise KeyError("Account is not a long term savings account")
+            account.manage_account()
+
+    def reinvest_matured_accounts(self, today=None):
+        """
+        Reinvest every matured long term savings account
+
+        Parameters
+        ----------
+        today : datetime.date | None, optional
+            date to check maturity on, by default None which uses today
+
+        Returns
+        -------
+        list[LongTermSavingsAccount]
+            the reinvested accounts
+        """
+        with self.__lock:
+            accounts = self.__maturity_index.matured(today)
+            for account in accounts:
+                account.manage_account()
+            return accounts
+
+    def holders(self):
+        """
+        Generate every account holder with their accounts
+
+        Accounts must not be added while the holders are generated
+
+        Yields
+        ------
+        tuple[str, list[Account]]
+            the normalised name of a holder and a list of their accounts
+        """
+        for holder, accounts in self.__account_name_dictionary.items():
+            yield holder, list(accounts)
+
+    def holder_summary(self, name):
+        """
+        Count the accounts of each type held by an account holder
+
+        Takes constant time, as the counts are kept up to date as accounts
+        are added
+
+        Parameters
+        ----------
+        name : str
+            name of the account holder
+
+        Returns
+        -------
+        dict[str, int]
+            dictionary mapping `Account.account_type` strings to the number
+            of accounts of that type the holder has. Types the holder has no
+            accounts of are left out
+        """
+        counts = self.__holder_counts.get(Account.normalise_holder(name), {})
+        return dict(counts)
+
+    def find_holders_with_prefix(self, prefix, limit=None):
+        """
+        Find the account holders whose names start with a given prefix
+
+        The search ignores case and extra whitespace, and takes
+        O(log n + k) time for n holders and k results
+
+        Parameters
+        ----------
+        prefix : str
+            start of the names to search for
+        limit : int | None, optional
+            largest number of names to return, by default None which
+            returns every match
+
+        Returns
+        -------
+        list[str]
+            normalised names of the matching holders, in alphabetical order
+        """
+        prefix = Account.normalise_holder(prefix)
+        start = bisect.bisect_left(self.__holder_keys, prefix)
+        # every name starting with the prefix sorts before this bound
+        end = bisect.bisect_left(self.__holder_keys, prefix + "\U0010ffff", lo=start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.__holder_keys[start:end]
+
     def apply_interest(self):
         """
         Applies interest to all accounts in the system
@@ -185,6 +467,56 @@ class AccountSystem:
         for account in self.__account_dictionary.values():
             account.apply_interest()
 
+    def apply_interest_batch(self, periods=1):
+        """
+        Applies interest to all accounts in the system using the batch engine
+
+        Gives the same balances as `apply_interest`, but works on the
+        balances of each account type in bulk. The matured long term savings
+        accounts are taken from the maturity index
+
+        Parameters
+        ----------
+        periods : int, optional
+            number of months of interest to apply, by default 1
+
+        Returns
+        -------
+        None
+
+        See Also
+        --------
+        Data.InterestEngine.apply_interest : the batch interest engine
+        """
+        with self.__lock:
+            matured = set(self.__maturity_index.matured())
+        InterestEngine.apply_interest(
+            self.__account_dictionary.values(), periods, matured=matured
+        )
+
+    def apply_interest_periods(self, periods):
+        """
+        Applies several months of interest to all accounts in the system
+
+        Gives the same balances as calling `apply_interest` `periods` times,
+        but visits each account only once
+
+        Parameters
+        ----------
+        periods : int
+            number of months of interest to apply
+
+        Returns
+        -------
+        None
+
+        See Also
+        --------
+        Account.Account.apply_interest_periods : apply the interest to one account
+        """
+        for account in self.__account_dictionary.values():
+            account.apply_interest_periods(periods)
+
     @property
     def date_last_loaded(self):
         """
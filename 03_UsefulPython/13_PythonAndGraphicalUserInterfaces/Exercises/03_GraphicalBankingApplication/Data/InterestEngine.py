@@ -0,0 +1,160 @@
+"""
+Exercise 13.3o Interest Engine
+
+Provides a batch interest run that applies interest to many accounts at once
+
+Accounts are grouped by their concrete type. Each group's balances, in
+cents, and monthly rates are gathered into arrays, the interest is worked out
+for the whole array, and recorded in each account's ledger. NumPy is used
+when it is installed, otherwise the arrays are Python lists
+
+The run does not take the account locks, so it must not overlap with other
+changes to the accounts, such as tellers making deposits or transfers
+
+Functions
+---------
+apply_interest
+    apply months of interest to a collection of accounts
+
+Variables
+---------
+numpy_available : bool
+    `True` if NumPy could be imported
+
+See Also
+--------
+Data.Account : Module containing implementation of classes representing a bank account
+"""
+
+import collections
+import datetime
+import itertools
+import operator
+
+try:
+    import numpy
+
+    numpy_available = True
+except ImportError:
+    numpy = None
+    numpy_available = False
+
+
+_get_balance = operator.attrgetter("ledger.balance")
+
+
+def apply_interest(accounts, periods=1, use_numpy=None, matured=None):
+    """
+    Apply months of interest to a collection of accounts
+
+    The balances are the same as calling `apply_interest` on every account
+    `periods` times
+
+    Parameters
+    ----------
+    accounts : Iterable[Account]
+        accounts to apply interest to
+    periods : int, optional
+        number of months of interest to apply, by default 1
+    use_numpy : bool | None, optional
+        `True` to use NumPy, `False` to use Python lists, by default None
+        which uses NumPy if it is available
+    matured : set[LongTermSavingsAccount] | None, optional
+        long term savings accounts that have matured, by default None which
+        checks the dates of each account
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    ImportError
+        raised if `use_numpy` is `True` and NumPy is not available
+    """
+    if use_numpy is None:
+        use_numpy = numpy_available
+    elif use_numpy and not numpy_available:
+        raise ImportError("NumPy is not available")
+
+    groups = collections.defaultdict(list)
+    for account in accounts:
+        groups[type(account)].append(account)
+
+    today = datetime.date.today()
+    for account_class, group in groups.items():
+        balances = list(map(_get_balance, group))
+        rates = account_class.batch_interest_rates(group, today, matured)
+        if use_numpy:
+            interest = _compound_numpy(balances, rates, periods)
+        else:
+            interest = _compound_lists(balances, rates, periods)
+        collections.deque(
+            map(
+                account_class._record_interest,
+                group,
+                interest,
+                itertools.repeat(today),
+            ),
+            maxlen=0,
+        )
+
+
+def _compound_numpy(balances, rates, periods):
+    """
+    Compound balances using NumPy arrays
+
+    Each month's interest is rounded to the nearest cent, halves to even,
+    as `Account.apply_interest` does
+
+    Parameters
+    ----------
+    balances : list[int]
+        starting balances in cents
+    rates : list[int | float]
+        monthly interest rate of each balance
+    periods : int
+        number of months to compound
+
+    Returns
+    -------
+    list[int]
+        the total interest in cents earned by each balance
+    """
+    count = len(balances)
+    start_balances = numpy.fromiter(balances, dtype=numpy.int64, count=count)
+    rate_array = numpy.fromiter(rates, dtype=numpy.float64, count=count)
+    new_balances = start_balances.copy()
+    for _ in range(periods):
+        new_balances += numpy.rint(new_balances * rate_array).astype(numpy.int64)
+    return (new_balances - start_balances).tolist()
+
+
+def _compound_lists(balances, rates, periods):
+    """
+    Compound balances using Python lists
+
+    Each month's interest is rounded to the nearest cent, halves to even,
+    as `Account.apply_interest` does
+
+    Parameters
+    ----------
+    balances : list[int]
+        starting balances in cents
+    rates : list[int | float]
+        monthly interest rate of each balance
+    periods : int
+        number of months to compound
+
+    Returns
+    -------
+    list[int]
+        the total interest in cents earned by each balance
+    """
+    new_balances = balances
+    for _ in range(periods):
+        new_balances = [
+            balance + round(balance * rate)
+            for balance, rate in zip(new_balances, rates)
+        ]
+    return [new - start for new, start in zip(new_balances, balances)]
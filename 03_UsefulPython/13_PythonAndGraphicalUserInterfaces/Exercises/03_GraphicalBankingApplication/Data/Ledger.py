@@ -0,0 +1,497 @@
+"""
+Exercise 13.3q Ledger
+
+Provides an append-only transaction ledger for an account, held in integer
+minor units (cents)
+
+Classes
+-------
+Ledger
+    append-only record of the transactions on a single account
+
+Functions
+---------
+to_minor_units
+    convert an amount in dollars to a whole number of cents
+round_to_minor_units
+    round an amount in dollars to the nearest cent
+from_minor_units
+    convert a number of cents to dollars
+save_ledgers
+    write the ledgers of a collection of accounts to an SQLite file
+load_ledgers
+    read the ledgers of a collection of accounts from an SQLite file
+
+Variables
+---------
+MINOR_UNITS : int
+    number of minor units in a dollar
+MAX_AMOUNT : int
+    largest whole number of dollars a ledger entry can hold
+OPENING, DEPOSIT, WITHDRAWAL, INTEREST : int
+    kinds of ledger entry
+kind_names : dict[int, str]
+    dictionary mapping each kind of ledger entry to a human readable string
+
+See Also
+--------
+Data.Account : Module containing implementation of classes representing a bank account
+"""
+
+import array
+import bisect
+import datetime
+import decimal
+import itertools
+import os
+import sqlite3
+
+MINOR_UNITS = 100
+
+OPENING = 0
+DEPOSIT = 1
+WITHDRAWAL = 2
+INTEREST = 3
+
+kind_names = {
+    OPENING: "Opening balance",
+    DEPOSIT: "Deposit",
+    WITHDRAWAL: "Withdrawal",
+    INTEREST: "Interest",
+}
+
+# largest number of cents an entry can hold, the limit of a signed 64-bit
+# array element and SQLite integer
+_max_minor_units = 2**63 - 1
+MAX_AMOUNT = _max_minor_units // MINOR_UNITS
+
+
+def to_minor_units(amount):
+    """
+    Convert an amount in dollars to a whole number of cents
+
+    Parameters
+    ----------
+    amount : int | float | str
+        amount in dollars
+
+    Returns
+    -------
+    int
+        the amount in cents
+
+    Raises
+    ------
+    ValueError
+        raised if `amount` is not a whole number of cents, or is too large
+        to record
+    """
+    value = decimal.Decimal(str(amount)) * MINOR_UNITS
+    if not value.is_finite() or abs(value) > _max_minor_units:
+        raise ValueError("Amount is too large to record")
+    if value != value.to_integral_value():
+        raise ValueError("Amounts must be a whole number of cents")
+    return int(value)
+
+
+def round_to_minor_units(amount):
+    """
+    Round an amount in dollars to the nearest cent
+
+    Halves are rounded to the nearest even cent
+
+    Parameters
+    ----------
+    amount : int | float
+        amount in dollars
+
+    Returns
+    -------
+    int
+        the amount in cents
+    """
+    return round(decimal.Decimal(repr(amount)) * MINOR_UNITS)
+
+
+def from_minor_units(minor_units):
+    """
+    Convert a number of cents to dollars
+
+    Parameters
+    ----------
+    minor_units : int
+        amount in cents
+
+    Returns
+    -------
+    int | float
+        the amount in dollars, as an `int` if it is a whole number of dollars
+    """
+    if minor_units % MINOR_UNITS == 0:
+        return minor_units // MINOR_UNITS
+    return minor_units / MINOR_UNITS
+
+
+class Ledger:
+    """
+    Append-only record of the transactions on a single account
+
+    Every entry holds the day it was made, its kind, the amount in cents
+    and the running balance after it. The running balance of the last entry
+    is the account balance, so reading the balance takes constant time, and
+    the balance on any earlier date is found by binary search over the days
+
+    Notes
+    -----
+    Only the number of entries and the balance are pickled. The entries
+    themselves are saved with `save_ledgers` and restored with
+    `load_ledgers`. Until they are restored an unpickled ledger holds a
+    single opening entry carrying its balance
+    """
+
+    __slots__ = ("__entries", "__stored_count", "__stored_file", "__expected_count")
+
+    # each entry is stored as four values in a single array
+    __fields = 4
+
+    def __init__(self):
+        """
+        Create a new, empty `Ledger`
+        """
+        self.__entries = array.array("q")
+        self.__stored_count = 0
+        self.__stored_file = None
+        self.__expected_count = 0
+
+    def __getstate__(self):
+        return (len(self), self.last_day, self.balance)
+
+    def __setstate__(self, state):
+        count, last_day, balance = state
+        self.__entries = array.array("q")
+        self.__stored_count = 0
+        self.__stored_file = None
+        self.__expected_count = count
+        if count:
+            self.__entries.extend((last_day, OPENING, balance, balance))
+
+    def __len__(self):
+        return len(self.__entries) // Ledger.__fields
+
+    @property
+    def balance(self):
+        """
+        balance : int
+            running balance in cents after the last entry
+        """
+        if not self.__entries:
+            return 0
+        return self.__entries[-1]
+
+    @property
+    def last_day(self):
+        """
+        last_day : int
+            proleptic Gregorian ordinal of the day of the last entry, or 0 if
+            the ledger is empty
+        """
+        if not self.__entries:
+            return 0
+        return self.__entries[-Ledger.__fields]
+
+    def append(self, amount, kind, date=None):
+        """
+        Add an entry to the end of the ledger
+
+        Parameters
+        ----------
+        amount : int
+            amount in cents, negative for money leaving the account
+        kind : int
+            kind of entry, one of `DEPOSIT`, `WITHDRAWAL`, `INTEREST` or
+            `OPENING`
+        date : datetime.date | None, optional
+            date of the entry, by default None which uses today
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError
+            raised if `date` is before the date of the last entry, or the
+            amount or new balance is too large to record
+        """
+        if date is None:
+            date = datetime.date.today()
+        day = date.toordinal()
+        entries = self.__entries
+        balance = amount
+        if entries:
+            if day < entries[-Ledger.__fields]:
+                raise ValueError("Ledger entries must be added in date order")
+            balance = balance + entries[-1]
+        if max(abs(amount), abs(balance)) > _max_minor_units:
+            raise ValueError("Amount is too large to record")
+        # the entry is built in full first, so a failure never leaves part
+        # of an entry behind
+        entries.extend(array.array("q", (day, kind, amount, balance)))
+
+    def balance_as_of(self, date):
+        """
+        Get the balance at the end of a given date
+
+        Parameters
+        ----------
+        date : datetime.date
+            date to find the balance on
+
+        Returns
+        -------
+        int
+            running balance in cents after the last entry made on or
+            before `date`
+        """
+        position = self.__find_day(date.toordinal(), bisect.bisect_right)
+        if position == 0:
+            return 0
+        return self.__entries[position * Ledger.__fields - 1]
+
+    def entries(self, first_date=None, last_date=None):
+        """
+        Generate the entries of the ledger, oldest first
+
+        Parameters
+        ----------
+        first_date : datetime.date | None, optional
+            date of the first entries to generate, by default None which
+            starts from the oldest entry
+        last_date : datetime.date | None, optional
+            date of the last entries to generate, by default None which runs
+            to the newest entry
+
+        Yields
+        ------
+        tuple[datetime.date, int, int, int]
+            the date, kind, amount and running balance of each entry
+        """
+        fields = Ledger.__fields
+        entries = self.__entries
+        first = 0
+        last = len(self)
+        if first_date is not None:
+            first = self.__find_day(first_date.toordinal(), bisect.bisect_left)
+        if last_date is not None:
+            last = self.__find_day(last_date.toordinal(), bisect.bisect_right)
+        for start in range(first * fields, last * fields, fields):
+            day, kind, amount, balance = entries[start : start + fields]
+            yield datetime.date.fromordinal(day), kind, amount, balance
+
+    def __find_day(self, day, search):
+        """
+        Binary search the entries by day
+
+        Parameters
+        ----------
+        day : int
+            proleptic Gregorian ordinal of the day to search for
+        search : Callable
+            `bisect.bisect_left` or `bisect.bisect_right`
+
+        Returns
+        -------
+        int
+            position of the first entry after `day`, or for `bisect_left`
+            of the first entry on or after `day`
+        """
+        fields = Ledger.__fields
+        entries = self.__entries
+        return search(range(len(self)), day, key=lambda i: entries[i * fields])
+
+    def restore(self, rows, filename):
+        """
+        Replace the entries of an unpickled ledger with its saved entries
+
+        Saved entries after the number the ledger was pickled with are
+        ignored, as they were written by a save that did not complete
+
+        Parameters
+        ----------
+        rows : Iterable[tuple[int, int, int]]
+            the day ordinal, kind and amount of each saved entry, oldest first
+        filename : str
+            absolute path to the ledger file the entries were read from
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        ValueError
+            raised if the saved entries do not give the pickled balance
+        """
+        entries = array.array("q")
+        balance = 0
+        for day, kind, amount in itertools.islice(rows, self.__expected_count):
+            balance = balance + amount
+            entries.extend((day, kind, amount, balance))
+        if len(entries) // Ledger.__fields != self.__expected_count:
+            raise ValueError("Ledger has fewer saved entries than expected")
+        if balance != self.balance:
+            raise ValueError("Saved ledger entries do not match the balance")
+        self.__entries = entries
+        self.__stored_count = self.__expected_count
+        self.__stored_file = filename
+
+    def unsaved_rows(self, filename):
+        """
+        Get the entries a ledger file is missing
+
+        Only the entries added since the ledger was last saved to or restored
+        from the same file are missing from it. Any other file is missing
+        every entry
+
+        Parameters
+        ----------
+        filename : str | None
+            absolute path to the ledger file, or None for a new file
+
+        Returns
+        -------
+        tuple[int, list[tuple[int, int, int, int]]]
+            the sequence number of the first unsaved entry, and the sequence
+            number, day ordinal, kind and amount of each unsaved entry
+        """
+        first = 0
+        if filename is not None and filename == self.__stored_file:
+            first = self.__stored_count
+        fields = Ledger.__fields
+        entries = self.__entries
+        rows = [
+            (sequence,) + tuple(entries[sequence * fields : sequence * fields + 3])
+            for sequence in range(first, len(self))
+        ]
+        return first, rows
+
+    def mark_saved(self, filename):
+        """
+        Record that every entry of the ledger has been saved to a file
+
+        Parameters
+        ----------
+        filename : str
+            absolute path to the ledger file
+
+        Returns
+        -------
+        None
+        """
+        self.__stored_count = len(self)
+        self.__stored_file = filename
+
+
+_schema = """
+CREATE TABLE IF NOT EXISTS ledger_entries (
+    account_number TEXT NOT NULL,
+    sequence INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    amount INTEGER NOT NULL,
+    PRIMARY KEY (account_number, sequence)
+) WITHOUT ROWID;
+"""
+
+
+def save_ledgers(filename, accounts):
+    """
+    Write the ledgers of a collection of accounts to an SQLite file
+
+    Only the entries added since each ledger was last saved to or restored
+    from the same file are written, in a single transaction. Saving to any
+    other file, or to a new one, writes every entry
+
+    Parameters
+    ----------
+    filename : str
+        path to the ledger file. The file is created if it doesn't exist
+    accounts : Iterable[Account]
+        accounts whose ledgers are saved
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    sqlite3.Error
+        raised if the ledgers fail to save
+    """
+    filename = os.path.abspath(filename)
+    # a file that does not exist yet holds none of the entries, even one with
+    # the name a ledger was last saved to
+    target = filename if os.path.exists(filename) else None
+    connection = sqlite3.connect(filename)
+    saved = []
+    try:
+        with connection:
+            connection.executescript(_schema)
+            for account in accounts:
+                first, rows = account.ledger.unsaved_rows(target)
+                if not rows:
+                    continue
+                # drop any entries left by a save that did not complete
+                connection.execute(
+                    "DELETE FROM ledger_entries"
+                    " WHERE account_number = ? AND sequence >= ?",
+                    (account.account_number, first),
+                )
+                connection.executemany(
+                    "INSERT INTO ledger_entries VALUES (?, ?, ?, ?, ?)",
+                    [(account.account_number,) + row for row in rows],
+                )
+                saved.append(account.ledger)
+    finally:
+        connection.close()
+    for ledger in saved:
+        ledger.mark_saved(filename)
+
+
+def load_ledgers(filename, accounts):
+    """
+    Read the ledgers of a collection of accounts from an SQLite file
+
+    Parameters
+    ----------
+    filename : str
+        path to the ledger file
+    accounts : dict[str, Account]
+        dictionary mapping account numbers to unpickled accounts
+
+    Returns
+    -------
+    None
+
+    Raises
+    ------
+    ValueError
+        raised if the saved entries of an account do not match its balance
+    sqlite3.Error
+        raised if the file cannot be read
+    """
+    filename = os.path.abspath(filename)
+    connection = sqlite3.connect(filename)
+    try:
+        rows = connection.execute(
+            "SELECT account_number, day, kind, amount FROM ledger_entries"
+            " ORDER BY account_number, sequence"
+        )
+        for account_number, account_rows in itertools.groupby(
+            rows, key=lambda row: row[0]
+        ):
+            account = accounts.get(account_number)
+            if account is not None:
+                account.ledger.restore((row[1:] for row in account_rows), filename)
+    finally:
+        connection.close()
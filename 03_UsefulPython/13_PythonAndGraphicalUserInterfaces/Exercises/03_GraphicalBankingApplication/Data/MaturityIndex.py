@@ -0,0 +1,149 @@
+"""
+Exercise 13.3s Maturity Index
+
+Provides a calendar of long term savings accounts keyed by the date they
+mature, so the accounts maturing in a range of dates can be found without
+checking every account
+
+Classes
+-------
+MaturityIndex
+    calendar of long term savings accounts bucketed by maturation date
+
+See Also
+--------
+Data.Account : Module containing implementation of classes representing a bank account
+"""
+
+import bisect
+import datetime
+
+
+class MaturityIndex:
+    """
+    Calendar of long term savings accounts bucketed by maturation date
+
+    Accounts are kept in a bucket for each maturation day, and the days with
+    a bucket are kept in a sorted list. Finding the k accounts maturing in a
+    range of dates takes O(log n + k) time
+
+    Notes
+    -----
+    An account's maturation date only changes when it is reinvested. The
+    index makes itself the receiver of every account added to it, so an
+    account reinvested through `manage_account` is moved to its new day
+    straight away. An account can only be the receiver of one index at a
+    time, so other indices holding it must be told through `reschedule`
+    """
+
+    def __init__(self, accounts=()):
+        """
+        Create a new `MaturityIndex`
+
+        Parameters
+        ----------
+        accounts : Iterable[LongTermSavingsAccount], optional
+            accounts to add to the index, by default none
+        """
+        self.__buckets = {}
+        self.__days = []
+        self.__account_days = {}
+        for account in accounts:
+            self.add(account)
+
+    def __len__(self):
+        return len(self.__account_days)
+
+    def add(self, account):
+        """
+        Add an account to the index
+
+        Parameters
+        ----------
+        account : LongTermSavingsAccount
+            account to add
+
+        Returns
+        -------
+        None
+        """
+        day = account.maturation_date.toordinal()
+        self.__account_days[account.account_number] = day
+        bucket = self.__buckets.get(day)
+        if bucket is None:
+            self.__buckets[day] = bucket = []
+            bisect.insort(self.__days, day)
+        bucket.append(account)
+        account.receiver = self
+
+    def reschedule(self, account):
+        """
+        Move an account to the bucket for its current maturation date
+
+        Called by an account in the index when it is reinvested
+
+        Parameters
+        ----------
+        account : LongTermSavingsAccount
+            account in the index
+
+        Returns
+        -------
+        None
+
+        Raises
+        ------
+        KeyError
+            raised if the account is not in the index
+        """
+        old_day = self.__account_days[account.account_number]
+        if old_day == account.maturation_date.toordinal():
+            return
+        bucket = self.__buckets[old_day]
+        bucket[:] = [entry for entry in bucket if entry is not account]
+        if not bucket:
+            del self.__buckets[old_day]
+            del self.__days[bisect.bisect_left(self.__days, old_day)]
+        self.add(account)
+
+    def accounts_maturing(self, first_date, last_date):
+        """
+        Find the accounts that mature in a range of dates
+
+        Parameters
+        ----------
+        first_date : datetime.date
+            first date of the range
+        last_date : datetime.date
+            last date of the range, inclusive
+
+        Returns
+        -------
+        list[LongTermSavingsAccount]
+            accounts with a maturation date in the range, in date order
+        """
+        days = self.__days
+        start = bisect.bisect_left(days, first_date.toordinal())
+        end = bisect.bisect_right(days, last_date.toordinal())
+        found = []
+        for day in days[start:end]:
+            found.extend(self.__buckets[day])
+        return found
+
+    def matured(self, today=None):
+        """
+        Find the accounts that have matured
+
+        Parameters
+        ----------
+        today : datetime.date | None, optional
+            date to check maturity on, by default None which uses today
+
+        Returns
+        -------
+        list[LongTermSavingsAccount]
+            accounts that mature on or before `today`, in date order
+        """
+        if today is None:
+            today = datetime.date.today()
+        return self.accounts_maturing(datetime.date.min, today)
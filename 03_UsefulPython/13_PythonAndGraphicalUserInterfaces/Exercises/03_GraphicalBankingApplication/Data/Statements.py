@@ -0,0 +1,249 @@
+"""
+Exercise 13.3t Statements
+
+Provides a batch run that writes a statement for every account holder, each
+to its own file
+
+The ledgers are read in the main process, a chunk of holders at a time, and
+the chunks are rendered and written by a pool of worker processes. Only a
+few chunks are in flight at once, so memory use does not grow with the
+number of holders
+
+Functions
+---------
+render_statement
+    render the statement of one account holder
+write_statements
+    write a statement for every holder in an account system
+statement_filename
+    get the name of the file a holder's statement is written to
+
+See Also
+--------
+Data.AccountSystem : Module for handling the collection of accounts in a system
+"""
+
+import concurrent.futures
+import datetime
+import itertools
+import os
+import urllib.parse
+
+from Data import Ledger
+
+
+def statement_filename(holder):
+    """
+    Get the name of the file a holder's statement is written to
+
+    Characters that are not safe in a file name are escaped, so every holder
+    has a different file
+
+    Parameters
+    ----------
+    holder : str
+        normalised name of the account holder
+
+    Returns
+    -------
+    str
+        the file name
+    """
+    return urllib.parse.quote(holder, safe="") + ".txt"
+
+
+def _format_cents(minor_units):
+    """
+    Format an amount in cents as dollars
+
+    Parameters
+    ----------
+    minor_units : int
+        amount in cents
+
+    Returns
+    -------
+    str
+        the amount in dollars with two decimal places
+    """
+    sign = "-" if minor_units < 0 else ""
+    dollars, cents = divmod(abs(minor_units), Ledger.MINOR_UNITS)
+    return "{0}{1:,}.{2:02d}".format(sign, dollars, cents)
+
+
+def _statement_data(holder, accounts, first_date, last_date):
+    """
+    Read the ledger entries needed for a holder's statement
+
+    Parameters
+    ----------
+    holder : str
+        normalised name of the account holder
+    accounts : list[Account]
+        accounts held by the holder
+    first_date : datetime.date
+        first date of the statement period
+    last_date : datetime.date
+        last date of the statement period
+
+    Returns
+    -------
+    tuple[str, list[tuple]]
+        the holder and, for each account, its type, account number, opening
+        balance, entries in the period and closing balance
+    """
+    day_before = first_date - datetime.timedelta(days=1)
+    account_data = []
+    for account in accounts:
+        ledger = account.ledger
+        with account.lock:
+            account_data.append(
+                (
+                    account.account_type,
+                    account.account_number,
+                    ledger.balance_as_of(day_before),
+                    list(ledger.entries(first_date, last_date)),
+                    ledger.balance_as_of(last_date),
+                )
+            )
+    return holder, account_data
+
+
+def render_statement(holder, account_data, first_date, last_date):
+    """
+    Render the statement of one account holder
+
+    Parameters
+    ----------
+    holder : str
+        normalised name of the account holder
+    account_data : list[tuple]
+        the type, account number, opening balance, entries in the period and
+        closing balance of each account
+    first_date : datetime.date
+        first date of the statement period
+    last_date : datetime.date
+        last date of the statement period
+
+    Returns
+    -------
+    str
+        the statement
+    """
+    lines = [
+        "Statement for {0}".format(holder),
+        "Period: {0} to {1}".format(first_date, last_date),
+    ]
+    for account_type, account_number, opening, entries, closing in account_data:
+        lines.append("")
+        lines.append("{0} {1}".format(account_type, account_number))
+        lines.append("Opening balance: {0}".format(_format_cents(opening)))
+        for date, kind, amount, balance in entries:
+            lines.append(
+                "{0}  {1:<16}{2:>14}{3:>14}".format(
+                    date,
+                    Ledger.kind_names[kind],
+                    _format_cents(amount),
+                    _format_cents(balance),
+                )
+            )
+        lines.append("Closing balance: {0}".format(_format_cents(closing)))
+    lines.append("")
+    return "\n".join(lines)
+
+
+def _write_chunk(directory, chunk, first_date, last_date):
+    """
+    Render and write the statements of a chunk of holders
+
+    Runs in a worker process
+
+    Parameters
+    ----------
+    directory : str
+        directory to write the statements to
+    chunk : list[tuple[str, list[tuple]]]
+        the holder and account data of each statement
+    first_date : datetime.date
+        first date of the statement period
+    last_date : datetime.date
+        last date of the statement period
+
+    Returns
+    -------
+    int
+        number of statements written
+    """
+    for holder, account_data in chunk:
+        path = os.path.join(directory, statement_filename(holder))
+        with open(path, "w") as output_file:
+            output_file.write(
+                render_statement(holder, account_data, first_date, last_date)
+            )
+    return len(chunk)
+
+
+def write_statements(
+    account_system, directory, first_date, last_date, max_workers=None, chunk_size=64
+):
+    """
+    Write a statement for every holder in an account system
+
+    Each statement is written to its own file in `directory`, named by
+    `statement_filename`. Accounts must not be added to the system while the
+    statements are written
+
+    Parameters
+    ----------
+    account_system : AccountSystem
+        system holding the accounts
+    directory : str
+        directory to write the statements to, which is created if it
+        doesn't exist
+    first_date : datetime.date
+        first date of the statement period
+    last_date : datetime.date
+        last date of the statement period
+    max_workers : int | None, optional
+        number of worker processes, by default None which uses one per
+        processor. Pass 0 to write the statements in this process
+    chunk_size : int, optional
+        number of statements sent to a worker at once, by default 64
+
+    Returns
+    -------
+    int
+        number of statements written
+    """
+    os.makedirs(directory, exist_ok=True)
+    statements = (
+        _statement_data(holder, accounts, first_date, last_date)
+        for holder, accounts in account_system.holders()
+    )
+    chunks = iter(lambda: list(itertools.islice(statements, chunk_size)), [])
+
+    if max_workers == 0:
+        return sum(
+            _write_chunk(directory, chunk, first_date, last_date) for chunk in chunks
+        )
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    written = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+        # keep two chunks per worker in flight, so workers never wait but
+        # unwritten chunks do not pile up in memory
+        in_flight_limit = 2 * max_workers
+        in_flight = set()
+        for chunk in chunks:
+            if len(in_flight) >= in_flight_limit:
+                done, in_flight = concurrent.futures.wait(
+                    in_flight, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                written += sum(future.result() for future in done)
+            in_flight.add(
+                executor.submit(_write_chunk, directory, chunk, first_date, last_date)
+            )
+        for future in concurrent.futures.as_completed(in_flight):
+            written += future.result()
+    return written
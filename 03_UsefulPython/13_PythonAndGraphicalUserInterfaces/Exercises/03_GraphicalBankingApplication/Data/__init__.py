@@ -9,6 +9,16 @@ Account
     Module providing implementations for representing a bank account
 AccountFactory
     Module providing implementations for authorising and constructing accounts
+AccountNumbers
+    Module providing an allocator issuing unique account numbers with a check digit
 AccountSystem
     Module providing implementations for handling collections of accounts making up a system
+InterestEngine
+    Module providing a batch interest run that applies interest to accounts in bulk
+Ledger
+    Module providing an append-only transaction ledger for an account, held in cents
+MaturityIndex
+    Module providing a calendar of long term savings accounts keyed by maturation date
+Statements
+    Module providing a batch run writing a statement file for every account holder
 """
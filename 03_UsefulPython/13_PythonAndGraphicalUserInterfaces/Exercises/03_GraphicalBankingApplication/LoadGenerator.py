@@ -0,0 +1,261 @@
+"""
+Exercise 13.3w Load Generator
+
+Drives the Bank Account Server with many concurrent clients and reports the
+throughput and latency. Only runs if executed as the main program, in which
+case a server is started in a separate process with an empty set of
+accounts
+
+Functions
+---------
+generate_load
+    run concurrent clients against a server and report the results
+"""
+
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+
+import BankAccountServer
+
+
+async def _request(reader, writer, method, path, body=None):
+    """
+    Make a request over a kept-alive connection
+
+    Parameters
+    ----------
+    reader : asyncio.StreamReader
+        stream to read the response from
+    writer : asyncio.StreamWriter
+        stream to write the request to
+    method : str
+        HTTP method of the request
+    path : str
+        path of the request
+    body : dict | None, optional
+        JSON body of the request, by default None
+
+    Returns
+    -------
+    tuple[int, dict]
+        the status and decoded JSON body of the response
+    """
+    content = json.dumps(body).encode("utf-8") if body is not None else b""
+    writer.write(
+        "{0} {1} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {2}\r\n\r\n".format(
+            method, path, len(content)
+        ).encode("latin-1")
+        + content
+    )
+    await writer.drain()
+    head = (await reader.readuntil(b"\r\n\r\n")).decode("latin-1").split("\r\n")
+    length = 0
+    for line in head[1:]:
+        name, _, value = line.partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return int(head[0].split(" ")[1]), json.loads(await reader.readexactly(length))
+
+
+async def _open_accounts(host, port, account_count):
+    """
+    Open savings accounts with some money in them to run the load against
+
+    Parameters
+    ----------
+    host : str
+        address of the server
+    port : int
+        port of the server
+    account_count : int
+        number of accounts to open
+
+    Returns
+    -------
+    list[str]
+        account numbers of the new accounts
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    account_numbers = []
+    for i in range(account_count):
+        _, account = await _request(
+            reader,
+            writer,
+            "POST",
+            "/accounts",
+            {"account_type": "Savings Account", "account_holder": "load {0}".format(i)},
+        )
+        await _request(
+            reader,
+            writer,
+            "POST",
+            "/accounts/{0}/deposit".format(account["account_number"]),
+            {"amount": 1000},
+        )
+        account_numbers.append(account["account_number"])
+    writer.close()
+    return account_numbers
+
+
+async def _run_client(host, port, account_numbers, end_time, latencies, seed):
+    """
+    Make a mix of lookups, deposits, withdrawals and transfers until a time
+
+    Parameters
+    ----------
+    host : str
+        address of the server
+    port : int
+        port of the server
+    account_numbers : list[str]
+        accounts to make requests against
+    end_time : float
+        `time.perf_counter` value to stop at
+    latencies : list[float]
+        list the latency in seconds of each request is added to
+    seed : int
+        seed for the random number generator
+
+    Returns
+    -------
+    int
+        number of requests that failed with a server error
+    """
+    generator = random.Random(seed)
+    reader, writer = await asyncio.open_connection(host, port)
+    errors = 0
+    while time.perf_counter() < end_time:
+        choice = generator.random()
+        account_number = generator.choice(account_numbers)
+        amount = generator.randint(1, 1000) / 100
+        if choice < 0.5:
+            request = ("GET", "/accounts/{0}".format(account_number), None)
+        elif choice < 0.7:
+            path = "/accounts/{0}/deposit".format(account_number)
+            request = ("POST", path, {"amount": amount})
+        elif choice < 0.85:
+            path = "/accounts/{0}/withdraw".format(account_number)
+            request = ("POST", path, {"amount": amount})
+        else:
+            body = {
+                "source": account_number,
+                "destination": generator.choice(account_numbers),
+                "amount": amount,
+            }
+            request = ("POST", "/transfers", body)
+        start = time.perf_counter()
+        status, _ = await _request(reader, writer, *request)
+        latencies.append(time.perf_counter() - start)
+        if status >= 500:
+            errors += 1
+    writer.close()
+    return errors
+
+
+async def generate_load(host, port, client_count, duration, account_count=1000):
+    """
+    Run concurrent clients against a server and report the results
+
+    Parameters
+    ----------
+    host : str
+        address of the server
+    port : int
+        port of the server
+    client_count : int
+        number of concurrent clients, each with its own connection
+    duration : float
+        how long to run the clients for, in seconds
+    account_count : int, optional
+        number of accounts to open for the clients to use, by default 1000
+
+    Returns
+    -------
+    None
+    """
+    account_numbers = await _open_accounts(host, port, account_count)
+    latencies = []
+    start = time.perf_counter()
+    errors = await asyncio.gather(
+        *[
+            _run_client(host, port, account_numbers, start + duration, latencies, i)
+            for i in range(client_count)
+        ]
+    )
+    elapsed = time.perf_counter() - start
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(
+        "{0:>4} clients {1:10,.0f} requests/s  p50 {2:6.2f} ms  "
+        "p99 {3:6.2f} ms  {4} errors".format(
+            client_count,
+            len(latencies) / elapsed,
+            percentiles[49] * 1000,
+            percentiles[98] * 1000,
+            sum(errors),
+        )
+    )
+
+
+def _run_server(filename, port):
+    """
+    Run the server in a child process
+
+    Parameters
+    ----------
+    filename : str
+        path to the file the accounts are saved to
+    port : int
+        port to listen on
+
+    Returns
+    -------
+    None
+    """
+    asyncio.run(BankAccountServer.serve(filename, port=port))
+
+
+async def _wait_for_server(host, port):
+    """
+    Wait until a server accepts connections
+
+    Parameters
+    ----------
+    host : str
+        address of the server
+    port : int
+        port of the server
+
+    Returns
+    -------
+    None
+    """
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.05)
+
+
+if __name__ == "__main__":
+    host = "127.0.0.1"
+    port = 8765
+    with tempfile.TemporaryDirectory() as directory:
+        server = multiprocessing.Process(
+            target=_run_server, args=(os.path.join(directory, "accounts.pkl"), port)
+        )
+        server.start()
+        try:
+            asyncio.run(_wait_for_server(host, port))
+            for client_count in [1, 10, 100]:
+                asyncio.run(generate_load(host, port, client_count, duration=5))
+        finally:
+            server.terminate()
+            server.join()
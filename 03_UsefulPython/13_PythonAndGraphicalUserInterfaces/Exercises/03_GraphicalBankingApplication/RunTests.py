@@ -0,0 +1,747 @@
+"""
+Exercise 13.3n Run Tests
+
+Uses the unittest package to provide tests for the Bank Account Management
+System data classes
+"""
+
+import unittest
+
+import asyncio
+import copy
+import datetime
+import json
+import os
+import pickle
+import random
+import shutil
+import sys
+import tempfile
+import threading
+
+from Data import (
+    Account,
+    AccountFactory,
+    AccountNumbers,
+    AccountSystem,
+    InterestEngine,
+    Ledger,
+    MaturityIndex,
+    Statements,
+)
+from UI.ServiceUI import BankAccountService
+
+
+def make_accounts():
+    savings = Account.SavingsAccount("S1", "Alice", 0.01)
+    savings.deposit(1234.56)
+    empty_savings = Account.SavingsAccount("S2", "Bob", 0.01)
+    long_term = Account.LongTermSavingsAccount("L1", "Alice", 0.0731, 52)
+    long_term.deposit(1000)
+    matured = Account.LongTermSavingsAccount("L2", "Bob", 0.0431, 12)
+    matured.deposit(777.77)
+    matured._LongTermSavingsAccount__start_date = datetime.date(2000, 1, 1)
+    empty_long_term = Account.LongTermSavingsAccount("L3", "Carol", 0.05, 12)
+    credit = Account.CreditAccount("C1", "Alice", 0.1, 5000)
+    credit.withdraw(321.09)
+    return [savings, empty_savings, long_term, matured, empty_long_term, credit]
+
+
+def make_system():
+    system = AccountSystem.AccountSystem()
+    for account in make_accounts():
+        system.add_new_account(account)
+    return system
+
+
+class TestCatchUpInterest(unittest.TestCase):
+    def test_matches_iterative_interest(self):
+        for periods in [0, 1, 2, 13, 120]:
+            for account in make_accounts():
+                expected = copy.deepcopy(account)
+                for _ in range(periods):
+                    expected.apply_interest()
+                account.apply_interest_periods(periods)
+                self.assertEqual(
+                    (type(account.balance), repr(account.balance)),
+                    (type(expected.balance), repr(expected.balance)),
+                    "{0} after {1} months".format(account.account_number, periods),
+                )
+
+    def test_matured_rate_is_quartered(self):
+        accounts = {account.account_number: account for account in make_accounts()}
+        self.assertEqual(accounts["L1"].monthly_interest_rate(), 0.0731)
+        self.assertEqual(accounts["L2"].monthly_interest_rate(), 0.0431 / 4)
+
+    def test_load_applies_missed_months(self):
+        system = make_system()
+        expected = make_system()
+        for _ in range(27):
+            expected.apply_interest()
+        today = datetime.date.today()
+        months = today.year * 12 + today.month - 1 - 27
+        system._AccountSystem__date_last_loaded = datetime.date(
+            months // 12, months % 12 + 1, 15
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "accounts.pkl")
+            system.save(filename)
+            loaded = AccountSystem.AccountSystem.load(filename)
+
+        self.assertEqual(loaded.date_last_loaded, today)
+        for account in make_accounts():
+            self.assertEqual(
+                loaded.get_account(account.account_number).balance,
+                expected.get_account(account.account_number).balance,
+            )
+
+
+class TestInterestEngine(unittest.TestCase):
+    def check_engine(self, use_numpy):
+        for periods in [1, 3, 48]:
+            accounts = make_accounts()
+            expected = copy.deepcopy(accounts)
+            for account in expected:
+                for _ in range(periods):
+                    account.apply_interest()
+            InterestEngine.apply_interest(accounts, periods, use_numpy=use_numpy)
+            for account, expected_account in zip(accounts, expected):
+                self.assertEqual(
+                    repr(float(account.balance)),
+                    repr(float(expected_account.balance)),
+                    "{0} after {1} months".format(account.account_number, periods),
+                )
+
+    def test_list_engine_matches_iterative_interest(self):
+        self.check_engine(use_numpy=False)
+
+    @unittest.skipUnless(InterestEngine.numpy_available, "NumPy is not installed")
+    def test_numpy_engine_matches_iterative_interest(self):
+        self.check_engine(use_numpy=True)
+
+    def test_account_system_batch(self):
+        system = make_system()
+        expected = make_system()
+        system.apply_interest_batch()
+        expected.apply_interest()
+        for account in make_accounts():
+            self.assertEqual(
+                system.get_account(account.account_number).balance,
+                expected.get_account(account.account_number).balance,
+            )
+
+
+class TestLedger(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.filename = os.path.join(directory.name, "accounts.pkl")
+
+    def test_amounts_are_whole_cents(self):
+        account = Account.SavingsAccount("S1", "Alice", 0.01)
+        for _ in range(3):
+            account.deposit(0.1)
+        self.assertEqual(account.balance, 0.3)
+        self.assertEqual(account.ledger.balance, 30)
+        with self.assertRaises(ValueError):
+            account.deposit(10.555)
+        self.assertEqual(len(account.ledger), 3)
+
+    def test_amount_too_large_leaves_ledger_unchanged(self):
+        account = Account.SavingsAccount("S1", "Alice", 0.01)
+        account.deposit(100)
+        for amount in [1e300, float("inf"), 2**62]:
+            with self.assertRaises(ValueError):
+                account.deposit(amount)
+        with self.assertRaises(ValueError):
+            account.ledger.append(2**63 - 1, Ledger.DEPOSIT)
+        self.assertEqual(account.balance, 100)
+        self.assertEqual(len(account.ledger), 1)
+        account.deposit(5)
+        self.assertEqual(
+            [entry[1:] for entry in account.ledger.entries()],
+            [(Ledger.DEPOSIT, 10000, 10000), (Ledger.DEPOSIT, 500, 10500)],
+        )
+
+    def test_interest_rounds_half_to_even(self):
+        account = Account.SavingsAccount("S1", "Alice", 0.005)
+        account.deposit(1)
+        account.apply_interest()
+        self.assertEqual(account.ledger.balance, 100)
+        account.deposit(2)
+        account.apply_interest()
+        self.assertEqual(account.ledger.balance, 302)
+
+    def test_balance_as_of(self):
+        ledger = Ledger.Ledger()
+        ledger.append(1000, Ledger.DEPOSIT, datetime.date(2024, 1, 10))
+        ledger.append(-300, Ledger.WITHDRAWAL, datetime.date(2024, 2, 1))
+        ledger.append(200, Ledger.DEPOSIT, datetime.date(2024, 2, 1))
+        ledger.append(15, Ledger.INTEREST, datetime.date(2024, 3, 1))
+        self.assertEqual(ledger.balance_as_of(datetime.date(2024, 1, 9)), 0)
+        self.assertEqual(ledger.balance_as_of(datetime.date(2024, 1, 31)), 1000)
+        self.assertEqual(ledger.balance_as_of(datetime.date(2024, 2, 1)), 900)
+        self.assertEqual(ledger.balance_as_of(datetime.date(2030, 1, 1)), 915)
+        self.assertEqual(ledger.balance, 915)
+        with self.assertRaises(ValueError):
+            ledger.append(1, Ledger.DEPOSIT, datetime.date(2024, 2, 28))
+
+    def test_ledger_saved_outside_pickle(self):
+        system = make_system()
+        system.save(self.filename)
+        with open(self.filename, "rb") as input_file:
+            unpickled = pickle.load(input_file)
+        self.assertEqual(len(unpickled.get_account("S1").ledger), 1)
+
+        loaded = AccountSystem.AccountSystem.load(self.filename)
+        account = loaded.get_account("C1")
+        self.assertEqual(
+            list(account.ledger.entries()),
+            list(system.get_account("C1").ledger.entries()),
+        )
+        account.withdraw(10)
+        loaded.save(self.filename)
+        reloaded = AccountSystem.AccountSystem.load(self.filename)
+        self.assertEqual(len(reloaded.get_account("C1").ledger), 2)
+        self.assertEqual(reloaded.get_account("C1").balance, -331.09)
+
+    def test_entries_from_incomplete_save_are_ignored(self):
+        system = make_system()
+        system.save(self.filename)
+        system.get_account("S1").deposit(5)
+        Ledger.save_ledgers(
+            AccountSystem.AccountSystem.ledger_filename(self.filename),
+            [system.get_account("S1")],
+        )
+        loaded = AccountSystem.AccountSystem.load(self.filename)
+        self.assertEqual(loaded.get_account("S1").balance, 1234.56)
+        loaded.get_account("S1").deposit(1)
+        loaded.save(self.filename)
+        reloaded = AccountSystem.AccountSystem.load(self.filename)
+        self.assertEqual(reloaded.get_account("S1").balance, 1235.56)
+
+    def test_save_as_writes_whole_ledger(self):
+        system = make_system()
+        system.save(self.filename)
+        loaded = AccountSystem.AccountSystem.load(self.filename)
+        copy_filename = os.path.join(self.directory, "copy.pkl")
+        loaded.save(copy_filename)
+        copied = AccountSystem.AccountSystem.load(copy_filename)
+        self.assertEqual(
+            list(copied.get_account("C1").ledger.entries()),
+            list(system.get_account("C1").ledger.entries()),
+        )
+
+        copied.get_account("S1").deposit(5)
+        other_filename = os.path.join(self.directory, "other.pkl")
+        copied.save(other_filename)
+        other = AccountSystem.AccountSystem.load(other_filename)
+        self.assertEqual(len(other.get_account("S1").ledger), 2)
+        self.assertEqual(other.get_account("S1").balance, 1239.56)
+        self.assertEqual(other.get_account("L2").balance, 777.77)
+
+        os.remove(AccountSystem.AccountSystem.ledger_filename(other_filename))
+        copied.save(other_filename)
+        other = AccountSystem.AccountSystem.load(other_filename)
+        self.assertEqual(other.get_account("S1").balance, 1239.56)
+
+    def test_float_balances_migrate_to_ledger(self):
+        shutil.copy("accounts.pkl", self.filename)
+        with open(self.filename, "rb") as input_file:
+            system = pickle.load(input_file)
+        account = system.get_account("F7L6")
+        self.assertEqual(account.balance, 350)
+        self.assertEqual(account.ledger.balance, 35000)
+
+
+class TestHolderIndex(unittest.TestCase):
+    def test_names_are_normalised(self):
+        system = make_system()
+        system.add_new_account(Account.SavingsAccount("S3", "  Dave  SMITH ", 0.01))
+        accounts = system.find_users_accounts("dave smith")
+        self.assertEqual([account.account_number for account in accounts], ["S3"])
+        self.assertEqual(len(system.find_users_accounts(" ALICE ")), 3)
+
+    def test_prefix_search(self):
+        system = make_system()
+        for number, holder in enumerate(["Alan", "albert", "Bert", "Al Green"]):
+            system.add_new_account(
+                Account.SavingsAccount("X{0}".format(number), holder, 0.01)
+            )
+        self.assertEqual(
+            system.find_holders_with_prefix("AL"),
+            ["al green", "alan", "albert", "alice"],
+        )
+        self.assertEqual(
+            system.find_holders_with_prefix("al", limit=2), ["al green", "alan"]
+        )
+        self.assertEqual(system.find_holders_with_prefix("zed"), [])
+        self.assertEqual(len(system.find_holders_with_prefix("")), 7)
+
+    def test_index_rebuilt_after_pickling(self):
+        system = pickle.loads(pickle.dumps(make_system()))
+        self.assertEqual(system.find_holders_with_prefix("b"), ["bob"])
+        system.add_new_account(Account.SavingsAccount("S3", "Bella", 0.01))
+        self.assertEqual(system.find_holders_with_prefix("b"), ["bella", "bob"])
+
+
+class TestHolderSummary(unittest.TestCase):
+    def test_counts_by_account_type(self):
+        system = make_system()
+        self.assertEqual(
+            system.holder_summary(" alice "),
+            {
+                Account.SavingsAccount.account_type: 1,
+                Account.LongTermSavingsAccount.account_type: 1,
+                Account.CreditAccount.account_type: 1,
+            },
+        )
+        self.assertEqual(system.holder_summary("Nobody"), {})
+        summary = pickle.loads(pickle.dumps(system)).holder_summary("Carol")
+        self.assertEqual(summary, {Account.LongTermSavingsAccount.account_type: 1})
+
+    def test_eligibility_uses_counts(self):
+        system = AccountSystem.AccountSystem()
+        authoriser = AccountFactory.AccountAuthoriser(system)
+        with self.assertRaises(ValueError):
+            authoriser.create_credit_account("Dave", 100)
+        system.add_new_account(authoriser.create_savings_account("Dave"))
+        system.add_new_account(authoriser.create_credit_account("dave", 100))
+        self.assertEqual(
+            system.holder_summary("DAVE"),
+            {
+                Account.SavingsAccount.account_type: 1,
+                Account.CreditAccount.account_type: 1,
+            },
+        )
+        # a long term savings account also makes its holder eligible
+        system = make_system()
+        authoriser = AccountFactory.AccountAuthoriser(system)
+        system.add_new_account(authoriser.create_credit_account("Carol", 100))
+
+
+def account_numbers(accounts):
+    return [account.account_number for account in accounts]
+
+
+class TestMaturityIndex(unittest.TestCase):
+    def test_accounts_maturing_in_range(self):
+        today = datetime.date.today()
+        system = make_system()
+        self.assertEqual(
+            account_numbers(
+                system.accounts_maturing(
+                    datetime.date.min, today + datetime.timedelta(weeks=52)
+                )
+            ),
+            ["L2", "L3", "L1"],
+        )
+        self.assertEqual(
+            account_numbers(
+                system.accounts_maturing(today, today + datetime.timedelta(weeks=12))
+            ),
+            ["L3"],
+        )
+        self.assertEqual(system.accounts_maturing(today, today), [])
+
+    def test_reinvested_accounts_move(self):
+        today = datetime.date.today()
+        next_term = today + datetime.timedelta(weeks=12)
+        system = make_system()
+        self.assertEqual(account_numbers(system.reinvest_matured_accounts()), ["L2"])
+        self.assertEqual(system.get_account("L2").start_date, today)
+        self.assertEqual(
+            sorted(account_numbers(system.accounts_maturing(next_term, next_term))),
+            ["L2", "L3"],
+        )
+        for account_number in ["S1", "C1", "missing"]:
+            with self.assertRaises(KeyError):
+                system.reinvest_account(account_number)
+        with self.assertRaises(ValueError):
+            system.reinvest_account("L1")
+
+        # an account reinvested directly tells the index it has moved
+        index = MaturityIndex.MaturityIndex(
+            account
+            for account in make_accounts()
+            if isinstance(account, Account.LongTermSavingsAccount)
+        )
+        matured = index.matured()
+        self.assertEqual(account_numbers(matured), ["L2"])
+        matured[0].manage_account()
+        self.assertEqual(index.matured(), [])
+        self.assertEqual(len(index), 3)
+        self.assertEqual(
+            sorted(account_numbers(index.accounts_maturing(next_term, next_term))),
+            ["L2", "L3"],
+        )
+
+    def test_direct_reinvestment_found_near_new_date(self):
+        today = datetime.date.today()
+        account = Account.LongTermSavingsAccount("L4", "Dave", 0.05, 12)
+        account._LongTermSavingsAccount__start_date = today - datetime.timedelta(
+            weeks=12
+        )
+        index = MaturityIndex.MaturityIndex([account])
+        account.manage_account()
+        new_date = account.maturation_date
+        self.assertEqual(new_date, today + datetime.timedelta(weeks=12))
+        found = index.accounts_maturing(
+            new_date - datetime.timedelta(days=5),
+            new_date + datetime.timedelta(days=5),
+        )
+        self.assertEqual(found, [account])
+        self.assertEqual(index.matured(), [])
+        self.assertIsNone(pickle.loads(pickle.dumps(account)).receiver)
+
+    def test_engine_uses_index(self):
+        system = make_system()
+        expected = make_system()
+        system.apply_interest_batch(periods=3)
+        for _ in range(3):
+            expected.apply_interest()
+        for account in make_accounts():
+            self.assertEqual(
+                system.get_account(account.account_number).balance,
+                expected.get_account(account.account_number).balance,
+            )
+        loaded = pickle.loads(pickle.dumps(system))
+        self.assertEqual(account_numbers(loaded.reinvest_matured_accounts()), ["L2"])
+
+
+class TestStatements(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def make_statement_system(self):
+        system = AccountSystem.AccountSystem()
+        savings = Account.SavingsAccount("S1", "Alice", 0.01)
+        savings.ledger.append(10000, Ledger.DEPOSIT, datetime.date(2024, 1, 5))
+        savings.ledger.append(-2550, Ledger.WITHDRAWAL, datetime.date(2024, 2, 3))
+        savings.ledger.append(75, Ledger.INTEREST, datetime.date(2024, 3, 1))
+        system.add_new_account(savings)
+        credit = Account.CreditAccount("C1", "Alice", 0.1, 5000)
+        credit.ledger.append(-123456, Ledger.WITHDRAWAL, datetime.date(2024, 1, 9))
+        system.add_new_account(credit)
+        for i in range(200):
+            holder = "holder/{0}".format(i)
+            account = Account.SavingsAccount("X{0}".format(i), holder, 0)
+            account.ledger.append(i + 1, Ledger.DEPOSIT, datetime.date(2024, 2, 1))
+            system.add_new_account(account)
+        return system
+
+    def test_statement_covers_period(self):
+        system = self.make_statement_system()
+        written = Statements.write_statements(
+            system,
+            self.directory,
+            datetime.date(2024, 2, 1),
+            datetime.date(2024, 2, 29),
+            max_workers=0,
+        )
+        self.assertEqual(written, 201)
+        with open(
+            os.path.join(self.directory, Statements.statement_filename("alice"))
+        ) as statement_file:
+            statement = statement_file.read()
+        self.assertEqual(
+            statement.splitlines(),
+            [
+                "Statement for alice",
+                "Period: 2024-02-01 to 2024-02-29",
+                "",
+                "Savings Account S1",
+                "Opening balance: 100.00",
+                "2024-02-03  Withdrawal              -25.50         74.50",
+                "Closing balance: 74.50",
+                "",
+                "Credit Account C1",
+                "Opening balance: -1,234.56",
+                "Closing balance: -1,234.56",
+            ],
+        )
+
+    def test_process_pool_writes_every_holder(self):
+        system = self.make_statement_system()
+        first_date = datetime.date(2024, 2, 1)
+        last_date = datetime.date(2024, 2, 29)
+        written = Statements.write_statements(
+            system, self.directory, first_date, last_date, max_workers=2, chunk_size=7
+        )
+        self.assertEqual(written, 201)
+        self.assertEqual(len(os.listdir(self.directory)), 201)
+        for holder, accounts in system.holders():
+            path = os.path.join(self.directory, Statements.statement_filename(holder))
+            with open(path) as statement_file:
+                self.assertIn(
+                    "Closing balance: {0:,.2f}".format(accounts[-1].balance),
+                    statement_file.read(),
+                )
+
+
+class TestBankAccountService(unittest.TestCase):
+    async def request(self, method, path, body=None):
+        if isinstance(body, bytes):
+            content = body
+        else:
+            content = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.writer.write(
+            "{0} {1} HTTP/1.1\r\nContent-Length: {2}\r\n\r\n".format(
+                method, path, len(content)
+            ).encode("latin-1")
+            + content
+        )
+        head = (await self.reader.readuntil(b"\r\n\r\n")).decode("latin-1")
+        length = int(head.lower().split("content-length:")[1].split("\r\n")[0])
+        body = json.loads(await self.reader.readexactly(length))
+        return int(head.split(" ")[1]), body
+
+    async def run_requests(self, filename):
+        service = BankAccountService.BankAccountService(
+            filename, AccountSystem.AccountSystem, snapshot_interval=60
+        )
+        server = await service.start(port=0)
+        port = server.sockets[0].getsockname()[1]
+        self.reader, self.writer = await asyncio.open_connection("127.0.0.1", port)
+
+        status, savings = await self.request(
+            "POST",
+            "/accounts",
+            {"account_type": "Savings Account", "account_holder": "Alice"},
+        )
+        self.assertEqual(status, 201)
+        number = savings["account_number"]
+        status, credit = await self.request(
+            "POST",
+            "/accounts",
+            {
+                "account_type": "Credit Account",
+                "account_holder": "alice",
+                "withdrawal_limit": 500,
+            },
+        )
+        self.assertEqual(status, 201)
+        status, account = await self.request(
+            "POST", "/accounts/{0}/deposit".format(number), {"amount": 100.25}
+        )
+        self.assertEqual((status, account["balance"]), (200, 100.25))
+        status, _ = await self.request(
+            "POST", "/accounts/{0}/withdraw".format(number), {"amount": 1000}
+        )
+        self.assertEqual(status, 400)
+        status, result = await self.request(
+            "POST",
+            "/transfers",
+            {
+                "source": credit["account_number"],
+                "destination": number,
+                "amount": 50,
+            },
+        )
+        self.assertEqual(status, 200)
+        self.assertEqual(result["destination"]["balance"], 150.25)
+        status, result = await self.request("GET", "/holders/ALICE/accounts")
+        self.assertEqual(
+            [account["balance"] for account in result["accounts"]], [150.25, -50]
+        )
+        status, _ = await self.request("GET", "/accounts/0000")
+        self.assertEqual(status, 404)
+        status, _ = await self.request("POST", "/accounts", {"account_type": "Bond"})
+        self.assertEqual(status, 400)
+        status, _ = await self.request(
+            "POST",
+            "/accounts",
+            {
+                "account_type": "Long Term Savings Account",
+                "account_holder": "Alice",
+                "term_limit": "12",
+            },
+        )
+        self.assertEqual(status, 400)
+        status, _ = await self.request(
+            "POST",
+            "/accounts",
+            {
+                "account_type": "Credit Account",
+                "account_holder": "Alice",
+                "withdrawal_limit": "abc",
+            },
+        )
+        self.assertEqual(status, 400)
+        status, _ = await self.request(
+            "POST", "/accounts/{0}/deposit".format(number), b'{"amount": 1e400}'
+        )
+        self.assertEqual(status, 400)
+        for amount in [1e300, -1e300, 2**63]:
+            status, _ = await self.request(
+                "POST", "/accounts/{0}/deposit".format(number), {"amount": amount}
+            )
+            self.assertEqual(status, 400)
+        status, _ = await self.request(
+            "POST",
+            "/accounts",
+            {
+                "account_type": "Credit Account",
+                "account_holder": "Alice",
+                "withdrawal_limit": 1e300,
+            },
+        )
+        self.assertEqual(status, 400)
+
+        self.writer.close()
+        server.close()
+        await server.wait_closed()
+        await service.stop()
+        self.assertEqual(service.saves, 1)
+        return number
+
+    def test_requests_are_applied_and_saved(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, "accounts.pkl")
+            number = asyncio.run(self.run_requests(filename))
+            loaded = AccountSystem.AccountSystem.load(filename)
+        self.assertEqual(loaded.get_account(number).balance, 150.25)
+
+
+class TestAccountNumbers(unittest.TestCase):
+    def test_check_digit(self):
+        # the standard Luhn example 7992739871 has check digit 3
+        self.assertEqual(AccountNumbers.check_digit("7992739871"), 3)
+        account_number = AccountNumbers.AccountNumberAllocator().allocate()
+        self.assertEqual(account_number, "0000000000000018")
+        self.assertTrue(AccountNumbers.is_valid_account_number(account_number))
+        for position in range(len(account_number)):
+            digit = str((int(account_number[position]) + 1) % 10)
+            mistyped = (
+                account_number[:position] + digit + account_number[position + 1 :]
+            )
+            self.assertFalse(AccountNumbers.is_valid_account_number(mistyped))
+        self.assertFalse(AccountNumbers.is_valid_account_number("F7L6"))
+
+    def test_numbers_unique_across_threads(self):
+        allocator = AccountNumbers.AccountNumberAllocator()
+        results = [[] for _ in range(8)]
+
+        def allocate_numbers(result):
+            for _ in range(5000):
+                result.append(allocator.allocate())
+
+        threads = [
+            threading.Thread(target=allocate_numbers, args=(result,))
+            for result in results
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        numbers = [number for result in results for number in result]
+        self.assertEqual(len(set(numbers)), 40000)
+        self.assertTrue(all(map(AccountNumbers.is_valid_account_number, numbers)))
+
+    def test_numbers_follow_existing_accounts(self):
+        system = make_system()
+        authoriser = AccountFactory.AccountAuthoriser(system)
+        for _ in range(3):
+            system.add_new_account(authoriser.create_savings_account("Alice"))
+        authoriser = AccountFactory.AccountAuthoriser(system)
+        account = authoriser.create_savings_account("Alice")
+        self.assertEqual(account.account_number[:-1], "000000000000004")
+        system.add_new_account(account)
+
+    def test_authorisers_share_numbers(self):
+        system = make_system()
+        first = AccountFactory.AccountAuthoriser(system)
+        second = AccountFactory.AccountAuthoriser(system)
+        for authoriser in [first, second, first, second]:
+            system.add_new_account(authoriser.create_savings_account("Alice"))
+
+        loaded = pickle.loads(pickle.dumps(system))
+        authoriser = AccountFactory.AccountAuthoriser(loaded)
+        account = authoriser.create_savings_account("Alice")
+        self.assertEqual(account.account_number[:-1], "000000000000005")
+        loaded.add_new_account(account)
+
+
+class TestTransfers(unittest.TestCase):
+    def test_failed_transfer_changes_nothing(self):
+        system = make_system()
+        # C1 owes 321.09, so a deposit of 500 is refused
+        with self.assertRaises(ValueError):
+            system.transfer("S1", "C1", 500)
+        self.assertEqual(system.get_account("S1").balance, 1234.56)
+        self.assertEqual(len(system.get_account("S1").ledger), 1)
+        with self.assertRaises(ValueError):
+            system.transfer("S2", "C1", 1)
+        with self.assertRaises(KeyError):
+            system.transfer("S1", "X1", 1)
+        system.transfer("S1", "C1", 321.09)
+        self.assertEqual(system.get_account("S1").balance, 913.47)
+        self.assertEqual(system.get_account("C1").balance, 0)
+
+    def test_manage_account_transfers_balance(self):
+        system = make_system()
+        with self.assertRaises(ValueError):
+            system.get_account("L1").manage_account(system.get_account("S1"))
+        system.get_account("L2").manage_account(system.get_account("S2"))
+        self.assertEqual(system.get_account("L2").balance, 0)
+        self.assertEqual(system.get_account("S2").balance, 777.77)
+
+    def test_concurrent_transfers_conserve_balance(self):
+        self.addCleanup(sys.setswitchinterval, sys.getswitchinterval())
+        sys.setswitchinterval(1e-6)
+        system = AccountSystem.AccountSystem()
+        numbers = []
+        for i in range(10):
+            account = Account.SavingsAccount("S{0}".format(i), "Alice", 0.01)
+            account.deposit(100)
+            system.add_new_account(account)
+            numbers.append(account.account_number)
+        credit = Account.CreditAccount("C1", "Alice", 0.1, 500)
+        system.add_new_account(credit)
+        numbers.append(credit.account_number)
+
+        def run_teller(seed):
+            generator = random.Random(seed)
+            for _ in range(2000):
+                source, destination = generator.sample(numbers, 2)
+                amount = generator.randint(1, 5000) / 100
+                try:
+                    system.transfer(source, destination, amount)
+                except ValueError:
+                    pass
+
+        accounts = [system.get_account(number) for number in numbers]
+        tellers_done = threading.Event()
+        audited_totals = set()
+
+        def run_auditor():
+            # a transfer seen half done would show up as a different total
+            while not tellers_done.is_set():
+                with Account.lock_accounts(*accounts):
+                    audited_totals.add(sum(a.ledger.balance for a in accounts))
+
+        auditor = threading.Thread(target=run_auditor)
+        auditor.start()
+        threads = [threading.Thread(target=run_teller, args=(i,)) for i in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=60)
+            self.assertFalse(thread.is_alive(), "transfers deadlocked")
+        tellers_done.set()
+        auditor.join()
+
+        self.assertEqual(audited_totals, {100000})
+        self.assertEqual(sum(account.ledger.balance for account in accounts), 100000)
+        for account in accounts[:-1]:
+            self.assertGreaterEqual(account.ledger.balance, 0)
+        self.assertGreaterEqual(credit.ledger.balance, -50000)
+        self.assertLessEqual(credit.ledger.balance, 0)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
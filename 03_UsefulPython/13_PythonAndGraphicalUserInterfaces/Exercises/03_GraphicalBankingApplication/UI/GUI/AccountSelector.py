@@ -7,6 +7,8 @@ Classes
 -------
 AccountSelector
     class providing a `tkinter` `Listbox` based widget for selecting an account
+HolderSelector
+    class providing an `Entry` with type-ahead suggestions for selecting an account holder
 AccountTypeSelection
     Provides a widget for selecting a new account type
 """
@@ -97,6 +99,123 @@ class AccountSelector:
             self.listbox.insert(tkinter.END, account.account_number)
 
 
+class HolderSelector:
+    """
+    Widget providing an entry box for an account holder's name, which
+    suggests matching holders as the user types
+
+    Attributes
+    ----------
+    receiver
+        A receiver object that is informed when a suggested holder is
+        chosen. The receiver must support a method, `got_holder(str)`
+    frame : tkinter.Frame
+        The tkinter `Frame` this component is contained in
+    entry : tkinter.Entry
+        entry box for the holder's name
+    suggestions : tkinter.Listbox
+        list box showing the holders matching the entered name
+
+    Class Attributes
+    ----------------
+    suggestion_count : int
+        largest number of holders suggested at once
+    """
+
+    suggestion_count = 5
+
+    def __init__(self, root, receiver, search):
+        """
+        Create a new `HolderSelector`
+
+        Parameters
+        ----------
+        root
+            The parent frame or window to attach this component to
+        receiver
+            Object to send a message to when a suggested holder is chosen.
+            Must support a method `got_holder(str)`
+        search : Callable[[str, int], list[str]]
+            function taking a prefix and a limit and returning the names of
+            matching holders, such as `AccountSystem.find_holders_with_prefix`
+
+        Raises
+        ------
+        AttributeError
+            raised if `receiver` does not support `got_holder`
+        """
+        if not hasattr(receiver, "got_holder"):
+            raise AttributeError("Supplied receiver does not support got_holder(str)")
+        self.receiver = receiver
+        self.frame = tkinter.Frame(root)
+        self.entry = tkinter.Entry(self.frame, width=40)
+        self.entry.grid(sticky=tkinter.E + tkinter.W, row=0, column=0)
+        self.suggestions = tkinter.Listbox(
+            self.frame, height=HolderSelector.suggestion_count
+        )
+        self.suggestions.grid(sticky=tkinter.E + tkinter.W, row=1, column=0)
+
+        def on_key(event):
+            """
+            Show the holders matching the text in the entry box
+
+            Bound to the `KeyRelease` event of the entry box
+
+            Parameters
+            ----------
+            event
+                event that triggered the function
+
+            Returns
+            -------
+            None
+            """
+            self.suggestions.delete(0, tkinter.END)
+            prefix = self.entry.get()
+            if not prefix.strip():
+                return
+            for holder in search(prefix, HolderSelector.suggestion_count):
+                self.suggestions.insert(tkinter.END, holder)
+
+        def on_select(event):
+            """
+            Copy the chosen holder into the entry box and send it to the
+            receiving object
+
+            Bound to the `ListboxSelect` event of the suggestions
+
+            Parameters
+            ----------
+            event
+                event that triggered the function
+
+            Returns
+            -------
+            None
+            """
+            selection = self.suggestions.curselection()
+            if not selection:
+                return
+            holder = self.suggestions.get(selection[0])
+            self.entry.delete(0, tkinter.END)
+            self.entry.insert(0, holder)
+            receiver.got_holder(holder)
+
+        self.entry.bind("<KeyRelease>", on_key)
+        self.suggestions.bind("<<ListboxSelect>>", on_select)
+
+    def get(self):
+        """
+        Get the text in the entry box
+
+        Returns
+        -------
+        str
+            the entered name
+        """
+        return self.entry.get()
+
+
 class AccountTypeSelection:
     """
     Class for selecting an account type
@@ -68,6 +68,12 @@ class AccountView(abc.ABC):
             sticky=tkinter.E, row=3, column=0, padx=5, pady=5
         )
 
+        # placed below the rows used by the subclass views
+        self._holder_summary_label = tkinter.Label(self.frame, text="Holder has:")
+        self._holder_summary_label.grid(
+            sticky=tkinter.E, row=10, column=0, padx=5, pady=5
+        )
+
     @abc.abstractmethod
     def clear_view(self):
         """
@@ -81,6 +87,7 @@ class AccountView(abc.ABC):
         self._account_number_label.config(text="Account number:")
         self._balance_label.config(text="Balance:")
         self._interest_rate_label.config(text="Interest rate:")
+        self._holder_summary_label.config(text="Holder has:")
 
     @abc.abstractmethod
     def load_into_view(self, account):
@@ -102,6 +109,26 @@ class AccountView(abc.ABC):
             text="Interest rate: {0:.4f}".format(account.interest_rate)
         )
 
+    def load_holder_summary(self, summary):
+        """
+        Show the number of accounts of each type the account holder has
+
+        Parameters
+        ----------
+        summary : dict[str, int]
+            dictionary mapping account type strings to the number of
+            accounts of that type, as returned by `AccountSystem.holder_summary`
+
+        Returns
+        -------
+        None
+        """
+        counts = ", ".join(
+            "{0} {1}".format(count, account_type)
+            for account_type, count in sorted(summary.items())
+        )
+        self._holder_summary_label.config(text="Holder has: {0}".format(counts))
+
 
 class SavingsAccountView(AccountView):
     """
@@ -154,9 +154,11 @@ class BankAccountApplication:
         # populate the initial list of accounts
         self._filter_user_accounts()
 
-        # add the entry box for the username
-        self._username_entry = tkinter.Entry(self._root, width=40)
-        self._username_entry.grid(
+        # add the entry box for the username, suggesting holders as the user types
+        self._holder_selector = AccountSelector.HolderSelector(
+            self._root, self, self.__account_system.find_holders_with_prefix
+        )
+        self._holder_selector.frame.grid(
             sticky=tkinter.E + tkinter.W, row=1, column=1, padx=5, pady=5
         )
 
@@ -174,11 +176,7 @@ class BankAccountApplication:
             -------
             None
             """
-            self._username = self._username_entry.get()
-            self._filter_user_accounts()
-
-            self._selected_account = None
-            self._view.clear_view()
+            self.got_holder(self._holder_selector.get())
 
         user_button = tkinter.Button(
             self._root, text="Select Account Holder:", command=update_username
@@ -308,6 +306,28 @@ class BankAccountApplication:
             self.__account_system.find_users_accounts(self._username)
         )
 
+    def got_holder(self, holder):
+        """
+        Handles the account holder changing
+
+        Sets the list of viewable accounts to the holder's accounts and
+        clears the currently selected account and view
+
+        Parameters
+        ----------
+        holder : str
+            name of the new account holder
+
+        Returns
+        -------
+        None
+        """
+        self._username = holder
+        self._filter_user_accounts()
+
+        self._selected_account = None
+        self._view.clear_view()
+
     def got_selection(self, selection):
         """
         Handles the selection in the account list changing
@@ -359,6 +379,9 @@ class BankAccountApplication:
         )
         # ensure that all subcomponents have the correct selected account
         self._view.load_into_view(self._selected_account)
+        self._view.load_holder_summary(
+            self.__account_system.holder_summary(self._selected_account.account_holder)
+        )
         self._balance_editor.account = self._selected_account
 
     def balance_changed(self):
@@ -372,6 +395,9 @@ class BankAccountApplication:
         None
         """
         self._view.load_into_view(self._selected_account)
+        self._view.load_holder_summary(
+            self.__account_system.holder_summary(self._selected_account.account_holder)
+        )
 
     def account_created(self, account):
         """
@@ -98,7 +98,7 @@ class ManageLongTermAccountView:
             -------
             None
             """
-            self.__account.manage_account()
+            self.__account_system.reinvest_account(self.__account.account_number)
             tkinter.messagebox.showinfo(message="Reinvested account")
             dismiss()
 
@@ -0,0 +1,520 @@
+"""
+Exercise 13.3u Bank Account Service
+
+Provides a headless JSON over HTTP service for a Bank Account Management
+System, built on asyncio
+
+Requests are served by a single event loop. Lookups read the account system
+directly, while changes are put on a queue and applied one at a time by a
+single writer task, which also saves the system when changes are waiting
+and the snapshot interval has passed
+
+Classes
+-------
+BankAccountService
+    asyncio HTTP service exposing an account system as a JSON API
+
+Functions
+---------
+account_to_json
+    convert an account to a JSON compatible dictionary
+
+Notes
+-----
+The service supports the following requests. Request and response bodies
+are JSON objects, and amounts are in dollars
+
+GET /accounts/<account_number>
+    look up an account
+GET /holders/<account_holder>/accounts
+    look up the accounts of an account holder
+POST /accounts
+    open an account. The body holds the `account_type` and
+    `account_holder`, plus the `term_limit` in weeks of a long term savings
+    account or the `withdrawal_limit` of a credit account
+POST /accounts/<account_number>/deposit
+    deposit the `amount` in the body
+POST /accounts/<account_number>/withdraw
+    withdraw the `amount` in the body
+POST /transfers
+    move the `amount` in the body from the `source` account number to the
+    `destination` account number
+"""
+
+import asyncio
+import http
+import json
+import math
+import time
+import urllib.parse
+
+from Data import Account, AccountFactory, Ledger
+
+
+def account_to_json(account):
+    """
+    Convert an account to a JSON compatible dictionary
+
+    Parameters
+    ----------
+    account : Account
+        account to convert
+
+    Returns
+    -------
+    dict[str, str | int | float]
+        the account number, type, holder, balance and interest rate of the
+        account
+    """
+    return {
+        "account_number": account.account_number,
+        "account_type": account.account_type,
+        "account_holder": account.account_holder,
+        "balance": account.balance,
+        "interest_rate": account.interest_rate,
+    }
+
+
+class _RequestError(Exception):
+    """
+    Raised while handling a request to send an error response
+
+    Attributes
+    ----------
+    status : http.HTTPStatus
+        status of the error response
+    """
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _read_number(body, name):
+    """
+    Read a number from the body of a request
+
+    Parameters
+    ----------
+    body : dict
+        decoded body of the request
+    name : str
+        name of the number in the body
+
+    Returns
+    -------
+    int | float
+        the number
+
+    Raises
+    ------
+    ValueError
+        raised if the body has no finite number with the name, or the number
+        is too large for a ledger to hold
+    """
+    value = body.get(name)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError("Request must give a numeric {0}".format(name))
+    # JSON numbers too large for a float are read as infinity
+    if isinstance(value, float) and not math.isfinite(value):
+        raise ValueError("Request must give a finite {0}".format(name))
+    if abs(value) > Ledger.MAX_AMOUNT:
+        raise ValueError("Request {0} is too large".format(name))
+    return value
+
+
+def _read_amount(body):
+    """
+    Read the amount from the body of a request
+
+    Parameters
+    ----------
+    body : dict
+        decoded body of the request
+
+    Returns
+    -------
+    int | float
+        the amount in dollars
+
+    Raises
+    ------
+    ValueError
+        raised if the body has no finite numeric amount a ledger can hold
+    """
+    return _read_number(body, "amount")
+
+
+class BankAccountService:
+    """
+    asyncio HTTP service exposing an account system as a JSON API
+
+    Attributes
+    ----------
+    snapshot_interval : float
+        shortest time in seconds between saves of the account system
+    saves : int
+        number of times the account system has been saved
+
+    Class Attributes
+    ----------------
+    max_body_size : int
+        largest request body accepted, in bytes
+    """
+
+    max_body_size = 65536
+
+    def __init__(self, filename, storage_class, snapshot_interval=1.0):
+        """
+        Create a new `BankAccountService`
+
+        Parameters
+        ----------
+        filename : str
+            path to the file the account system is loaded from and saved to
+        storage_class
+            class that supports the Account System Data Management API
+        snapshot_interval : float, optional
+            shortest time in seconds between saves of the account system, by
+            default 1.0
+        """
+        self.__filename = filename
+        try:
+            self.__account_system = storage_class.load(filename)
+        except:  # noqa: E722
+            self.__account_system = storage_class()
+        self.__authoriser = AccountFactory.AccountAuthoriser(self.__account_system)
+        self.snapshot_interval = snapshot_interval
+        self.saves = 0
+        self.__queue = None
+        self.__writer = None
+
+        self.__routes = {
+            ("GET", "accounts"): self.__get_account,
+            ("GET", "holders"): self.__get_holder_accounts,
+            ("POST", "accounts"): self.__post_account,
+            ("POST", "transfers"): self.__post_transfer,
+        }
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """
+        Start the writer task and begin serving requests
+
+        Parameters
+        ----------
+        host : str, optional
+            address to listen on, by default "127.0.0.1"
+        port : int, optional
+            port to listen on, by default 8080. Pass 0 to pick a free port
+
+        Returns
+        -------
+        asyncio.Server
+            the running server
+        """
+        self.__queue = asyncio.Queue()
+        self.__writer = asyncio.create_task(self.__run_writer())
+        return await asyncio.start_server(self.__handle_connection, host, port)
+
+    async def stop(self):
+        """
+        Stop the writer task once every queued change has been applied, and
+        save any unsaved changes
+
+        Returns
+        -------
+        None
+        """
+        await self.__queue.put(None)
+        await self.__writer
+
+    async def __run_writer(self):
+        """
+        Apply queued changes to the account system one at a time
+
+        The account system is saved when changes have been applied and the
+        snapshot interval has passed since the last save, so many changes are
+        saved together. The system is saved in a worker thread, and no
+        changes are applied until the save finishes
+
+        Returns
+        -------
+        None
+        """
+        loop = asyncio.get_running_loop()
+        queue = self.__queue
+        last_save = time.monotonic()
+        unsaved = False
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                if unsaved:
+                    # wait no longer than the time left until the next save
+                    timeout = last_save + self.snapshot_interval - time.monotonic()
+                    try:
+                        item = await asyncio.wait_for(queue.get(), max(timeout, 0))
+                    except asyncio.TimeoutError:
+                        item = ()
+                else:
+                    item = await queue.get()
+            if item is None:
+                break
+            if item:
+                change, future = item
+                try:
+                    future.set_result(change())
+                except Exception as e:
+                    future.set_exception(e)
+                unsaved = True
+            if unsaved and time.monotonic() - last_save >= self.snapshot_interval:
+                await loop.run_in_executor(None, self.__save)
+                last_save = time.monotonic()
+                unsaved = False
+        if unsaved:
+            await loop.run_in_executor(None, self.__save)
+
+    def __save(self):
+        """
+        Save the account system
+
+        Returns
+        -------
+        None
+        """
+        self.__account_system.save(self.__filename)
+        self.saves += 1
+
+    async def __apply(self, change):
+        """
+        Queue a change for the writer task and wait for its result
+
+        Parameters
+        ----------
+        change : Callable[[], Any]
+            function making the change
+
+        Returns
+        -------
+        Any
+            the value returned by `change`
+        """
+        future = asyncio.get_running_loop().create_future()
+        await self.__queue.put((change, future))
+        return await future
+
+    async def __handle_connection(self, reader, writer):
+        """
+        Serve the requests made over a connection
+
+        Connections are kept open between requests unless the client asks
+        for them to be closed
+
+        Parameters
+        ----------
+        reader : asyncio.StreamReader
+            stream to read requests from
+        writer : asyncio.StreamWriter
+            stream to write responses to
+
+        Returns
+        -------
+        None
+        """
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+                    break
+                lines = head.decode("latin-1").split("\r\n")
+                try:
+                    method, target, version = lines[0].split(" ")
+                except ValueError:
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if not 0 <= length <= BankAccountService.max_body_size:
+                        raise ValueError("Bad request body length")
+                except ValueError:
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, payload = await self.__respond(method, target, body)
+                keep_alive = headers.get("connection", "").lower() != "close" and (
+                    version == "HTTP/1.1"
+                )
+                content = json.dumps(payload).encode("utf-8")
+                writer.write(
+                    (
+                        "HTTP/1.1 {0} {1}\r\n"
+                        "Content-Type: application/json\r\n"
+                        "Content-Length: {2}\r\n"
+                        "Connection: {3}\r\n\r\n"
+                    )
+                    .format(
+                        status.value,
+                        status.phrase,
+                        len(content),
+                        "keep-alive" if keep_alive else "close",
+                    )
+                    .encode("latin-1")
+                    + content
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def __respond(self, method, target, body):
+        """
+        Work out the response to a request
+
+        Parameters
+        ----------
+        method : str
+            HTTP method of the request
+        target : str
+            path of the request
+        body : bytes
+            body of the request
+
+        Returns
+        -------
+        tuple[http.HTTPStatus, dict]
+            status and JSON body of the response
+        """
+        path = urllib.parse.urlsplit(target).path
+        parts = [urllib.parse.unquote(part) for part in path.split("/") if part]
+        try:
+            if method == "POST":
+                try:
+                    decoded = json.loads(body) if body else {}
+                except ValueError:
+                    raise _RequestError(http.HTTPStatus.BAD_REQUEST, "Invalid JSON")
+                if not isinstance(decoded, dict):
+                    raise _RequestError(
+                        http.HTTPStatus.BAD_REQUEST, "Body must be a JSON object"
+                    )
+            else:
+                decoded = None
+            if not parts or (method, parts[0]) not in self.__routes:
+                raise _RequestError(http.HTTPStatus.NOT_FOUND, "Unknown resource")
+            return await self.__routes[(method, parts[0])](parts[1:], decoded)
+        except _RequestError as e:
+            return e.status, {"error": str(e)}
+        except KeyError as e:
+            return http.HTTPStatus.NOT_FOUND, {"error": str(e.args[0])}
+        except ValueError as e:
+            return http.HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception:
+            # keep the connection and the service running after a fault
+            return http.HTTPStatus.INTERNAL_SERVER_ERROR, {"error": "Internal error"}
+
+    def __find_account(self, account_number):
+        """
+        Find an account by its account number
+
+        Parameters
+        ----------
+        account_number : str
+            account number to look up
+
+        Returns
+        -------
+        Account
+            the account
+
+        Raises
+        ------
+        KeyError
+            raised if there is no such account
+        """
+        account = self.__account_system.get_account(account_number)
+        if account is None:
+            raise KeyError("No account {0}".format(account_number))
+        return account
+
+    async def __get_account(self, parts, body):
+        if len(parts) != 1:
+            raise _RequestError(http.HTTPStatus.NOT_FOUND, "Unknown resource")
+        return http.HTTPStatus.OK, account_to_json(self.__find_account(parts[0]))
+
+    async def __get_holder_accounts(self, parts, body):
+        if len(parts) != 2 or parts[1] != "accounts":
+            raise _RequestError(http.HTTPStatus.NOT_FOUND, "Unknown resource")
+        accounts = self.__account_system.find_users_accounts(parts[0])
+        return http.HTTPStatus.OK, {"accounts": list(map(account_to_json, accounts))}
+
+    async def __post_account(self, parts, body):
+        if not parts:
+            return await self.__open_account(body)
+        if len(parts) != 2 or parts[1] not in ("deposit", "withdraw"):
+            raise _RequestError(http.HTTPStatus.NOT_FOUND, "Unknown resource")
+        account = self.__find_account(parts[0])
+        amount = _read_amount(body)
+        if parts[1] == "deposit":
+            await self.__apply(lambda: account.deposit(amount))
+        else:
+            await self.__apply(lambda: account.withdraw(amount))
+        return http.HTTPStatus.OK, account_to_json(account)
+
+    async def __open_account(self, body):
+        """
+        Open an account described by the body of a request
+
+        Parameters
+        ----------
+        body : dict
+            decoded body of the request
+
+        Returns
+        -------
+        tuple[http.HTTPStatus, dict]
+            status and JSON body of the response
+        """
+        account_type = body.get("account_type")
+        holder = body.get("account_holder")
+        if account_type not in self.__authoriser.factory_map:
+            raise ValueError("Unknown account type")
+        if not isinstance(holder, str) or not holder.strip():
+            raise ValueError("Request must give an account holder")
+        factory = self.__authoriser.factory_map[account_type]
+        if account_type == Account.LongTermSavingsAccount.account_type:
+            arguments = (holder, _read_number(body, "term_limit"))
+        elif account_type == Account.CreditAccount.account_type:
+            arguments = (holder, _read_number(body, "withdrawal_limit"))
+        else:
+            arguments = (holder,)
+
+        def open_account():
+            account = factory(*arguments)
+            self.__account_system.add_new_account(account)
+            return account
+
+        account = await self.__apply(open_account)
+        return http.HTTPStatus.CREATED, account_to_json(account)
+
+    async def __post_transfer(self, parts, body):
+        if parts:
+            raise _RequestError(http.HTTPStatus.NOT_FOUND, "Unknown resource")
+        source = self.__find_account(str(body.get("source")))
+        destination = self.__find_account(str(body.get("destination")))
+        amount = _read_amount(body)
+        await self.__apply(
+            lambda: self.__account_system.transfer(
+                source.account_number, destination.account_number, amount
+            )
+        )
+        return http.HTTPStatus.OK, {
+            "source": account_to_json(source),
+            "destination": account_to_json(destination),
+        }
@@ -0,0 +1,11 @@
+"""
+ServiceUI
+
+This package contains modules for serving a bank account management system
+to other programs over HTTP
+
+Modules
+-------
+BankAccountService
+    Contains classes for a JSON over HTTP banking service
+"""
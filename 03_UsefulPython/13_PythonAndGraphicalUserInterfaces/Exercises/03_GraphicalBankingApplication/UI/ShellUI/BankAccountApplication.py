@@ -327,7 +327,7 @@ Enter account type: """
             "Reinvest this account? (1 - yes, 0 - no): ", 0, 1
         )
         if reinvest:
-            account.manage_account()
+            self.__accounts.reinvest_account(account.account_number)
             return
 
         holder = account.account_holder
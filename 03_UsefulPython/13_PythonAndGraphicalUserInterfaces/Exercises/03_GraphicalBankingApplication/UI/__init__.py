@@ -9,4 +9,6 @@ ShellUI
     Module providing implementations for a shell-based UI
 GUI
     Module providing implementations for a graphical user interface
+ServiceUI
+    Module providing implementations for a headless JSON over HTTP service
 """
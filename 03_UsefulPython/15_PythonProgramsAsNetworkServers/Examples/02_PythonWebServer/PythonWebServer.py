@@ -2,12 +2,21 @@
 Example 15.2 Python Web Server
 
 A small python web server implementation using the html library
+
+The handler is built on the chapter's `KeepAliveHandler`, so browsers can
+keep their connection open between requests and receive compressed pages
 """
 
 import http.server
+import os
+import sys
+
+# the shared handler is kept in the chapter folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from KeepAliveHandler import KeepAliveHandler  # noqa: E402
 
 
-class WebServerHandler(http.server.BaseHTTPRequestHandler):
+class WebServerHandler(KeepAliveHandler):
     """
     A basic example Web Server Handler to accept and serve requests
     """
@@ -19,10 +28,6 @@ class WebServerHandler(http.server.BaseHTTPRequestHandler):
         This method is called when the server receives a GET request from
         the client. It sends back a fixed message back to the client
         """
-        self.send_response(200)
-        self.send_header("Content-type", "text/html")
-        self.end_headers()
-
         message_text = """<html>
 <body>
 <p>hello from the Python server</p>
@@ -31,7 +36,7 @@ class WebServerHandler(http.server.BaseHTTPRequestHandler):
 """
 
         message_bytes = message_text.encode()
-        self.wfile.write(message_bytes)
+        self.send_body(message_bytes)
         return
 
 
@@ -39,6 +44,6 @@ host_socket = 8080
 host_ip = "localhost"
 host_address = (host_ip, host_socket)
 
-my_server = http.server.HTTPServer(host_address, WebServerHandler)
+my_server = http.server.ThreadingHTTPServer(host_address, WebServerHandler)
 print("Starting server of http://{0}:{1}".format(host_ip, host_socket))
 my_server.serve_forever()
@@ -2,12 +2,21 @@
 Example 15.3 Python File Server
 
 A python web server that returns a file
+
+The handler is built on the chapter's `KeepAliveHandler`, so browsers can
+keep their connection open between requests and receive compressed pages
 """
 
 import http.server
+import os
+import sys
+
+# the shared handler is kept in the chapter folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from KeepAliveHandler import KeepAliveHandler  # noqa: E402
 
 
-class WebServerHandler(http.server.BaseHTTPRequestHandler):
+class WebServerHandler(KeepAliveHandler):
     """
     A simple web handler that can serve pages in response to a `GET` request
     """
@@ -20,16 +29,16 @@ class WebServerHandler(http.server.BaseHTTPRequestHandler):
         request from the client. It opens a file with the requested
         path and sends back the contents
         """
-        self.send_response(200)
-        self.send_header("Content-type", "text/html")
-        self.end_headers()
-
         file_path = self.path[1:]
-        with open(file_path, "r") as input_file:
-            message_text = input_file.read()
+        try:
+            with open(file_path, "r") as input_file:
+                message_text = input_file.read()
+        except OSError:
+            self.send_error(404, "File not found")
+            return
 
         message_bytes = message_text.encode()
-        self.wfile.write(message_bytes)
+        self.send_body(message_bytes)
 
         return
 
@@ -39,6 +48,6 @@ host_ip = "localhost"
 
 host_address = (host_ip, host_socket)
 
-my_server = http.server.HTTPServer(host_address, WebServerHandler)
+my_server = http.server.ThreadingHTTPServer(host_address, WebServerHandler)
 print("Starting server on http://{0}:{1}".format(host_ip, host_socket))
 my_server.serve_forever()
@@ -0,0 +1,241 @@
+"""
+Exercise 15.1 Load Test
+
+Measures the persistent message board under load. The board is started in a
+temporary directory, in both its single-threaded and threaded modes, and
+driven by 1, 10 and 100 concurrent clients, each repeatedly reading the
+board and sometimes posting a message. The requests per second and the
+p50/p99 latencies are reported for each run, along with a run in which one
+client stalls part way through sending its request
+"""
+
+import http.client
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+board_script = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "MessageBoard.py"
+)
+host_ip = "localhost"
+host_socket = 8092
+# seconds to wait for the board to accept connections
+start_timeout = 10
+
+
+def start_board(directory, single_threaded):
+    """
+    Start the message board in a separate process
+
+    Parameters
+    ----------
+    directory : str
+        directory the board keeps its messages in
+    single_threaded : bool
+        `True` to serve one request at a time, else `False`
+
+    Returns
+    -------
+    subprocess.Popen
+        the running board
+
+    Raises
+    ------
+    RuntimeError
+        raised if another process is already listening on the port, or the
+        board exits or does not accept connections within `start_timeout`
+        seconds
+    """
+    try:
+        socket.create_connection((host_ip, host_socket), timeout=1).close()
+    except OSError:
+        pass
+    else:
+        raise RuntimeError(
+            "Port {0} is already in use, so the board cannot be tested".format(
+                host_socket
+            )
+        )
+    arguments = [sys.executable, board_script, "--port", str(host_socket)]
+    if single_threaded:
+        arguments.append("--single-threaded")
+    board = subprocess.Popen(
+        arguments, cwd=directory, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + start_timeout
+    while True:
+        try:
+            socket.create_connection((host_ip, host_socket), timeout=1).close()
+            return board
+        except OSError:
+            pass
+        if board.poll() is not None:
+            raise RuntimeError(
+                "Message board exited with code {0} while starting".format(
+                    board.returncode
+                )
+            )
+        if time.monotonic() > deadline:
+            board.terminate()
+            board.wait()
+            raise RuntimeError(
+                "Message board did not start within {0} seconds".format(start_timeout)
+            )
+        time.sleep(0.05)
+
+
+def make_request(post_message=None):
+    """
+    Read the board, or post a message to it
+
+    Parameters
+    ----------
+    post_message : str | None, optional
+        message to post, by default None which reads the board
+
+    Returns
+    -------
+    None
+    """
+    connection = http.client.HTTPConnection(host_ip, host_socket, timeout=5)
+    try:
+        if post_message is None:
+            connection.request("GET", "/")
+        else:
+            body = urllib.parse.urlencode({"message": post_message})
+            connection.request(
+                "POST",
+                "/",
+                body,
+                {"Content-Type": "application/x-www-form-urlencoded"},
+            )
+        connection.getresponse().read()
+    finally:
+        connection.close()
+
+
+def run_client(client_number, end_time, latencies, errors):
+    """
+    Make requests until a time, posting one message in every ten requests
+
+    Parameters
+    ----------
+    client_number : int
+        number identifying the client
+    end_time : float
+        `time.perf_counter` value to stop at
+    latencies : list[float]
+        list the latency in seconds of each request is added to
+    errors : list[Exception]
+        list each failed request's exception is added to
+
+    Returns
+    -------
+    None
+    """
+    count = 0
+    while time.perf_counter() < end_time:
+        post_message = None
+        if count % 10 == 9:
+            post_message = "Message {0} from client {1}".format(count, client_number)
+        start = time.perf_counter()
+        try:
+            make_request(post_message)
+            latencies.append(time.perf_counter() - start)
+        except OSError as e:
+            errors.append(e)
+        count += 1
+
+
+def stall_client(end_time):
+    """
+    Open a connection and send only part of a request until a time
+
+    Parameters
+    ----------
+    end_time : float
+        `time.perf_counter` value to stop at
+
+    Returns
+    -------
+    None
+    """
+    with socket.create_connection((host_ip, host_socket)) as stalled:
+        stalled.sendall(b"GET / HTTP/1.1\r\n")
+        time.sleep(max(end_time - time.perf_counter(), 0))
+
+
+def measure(client_count, duration, stalled=False):
+    """
+    Run concurrent clients against the board and report the results
+
+    Parameters
+    ----------
+    client_count : int
+        number of concurrent clients
+    duration : float
+        how long to run the clients for, in seconds
+    stalled : bool, optional
+        `True` to also run a client that stalls part way through a request,
+        by default False
+
+    Returns
+    -------
+    None
+    """
+    latencies = []
+    errors = []
+    start = time.perf_counter()
+    end_time = start + duration
+    threads = [
+        threading.Thread(target=run_client, args=(i, end_time, latencies, errors))
+        for i in range(client_count)
+    ]
+    if stalled:
+        threads.append(threading.Thread(target=stall_client, args=(end_time,)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    label = "{0} clients{1}".format(client_count, " + stalled" if stalled else "")
+    if len(latencies) < 2:
+        print(
+            "  {0:<22} {1:>6} requests  {2} errors".format(
+                label, len(latencies), len(errors)
+            )
+        )
+        return
+    percentiles = statistics.quantiles(latencies, n=100)
+    print(
+        "  {0:<22} {1:8,.0f} requests/s  p50 {2:7.2f} ms  p99 {3:7.2f} ms"
+        "  {4} errors".format(
+            label,
+            len(latencies) / elapsed,
+            percentiles[49] * 1000,
+            percentiles[98] * 1000,
+            len(errors),
+        )
+    )
+
+
+if __name__ == "__main__":
+    duration = 3
+    for single_threaded in [True, False]:
+        print("Single-threaded server" if single_threaded else "Threaded server")
+        with tempfile.TemporaryDirectory() as directory:
+            board = start_board(directory, single_threaded)
+            try:
+                for client_count in [1, 10, 100]:
+                    measure(client_count, duration)
+                measure(10, duration, stalled=True)
+            finally:
+                board.terminate()
+                board.wait()
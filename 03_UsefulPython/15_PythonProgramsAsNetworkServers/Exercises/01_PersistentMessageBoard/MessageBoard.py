@@ -3,82 +3,120 @@ Exercise 15.1 Persistent Message Board
 
 Improves on the Message board example by persisting messages between sessions
 and adding a date-time to a message
+
+Requests are served on a thread each by default, so a slow client does not
+hold up the others. The page cache and the message log are guarded by
+`messages_lock`
+
+Messages are saved to an append-only log, so posting a message writes one
+record however many messages are on the board. A board saved by an earlier
+version as a pickle is copied into the log the first time it is loaded
+
+The board is shown a page of messages at a time, newest page first, with
+links to older pages. A page is chosen by a `?before=` cursor, which gives
+the number of the first message after the page, so a page does not change
+as new messages are posted. `?all` shows every message, streamed to the
+browser a chunk at a time rather than built into one page first
+
+Pages are made by a `PageCache`, which holds the encoded HTML of each
+message and only rebuilds the newest page after the messages change. Pages
+are sent with an ETag and Last-Modified time, so browsers can check whether
+their copy is current and receive a 304 Not Modified response if it is
+
+Classes
+-------
+PageCache
+    cache of the encoded message board pages
+WebServerHandler
+    web handler for a message board
 """
 
+import argparse
 import datetime
+import email.utils
 import http.server
+import os
 import pickle
+import sys
+import threading
+import time
 import urllib
 import urllib.parse
 
-datafile = "messages.pkl"
+from MessageLog import MessageLog
 
+# the shared handler is kept in the chapter folder
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".."))
+from KeepAliveHandler import KeepAliveHandler  # noqa: E402
 
-def load_messages(file):
+datafile = "messages.log"
+legacy_datafile = "messages.pkl"
+
+
+def load_messages(log, legacy_file=None):
     """
-    Load the messages database from a file
+    Load the messages by replaying the message log
 
     Parameters
     ----------
-    file : str
-        path to a file storing the messages database
+    log : MessageLog
+        log storing the messages
+    legacy_file : str | None, optional
+        path to a pickled messages database to copy into the log, by default
+        None. Should only be given when the log has just been created
 
     Returns
     -------
     list[(message, time)]
         A list of time-stamped messages
     """
-    try:
-        with open(file, "rb") as f:
-            messages = pickle.load(f)
-    except:  # noqa: E722
-        print("Datafile missing, creating new log")
-        messages = []
+    if legacy_file is not None and os.path.exists(legacy_file):
+        try:
+            with open(legacy_file, "rb") as f:
+                for message, posted in pickle.load(f):
+                    log.append(message, posted)
+            log.sync()
+        except:  # noqa: E722
+            print("Legacy datafile unreadable, starting from the log")
+    messages = log.tail()
+    if not messages:
+        print("No messages found, starting a new board")
     return messages
 
 
-def save_messages(file):
+class PageCache:
     """
-    Save the messages into the database
+    Cache of the encoded message board pages
 
-    Parameters
+    The HTML for each message is encoded once, when the message is added,
+    and kept in a list indexed by message number. A page of messages is
+    joined from a slice of the list, so making a page takes time in
+    proportion to the messages on it rather than on the board. The newest
+    page is kept until the messages change. Not safe to use from several
+    threads, so callers must hold `messages_lock`
+
+    Attributes
     ----------
-    file : path
-        path to the file
+    etag : str
+        entity tag identifying the current version of the pages
+    last_modified : float
+        time the messages last changed, in seconds since the epoch
 
-    Returns
-    -------
-    None
+    Class Attributes
+    ----------------
+    template : str
+        HTML of the page, with `{0}` where the messages go and `{1}` where
+        the links to other pages go
+    page_size : int
+        number of messages on a page
     """
-    with open(file, "wb") as f:
-        pickle.dump(messages, f)
-
 
-messages = load_messages(datafile)
-
-
-class WebServerHandler(http.server.BaseHTTPRequestHandler):
-    """
-    Web handler for a message board
-    """
-
-    def make_page(self):
-        """
-        Generates the HTML page for a message board containing all messages
-
-        Returns
-        -------
-        str
-            the webpage as an html string
-        """
-        all_messages = "<br>\n".join(
-            map(lambda a: "Posted: {0}<br>\n{1}".format(a[1], a[0]), messages)
-        )
-        page = """<html>
+    template = """<html>
 <body>
     <h1>Tiny Message Board</h1>
     <h2>Messages</h2>
     <p> {0} </p>
+    <p> {1} </p>
     <h2>New Messages</h2>
     <form method="post">
         <textarea name="message"></textarea>
@@ -89,27 +127,354 @@ class WebServerHandler(http.server.BaseHTTPRequestHandler):
     </form>
 </body>
 </html>"""
-        return page.format(all_messages)
 
-    def do_GET(self):
+    page_size = 50
+
+    def __init__(self, messages=()):
         """
-        Handle a `GET` request
+        Create a new `PageCache`
+
+        Parameters
+        ----------
+        messages : Iterable[(message, time)], optional
+            time-stamped messages to show on the board, by default none
+        """
+        before, rest = PageCache.template.split("{0}")
+        middle, after = rest.split("{1}")
+        self.__before = before.encode()
+        self.__middle = middle.encode()
+        self.__after = after.encode()
+        self.__fragments = []
+        self.__newest_page = None
+        # distinguishes the versions of one run of the server from another's
+        self.__run = "{0:x}".format(time.time_ns())
+        self.__version = 0
+        self.etag = ""
+        self.last_modified = 0.0
+        for message, posted in messages:
+            self.add(message, posted)
+        self.__changed()
+
+    def __len__(self):
+        return len(self.__fragments)
+
+    def __changed(self):
+        """
+        Record that the messages have changed
 
         Returns
         -------
         None
         """
+        self.__newest_page = None
+        self.__version += 1
+        self.etag = '"{0}-{1}"'.format(self.__run, self.__version)
+        self.last_modified = time.time()
 
-        self.send_response(200)
-        self.send_header("Content-type", "text/html")
-        self.end_headers()
+    def add(self, message, posted):
+        """
+        Add a message to the board
 
-        message_text = self.make_page()
-        print(message_text)
+        Parameters
+        ----------
+        message : str
+            text of the message
+        posted : datetime.datetime
+            time the message was posted
 
-        message_bytes = message_text.encode()
-        self.wfile.write(message_bytes)
-        return
+        Returns
+        -------
+        None
+        """
+        self.__fragments.append("Posted: {0}<br>\n{1}".format(posted, message).encode())
+        self.__changed()
+
+    def clear(self):
+        """
+        Remove every message from the board
+
+        Returns
+        -------
+        None
+        """
+        self.__fragments.clear()
+        self.__changed()
+
+    def __navigation(self, first, last):
+        """
+        Make the links to the pages around a page
+
+        Parameters
+        ----------
+        first : int
+            number of the first message on the page
+        last : int
+            number of the first message after the page
+
+        Returns
+        -------
+        bytes
+            the encoded links
+        """
+        links = []
+        if first > 0:
+            links.append('<a href="/?before={0}">Older messages</a>'.format(first))
+        if last < len(self.__fragments):
+            links.append('<a href="/">Newest messages</a>')
+        links.append('<a href="/?all">All messages</a>')
+        return " | ".join(links).encode()
+
+    def page(self, before=None):
+        """
+        Get an encoded page of messages
+
+        Parameters
+        ----------
+        before : int | None, optional
+            number of the first message after the page, by default None
+            which gets the newest page
+
+        Returns
+        -------
+        bytes
+            the page as UTF-8 encoded HTML
+        """
+        if before is None and self.__newest_page is not None:
+            return self.__newest_page
+        last = len(self.__fragments) if before is None else before
+        last = min(max(last, 0), len(self.__fragments))
+        first = max(last - PageCache.page_size, 0)
+        page = b"".join(
+            [
+                self.__before,
+                b"<br>\n".join(self.__fragments[first:last]),
+                self.__middle,
+                self.__navigation(first, last),
+                self.__after,
+            ]
+        )
+        if before is None:
+            self.__newest_page = page
+        return page
+
+    def chunks(self, chunk_size=16384):
+        """
+        Get the encoded page of every message, a chunk at a time
+
+        The messages are those on the board when `chunks` is called, so the
+        chunks can be read without holding `messages_lock`
+
+        Parameters
+        ----------
+        chunk_size : int, optional
+            size in bytes a chunk is filled to before it is produced, by
+            default 16384. A chunk is never split part way through a message
+
+        Returns
+        -------
+        Iterator[bytes]
+            the chunks of the page as UTF-8 encoded HTML
+        """
+        fragments = list(self.__fragments)
+        navigation = self.__navigation(0, len(fragments))
+        return self.__chunks(fragments, navigation, chunk_size)
+
+    def __chunks(self, fragments, navigation, chunk_size):
+        """
+        Produce the encoded page of a list of messages, a chunk at a time
+
+        Parameters
+        ----------
+        fragments : list[bytes]
+            encoded HTML of each message
+        navigation : bytes
+            encoded links to the other pages
+        chunk_size : int
+            size in bytes a chunk is filled to before it is produced
+
+        Yields
+        ------
+        bytes
+            the chunks of the page
+        """
+        chunk = [self.__before]
+        size = len(self.__before)
+        for number, fragment in enumerate(fragments):
+            if number > 0:
+                chunk.append(b"<br>\n")
+            chunk.append(fragment)
+            size += len(fragment)
+            if size >= chunk_size:
+                yield b"".join(chunk)
+                chunk = []
+                size = 0
+        yield b"".join([*chunk, self.__middle, navigation, self.__after])
+
+
+new_log = not os.path.exists(datafile)
+message_log = MessageLog(datafile)
+page_cache = PageCache(load_messages(message_log, legacy_datafile if new_log else None))
+messages_lock = threading.Lock()
+
+
+class WebServerHandler(KeepAliveHandler):
+    """
+    Web handler for a message board
+
+    Built on the chapter's `KeepAliveHandler`, so a browser can keep its
+    connection open between requests and receive compressed pages
+
+    Class Attributes
+    ----------------
+    debug : bool
+        `True` to print each page served by a `GET` request, by default
+        `False`
+    """
+
+    debug = False
+
+    def is_not_modified(self, etag, last_modified):
+        """
+        Check whether the client already has the current page
+
+        Parameters
+        ----------
+        etag : str
+            entity tag of the current page
+        last_modified : float
+            time the page last changed, in seconds since the epoch
+
+        Returns
+        -------
+        bool
+            `True` if the client's copy is current, else `False`
+        """
+        if self.headers.get("If-None-Match") is not None:
+            return self.etag_matches(etag)
+        if_modified_since = self.headers.get("If-Modified-Since")
+        if if_modified_since is not None:
+            try:
+                since = email.utils.parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            # HTTP dates are only precise to the second
+            return int(last_modified) <= since.timestamp()
+        return False
+
+    def page_headers(self, last_modified):
+        """
+        Make the caching headers sent with a page
+
+        Parameters
+        ----------
+        last_modified : float
+            time the page last changed, in seconds since the epoch
+
+        Returns
+        -------
+        list[tuple[str, str]]
+            the names and values of the headers
+        """
+        return [
+            ("Last-Modified", email.utils.formatdate(last_modified, usegmt=True)),
+            ("Cache-Control", "no-cache"),
+        ]
+
+    def send_page(self, before=None, check_cache=False):
+        """
+        Send a page of messages
+
+        Parameters
+        ----------
+        before : int | None, optional
+            number of the first message after the page, by default None
+            which sends the newest page
+        check_cache : bool, optional
+            `True` to send a 304 Not Modified response if the client already
+            has the current page, by default False
+
+        Returns
+        -------
+        None
+        """
+        with messages_lock:
+            page = page_cache.page(before)
+            etag = page_cache.etag
+            last_modified = page_cache.last_modified
+
+        if check_cache and self.is_not_modified(etag, last_modified):
+            self.send_not_modified(etag)
+            return
+        self.send_body(
+            page,
+            etag=etag,
+            headers=self.page_headers(last_modified),
+            check_cache=False,
+        )
+        if WebServerHandler.debug:
+            print(page.decode())
+
+    def stream_all(self):
+        """
+        Send every message, writing each chunk of the page as it is made
+
+        Returns
+        -------
+        None
+        """
+        with messages_lock:
+            chunks = page_cache.chunks()
+            etag = page_cache.etag
+            last_modified = page_cache.last_modified
+
+        if self.is_not_modified(etag, last_modified):
+            self.send_not_modified(etag)
+            return
+        if WebServerHandler.debug:
+            chunks = self.print_chunks(chunks)
+        self.send_chunked(chunks, etag=etag, headers=self.page_headers(last_modified))
+
+    @staticmethod
+    def print_chunks(chunks):
+        """
+        Print each chunk of a page as it is sent
+
+        Parameters
+        ----------
+        chunks : Iterable[bytes]
+            chunks of the page
+
+        Yields
+        ------
+        bytes
+            the chunks of the page
+        """
+        for chunk in chunks:
+            print(chunk.decode(), end="")
+            yield chunk
+        print()
+
+    def do_GET(self):
+        """
+        Handle a `GET` request
+
+        Returns
+        -------
+        None
+        """
+        query = urllib.parse.urlsplit(self.path).query
+        query_strings = urllib.parse.parse_qs(query, keep_blank_values=True)
+        if "all" in query_strings:
+            self.stream_all()
+        elif "before" in query_strings:
+            try:
+                before = int(query_strings["before"][0])
+            except ValueError:
+                self.send_error(400, "before must be a message number")
+                return
+            self.send_page(before, check_cache=True)
+        else:
+            self.send_page(check_cache=True)
 
     def do_POST(self):
         """
@@ -124,28 +489,44 @@ class WebServerHandler(http.server.BaseHTTPRequestHandler):
         post_body_text = post_body_bytes.decode()
         query_strings = urllib.parse.parse_qs(post_body_text, keep_blank_values=True)
 
-        if "clear" in query_strings:
-            messages.clear()
-            save_messages(datafile)
-        elif "message" in query_strings:
-            message = query_strings["message"][0]
-            messages.append((message, datetime.datetime.now()))
-            save_messages(datafile)
+        with messages_lock:
+            if "clear" in query_strings:
+                page_cache.clear()
+                message_log.clear()
+            elif "message" in query_strings:
+                message = query_strings["message"][0]
+                posted = datetime.datetime.now()
+                page_cache.add(message, posted)
+                message_log.append(message, posted)
 
-        self.send_response(200)
-        self.send_header("Content-type", "text/html")
-        self.end_headers()
+        self.send_page()
 
-        message_text = self.make_page()
-        message_bytes = message_text.encode()
 
-        self.wfile.write(message_bytes)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the persistent message board")
+    parser.add_argument("--port", type=int, default=8091, help="port to listen on")
+    parser.add_argument(
+        "--single-threaded",
+        action="store_true",
+        help="serve one request at a time instead of a thread per request",
+    )
+    parser.add_argument(
+        "--debug", action="store_true", help="print each page sent to a GET request"
+    )
+    args = parser.parse_args()
+    WebServerHandler.debug = args.debug
 
+    host_socket = args.port
+    host_ip = "localhost"
 
-host_socket = 8091
-host_ip = "localhost"
-
-host_address = (host_ip, host_socket)
-server = http.server.HTTPServer(host_address, WebServerHandler)
-print("Server now running on http://{0}:{1}".format(*host_address))
-server.serve_forever()
+    host_address = (host_ip, host_socket)
+    if args.single_threaded:
+        server_class = http.server.HTTPServer
+    else:
+        server_class = http.server.ThreadingHTTPServer
+    server = server_class(host_address, WebServerHandler)
+    print("Server now running on http://{0}:{1}".format(*host_address))
+    try:
+        server.serve_forever()
+    finally:
+        message_log.close()
@@ -0,0 +1,344 @@
+"""
+Exercise 15.1 Message Log
+
+Provides an append-only log file for the persistent message board, so that
+posting a message writes one record rather than the whole board
+
+Each record is a length-prefixed entry holding a checksum, the kind of
+record, the time it was made and the text of the message. Clearing the
+board appends a single "clear" record, a tombstone for every message before
+it. Records are flushed to the operating system as they are written, and
+flushed through to the disk in batches
+
+Classes
+-------
+MessageLog
+    append-only log of the messages posted to a message board
+
+Variables
+---------
+POST : int
+    kind of record holding a posted message
+CLEAR : int
+    kind of record marking the board as cleared
+"""
+
+import array
+import datetime
+import os
+import struct
+import threading
+import zlib
+
+POST = 1
+CLEAR = 2
+
+# message length, checksum, kind and timestamp in microseconds
+_header = struct.Struct("<IIBq")
+_epoch = datetime.datetime(1970, 1, 1)
+_microsecond = datetime.timedelta(microseconds=1)
+
+
+def _encode_record(kind, posted, message=""):
+    """
+    Encode a record of the log
+
+    Parameters
+    ----------
+    kind : int
+        kind of the record, `POST` or `CLEAR`
+    posted : datetime.datetime
+        time the record was made
+    message : str, optional
+        text of the message, by default ""
+
+    Returns
+    -------
+    bytes
+        the encoded record
+    """
+    payload = message.encode("utf-8")
+    stamp = (posted - _epoch) // _microsecond
+    checksum = zlib.crc32(payload, zlib.crc32(struct.pack("<Bq", kind, stamp)))
+    return _header.pack(len(payload), checksum, kind, stamp) + payload
+
+
+def _decode_records(data, offset=0):
+    """
+    Decode the complete records in a block of log data
+
+    Decoding stops at the first record that is cut short or does not match
+    its checksum, as left by a write that was interrupted
+
+    Parameters
+    ----------
+    data : bytes
+        the log data
+    offset : int, optional
+        position in the log of the start of `data`, by default 0
+
+    Yields
+    ------
+    tuple[int, int, int, str, datetime.datetime]
+        the positions in the log of the start and end, and the kind,
+        message and time of each record
+    """
+    position = 0
+    while position + _header.size <= len(data):
+        length, checksum, kind, stamp = _header.unpack_from(data, position)
+        start = position + _header.size
+        payload = data[start : start + length]
+        # the checksum covers the kind and timestamp as well as the message
+        fields = data[position + 8 : start]
+        if len(payload) < length or zlib.crc32(payload, zlib.crc32(fields)) != checksum:
+            return
+        yield (
+            offset + position,
+            offset + start + length,
+            kind,
+            payload.decode("utf-8"),
+            _epoch + stamp * _microsecond,
+        )
+        position = start + length
+
+
+class MessageLog:
+    """
+    Append-only log of the messages posted to a message board
+
+    An offset index holds the position in the file of every message posted
+    since the board was last cleared, so the newest messages can be read
+    back without replaying the whole log. The log is safe to use from
+    several threads
+
+    Attributes
+    ----------
+    sync_interval : float
+        longest time in seconds a record waits to be flushed to the disk
+    sync_batch : int
+        number of waiting records that are flushed to the disk straight away
+
+    Notes
+    -----
+    When the log is opened, any record cut short by an interrupted write is
+    removed, and if the board has been cleared the log is rewritten to hold
+    only the messages posted since
+    """
+
+    def __init__(self, file, sync_interval=0.05, sync_batch=64):
+        """
+        Create a new `MessageLog`, opening the log file or creating it if it
+        doesn't exist
+
+        Parameters
+        ----------
+        file : str
+            path to the log file
+        sync_interval : float, optional
+            longest time in seconds a record waits to be flushed to the disk,
+            by default 0.05
+        sync_batch : int, optional
+            number of waiting records that are flushed to the disk straight
+            away, by default 64
+        """
+        self.__file = file
+        self.sync_interval = sync_interval
+        self.sync_batch = sync_batch
+        self.__lock = threading.Lock()
+        self.__offsets = array.array("q")
+        self.__pending = 0
+        self.__timer = None
+        self.__end = self.__recover()
+        self.__writer = open(file, "ab")
+        self.__reader = open(file, "rb")
+
+    def __len__(self):
+        return len(self.__offsets)
+
+    def __recover(self):
+        """
+        Build the offset index from the log file, tidying the file first
+
+        Returns
+        -------
+        int
+            length of the log file
+        """
+        try:
+            with open(self.__file, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+
+        live_start = 0
+        valid_end = 0
+        offsets = []
+        for offset, end, kind, _, _ in _decode_records(data):
+            if kind == CLEAR:
+                offsets = []
+                live_start = end
+            else:
+                offsets.append(offset)
+            valid_end = end
+
+        if live_start > 0:
+            # the messages before the last clear are dead, so keep the rest
+            temporary = self.__file + ".tmp"
+            with open(temporary, "wb") as f:
+                f.write(data[live_start:valid_end])
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporary, self.__file)
+        elif valid_end < len(data):
+            os.truncate(self.__file, valid_end)
+        self.__offsets.extend(offset - live_start for offset in offsets)
+        return valid_end - live_start
+
+    def __write(self, record):
+        """
+        Write a record to the end of the log
+
+        The caller must hold the log's lock
+
+        Parameters
+        ----------
+        record : bytes
+            the encoded record
+
+        Returns
+        -------
+        None
+        """
+        self.__writer.write(record)
+        self.__writer.flush()
+        self.__end += len(record)
+        self.__pending += 1
+        if self.__pending >= self.sync_batch:
+            self.__sync()
+        elif self.__timer is None:
+            self.__timer = threading.Timer(self.sync_interval, self.__timed_sync)
+            self.__timer.daemon = True
+            self.__timer.start()
+
+    def __sync(self):
+        """
+        Flush the waiting records to the disk
+
+        The caller must hold the log's lock
+
+        Returns
+        -------
+        None
+        """
+        if self.__pending:
+            os.fsync(self.__writer.fileno())
+            self.__pending = 0
+
+    def __timed_sync(self):
+        """
+        Flush the waiting records to the disk once the sync interval ends
+
+        Returns
+        -------
+        None
+        """
+        with self.__lock:
+            self.__timer = None
+            if not self.__writer.closed:
+                self.__sync()
+
+    def append(self, message, posted):
+        """
+        Add a posted message to the end of the log
+
+        Parameters
+        ----------
+        message : str
+            text of the message
+        posted : datetime.datetime
+            time the message was posted
+
+        Returns
+        -------
+        None
+        """
+        record = _encode_record(POST, posted, message)
+        with self.__lock:
+            self.__offsets.append(self.__end)
+            self.__write(record)
+
+    def clear(self, cleared=None):
+        """
+        Mark every message in the log as cleared
+
+        Parameters
+        ----------
+        cleared : datetime.datetime | None, optional
+            time the board was cleared, by default None which uses now
+
+        Returns
+        -------
+        None
+        """
+        if cleared is None:
+            cleared = datetime.datetime.now()
+        record = _encode_record(CLEAR, cleared)
+        with self.__lock:
+            self.__offsets = array.array("q")
+            self.__write(record)
+
+    def tail(self, count=None):
+        """
+        Read the newest messages from the log
+
+        Parameters
+        ----------
+        count : int | None, optional
+            number of messages to read, by default None which reads every
+            message posted since the board was last cleared
+
+        Returns
+        -------
+        list[(message, time)]
+            the messages, oldest first
+        """
+        with self.__lock:
+            if count is None or count > len(self.__offsets):
+                count = len(self.__offsets)
+            if count <= 0:
+                return []
+            start = self.__offsets[-count]
+            self.__reader.seek(start)
+            data = self.__reader.read(self.__end - start)
+        return [
+            (message, posted)
+            for _, _, kind, message, posted in _decode_records(data, start)
+            if kind == POST
+        ]
+
+    def sync(self):
+        """
+        Flush every waiting record to the disk now
+
+        Returns
+        -------
+        None
+        """
+        with self.__lock:
+            self.__sync()
+
+    def close(self):
+        """
+        Flush every waiting record to the disk and close the log
+
+        Returns
+        -------
+        None
+        """
+        with self.__lock:
+            if self.__timer is not None:
+                self.__timer.cancel()
+                self.__timer = None
+            self.__sync()
+            self.__writer.close()
+            self.__reader.close()
@@ -0,0 +1,175 @@
+"""
+Keep-Alive Benchmark
+
+Compares the throughput of a handler using the default HTTP/1.0 behaviour
+of `BaseHTTPRequestHandler` with one built on `KeepAliveHandler`. Each
+server sends the same page, and clients make repeated requests for it, over
+a new connection each time for the HTTP/1.0 server and over one kept-alive
+connection for the HTTP/1.1 server, with and without gzip
+
+Functions
+---------
+measure
+    run concurrent clients against a server and report the results
+"""
+
+import http.client
+import http.server
+import threading
+import time
+
+from KeepAliveHandler import KeepAliveHandler
+
+page = (
+    "<html>\n<body>\n<h1>Tiny Message Board</h1>\n<p> "
+    + "<br>\n".join(
+        "Posted: 2026-10-18 12:00:{0:02d}.000000<br>\nMessage number {1}".format(
+            i % 60, i
+        )
+        for i in range(400)
+    )
+    + " </p>\n</body>\n</html>"
+).encode()
+
+
+class ClosingHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Handler with the default HTTP/1.0 behaviour, closing each connection
+    """
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-type", "text/html")
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PersistentHandler(KeepAliveHandler):
+    """
+    Handler built on `KeepAliveHandler`
+    """
+
+    def do_GET(self):
+        self.send_body(page)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def run_client(port, keep_alive, headers, end_time, results):
+    """
+    Request the page until a time
+
+    Parameters
+    ----------
+    port : int
+        port of the server
+    keep_alive : bool
+        `True` to make every request over one connection, or `False` to
+        make a new connection for each request
+    headers : dict[str, str]
+        headers to send with each request
+    end_time : float
+        `time.perf_counter` value to stop at
+    results : list[tuple[int, int]]
+        list the number of requests made and bytes received is added to
+
+    Returns
+    -------
+    None
+    """
+    requests = 0
+    received = 0
+    connection = http.client.HTTPConnection("localhost", port)
+    while time.perf_counter() < end_time:
+        connection.request("GET", "/", headers=headers)
+        received += len(connection.getresponse().read())
+        requests += 1
+        if not keep_alive:
+            connection.close()
+            connection = http.client.HTTPConnection("localhost", port)
+    connection.close()
+    results.append((requests, received))
+
+
+def measure(label, handler_class, keep_alive, headers, client_count, duration):
+    """
+    Run concurrent clients against a server and report the results
+
+    Parameters
+    ----------
+    label : str
+        name of the run to print
+    handler_class : type[http.server.BaseHTTPRequestHandler]
+        handler the server uses
+    keep_alive : bool
+        `True` to make every request over one connection, or `False` to
+        make a new connection for each request
+    headers : dict[str, str]
+        headers to send with each request
+    client_count : int
+        number of concurrent clients
+    duration : float
+        how long to run the clients for, in seconds
+
+    Returns
+    -------
+    None
+    """
+    server = http.server.ThreadingHTTPServer(("localhost", 0), handler_class)
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    port = server.server_address[1]
+
+    results = []
+    end_time = time.perf_counter() + duration
+    clients = [
+        threading.Thread(
+            target=run_client, args=(port, keep_alive, headers, end_time, results)
+        )
+        for _ in range(client_count)
+    ]
+    start = time.perf_counter()
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    server.server_close()
+
+    requests = sum(result[0] for result in results)
+    received = sum(result[1] for result in results)
+    print(
+        "  {0:<26} {1:8,.0f} requests/s  {2:8,.0f} bytes/request".format(
+            label, requests / elapsed, received / max(requests, 1)
+        )
+    )
+
+
+if __name__ == "__main__":
+    duration = 3
+    for client_count in [1, 10]:
+        print("{0} clients, {1:,} byte page".format(client_count, len(page)))
+        measure(
+            "HTTP/1.0, new connections",
+            ClosingHandler,
+            False,
+            {},
+            client_count,
+            duration,
+        )
+        measure(
+            "HTTP/1.1, keep-alive", PersistentHandler, True, {}, client_count, duration
+        )
+        measure(
+            "HTTP/1.1, keep-alive, gzip",
+            PersistentHandler,
+            True,
+            {"Accept-Encoding": "gzip"},
+            client_count,
+            duration,
+        )
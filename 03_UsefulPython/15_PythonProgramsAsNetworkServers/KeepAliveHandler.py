@@ -0,0 +1,291 @@
+"""
+Keep-Alive Handler
+
+Provides a request handler base class shared by the chapter 15 web servers.
+It speaks HTTP/1.1, so a browser can send many requests over one
+connection, and compresses responses with gzip for browsers that accept it
+
+By default `BaseHTTPRequestHandler` speaks HTTP/1.0 and sends no
+Content-Length, so the end of a response is marked by closing the
+connection and every request needs a new one. Responses sent through
+`KeepAliveHandler` always give their length, or are sent in chunks, so the
+connection can be kept open
+
+Classes
+-------
+KeepAliveHandler
+    HTTP/1.1 request handler with persistent connections and gzip
+"""
+
+import collections
+import gzip
+import http.server
+import threading
+import zlib
+
+
+class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    """
+    HTTP/1.1 request handler with persistent connections and gzip
+
+    Subclasses send responses with `send_body` or `send_chunked` rather than
+    writing to `wfile` directly. Every response has an ETag, and the gzip
+    variant of a response is cached by its path and ETag, so a page that
+    doesn't change is only compressed once
+
+    Class Attributes
+    ----------------
+    compressible_types : tuple[str]
+        starts of the content types that are compressed
+    minimum_compress_size : int
+        smallest response body in bytes that is compressed
+    compressed_cache_size : int
+        number of compressed responses kept in the cache
+    """
+
+    protocol_version = "HTTP/1.1"
+    # the headers and body are written separately, and on a kept-alive
+    # connection Nagle's algorithm holds back the second write until the
+    # client acknowledges the first, which it delays
+    disable_nagle_algorithm = True
+    compressible_types = ("text/", "application/json", "application/javascript")
+    minimum_compress_size = 256
+    compressed_cache_size = 64
+
+    __compressed_cache = collections.OrderedDict()
+    __compressed_cache_lock = threading.Lock()
+
+    def accepts_gzip(self):
+        """
+        Check whether the client accepts gzip compressed responses
+
+        Returns
+        -------
+        bool
+            `True` if the client's Accept-Encoding allows gzip, else `False`
+        """
+        qualities = {}
+        for coding in self.headers.get("Accept-Encoding", "").split(","):
+            name, _, parameters = coding.partition(";")
+            quality = parameters.strip().lower()
+            if quality.startswith("q="):
+                try:
+                    quality = float(quality[2:])
+                except ValueError:
+                    quality = 0
+            else:
+                quality = 1
+            qualities[name.strip().lower()] = quality
+        # an explicit gzip entry takes precedence over the * wildcard
+        return qualities.get("gzip", qualities.get("*", 0)) > 0
+
+    def __use_gzip(self, content_type, size=None):
+        """
+        Decide whether to compress a response
+
+        Parameters
+        ----------
+        content_type : str
+            content type of the response
+        size : int | None, optional
+            size of the response body in bytes, by default None if unknown
+
+        Returns
+        -------
+        bool
+            `True` to compress the response, else `False`
+        """
+        if size is not None and size < KeepAliveHandler.minimum_compress_size:
+            return False
+        return (
+            content_type.startswith(KeepAliveHandler.compressible_types)
+            and self.accepts_gzip()
+        )
+
+    @staticmethod
+    def gzip_etag(etag):
+        """
+        Get the ETag of the gzip variant of a response
+
+        Parameters
+        ----------
+        etag : str
+            ETag of the uncompressed response
+
+        Returns
+        -------
+        str
+            the ETag of the compressed response
+        """
+        return etag[:-1] + '-gzip"'
+
+    def etag_matches(self, etag):
+        """
+        Check whether the client's If-None-Match names a response
+
+        Either variant of the response matches
+
+        Parameters
+        ----------
+        etag : str
+            ETag of the uncompressed response
+
+        Returns
+        -------
+        bool
+            `True` if the client already has the response, else `False`
+        """
+        if_none_match = self.headers.get("If-None-Match")
+        if if_none_match is None:
+            return False
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or KeepAliveHandler.gzip_etag(etag) in tags
+
+    def send_not_modified(self, etag):
+        """
+        Send a 304 Not Modified response
+
+        Parameters
+        ----------
+        etag : str
+            ETag of the uncompressed response
+
+        Returns
+        -------
+        None
+        """
+        self.send_response(304)
+        if self.accepts_gzip():
+            etag = KeepAliveHandler.gzip_etag(etag)
+        self.send_header("ETag", etag)
+        self.end_headers()
+
+    def __compress(self, body, etag):
+        """
+        Get the gzip variant of a response, compressing it only if it is not
+        in the cache
+
+        Parameters
+        ----------
+        body : bytes
+            uncompressed body of the response
+        etag : str
+            ETag of the uncompressed response
+
+        Returns
+        -------
+        bytes
+            the compressed body
+        """
+        key = (self.path, etag)
+        cache = KeepAliveHandler.__compressed_cache
+        with KeepAliveHandler.__compressed_cache_lock:
+            compressed = cache.get(key)
+            if compressed is not None:
+                cache.move_to_end(key)
+                return compressed
+        compressed = gzip.compress(body, mtime=0)
+        with KeepAliveHandler.__compressed_cache_lock:
+            cache[key] = compressed
+            while len(cache) > KeepAliveHandler.compressed_cache_size:
+                cache.popitem(last=False)
+        return compressed
+
+    def send_body(
+        self, body, content_type="text/html", etag=None, headers=(), check_cache=True
+    ):
+        """
+        Send a complete response
+
+        Parameters
+        ----------
+        body : bytes
+            body of the response
+        content_type : str, optional
+            content type of the response, by default "text/html"
+        etag : str | None, optional
+            ETag of the response, by default None which makes one from a
+            checksum of the body
+        headers : Iterable[tuple[str, str]], optional
+            further headers to send, by default none
+        check_cache : bool, optional
+            `True` to send a 304 Not Modified response if the client already
+            has the response, by default True
+
+        Returns
+        -------
+        bool
+            `True` if the body was sent, or `False` if the client already
+            had it
+        """
+        if etag is None:
+            etag = '"{0:08x}-{1:x}"'.format(zlib.crc32(body), len(body))
+        if check_cache and self.etag_matches(etag):
+            self.send_not_modified(etag)
+            return False
+
+        self.send_response(200)
+        self.send_header("Content-type", content_type)
+        if self.__use_gzip(content_type, len(body)):
+            body = self.__compress(body, etag)
+            etag = KeepAliveHandler.gzip_etag(etag)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        return True
+
+    def send_chunked(self, chunks, content_type="text/html", etag=None, headers=()):
+        """
+        Send a response a chunk at a time, as each chunk is made
+
+        The response uses chunked transfer encoding, so its length does not
+        need to be known before it is sent. Streamed responses are
+        compressed as they are sent and are not cached
+
+        Parameters
+        ----------
+        chunks : Iterable[bytes]
+            chunks of the body of the response
+        content_type : str, optional
+            content type of the response, by default "text/html"
+        etag : str | None, optional
+            ETag of the response, by default None which sends no ETag
+        headers : Iterable[tuple[str, str]], optional
+            further headers to send, by default none
+
+        Returns
+        -------
+        None
+        """
+        compressor = None
+        self.send_response(200)
+        self.send_header("Content-type", content_type)
+        if self.__use_gzip(content_type):
+            # wbits of 31 makes zlib write a gzip header and trailer
+            compressor = zlib.compressobj(wbits=31)
+            if etag is not None:
+                etag = KeepAliveHandler.gzip_etag(etag)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Vary", "Accept-Encoding")
+        if etag is not None:
+            self.send_header("ETag", etag)
+        self.send_header("Transfer-Encoding", "chunked")
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+
+        for chunk in chunks:
+            if compressor is not None:
+                # flush so each chunk reaches the client as soon as it is made
+                chunk = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if chunk:
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        if compressor is not None:
+            chunk = compressor.flush()
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+        self.wfile.write(b"0\r\n\r\n")